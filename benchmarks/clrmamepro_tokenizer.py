@@ -0,0 +1,34 @@
+"""Micro-benchmark of the ClrMamePro line tokenizer against shlex.split.
+
+Run with `python benchmarks/clrmamepro_tokenizer.py`.
+"""
+import shlex
+import timeit
+
+from datoso.repositories.dat_file import split_line
+
+LINES = [
+    'name "Legend of Zelda, The - Link\'s Awakening (USA, Europe) (Rev 2)"',
+    'description "Legend of Zelda, The - Link\'s Awakening (USA, Europe) (Rev 2)"',
+    'name "Legend of Zelda, The - Link\'s Awakening (USA, Europe) (Rev 2).gb" size 524288 crc 2A2F2E2D '
+    'md5 5C5C5C5C5C5C5C5C5C5C5C5C5C5C5C5C sha1 1D1D1D1D1D1D1D1D1D1D1D1D1D1D1D1D1D1D1D1D',
+    'version 20240101-000000',
+    'serial "DMG-ZLE"',
+]
+NUMBER = 20000
+
+
+def main() -> None:
+    """Run the benchmark."""
+    for line in LINES:
+        assert split_line(line) == shlex.split(line), line  # noqa: S101
+    shlex_time = timeit.timeit(lambda: [shlex.split(line) for line in LINES], number=NUMBER)
+    regex_time = timeit.timeit(lambda: [split_line(line) for line in LINES], number=NUMBER)
+    lines = NUMBER * len(LINES)
+    print(f'shlex.split: {shlex_time:.3f}s ({lines / shlex_time:,.0f} lines/s)')
+    print(f'split_line:  {regex_time:.3f}s ({lines / regex_time:,.0f} lines/s)')
+    print(f'speedup:     {shlex_time / regex_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
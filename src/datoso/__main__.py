@@ -7,12 +7,15 @@ from argparse import ArgumentParser, Namespace
 from datoso import __version__
 from datoso.commands.argparser import (
     add_all_seed_parser,
+    add_cache_parser,
     add_config_parser,
     add_dat_parser,
+    add_database_parser,
     add_deduper_parser,
     add_doctor_parser,
     add_import_parser,
     add_log_parser,
+    add_rom_parser,
     add_seed_parser,
 )
 from datoso.configuration import config
@@ -38,6 +41,9 @@ def parse_args() -> Namespace:
 
     add_log_parser(subparser)
     add_config_parser(subparser)
+    add_cache_parser(subparser)
+    add_database_parser(subparser)
+    add_rom_parser(subparser)
     add_doctor_parser(subparser)
     add_dat_parser(subparser)
     add_seed_parser(subparser)
@@ -0,0 +1,53 @@
+"""Context of the dat being processed, shared by the actions of a processor."""
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from datoso.database.models.dat import Dat
+from datoso.repositories.dat_file import DatFile
+
+
+class DatContext:
+    """The dat file and database record of the dat being processed, and the data derived from them.
+
+    The derived data (the file and database data, the destination of the dat...) is computed once and
+    kept until the context is invalidated, which happens when a dat is replaced, or explicitly by the
+    action that changed one of them.
+    """
+
+    def __init__(self, file_dat: DatFile | None = None, database_dat: Dat | None = None) -> None:
+        """Initialize the context."""
+        self._file_dat = file_dat
+        self._database_dat = database_dat
+        self._cache: dict[Hashable, Any] = {}
+
+    @property
+    def file_dat(self) -> DatFile | None:
+        """Get the dat file."""
+        return self._file_dat
+
+    @file_dat.setter
+    def file_dat(self, value: DatFile | None) -> None:
+        """Replace the dat file."""
+        self._file_dat = value
+        self.invalidate()
+
+    @property
+    def database_dat(self) -> Dat | None:
+        """Get the database record."""
+        return self._database_dat
+
+    @database_dat.setter
+    def database_dat(self, value: Dat | None) -> None:
+        """Replace the database record."""
+        self._database_dat = value
+        self.invalidate()
+
+    def cached(self, key: Hashable, compute: Callable[[], Any]) -> Any:  # noqa: ANN401
+        """Get some data derived from the dats, computed on first use."""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def invalidate(self) -> None:
+        """Forget the derived data, after the dat file or the database record changed."""
+        self._cache.clear()
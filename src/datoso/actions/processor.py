@@ -1,44 +1,181 @@
 """Process actions."""
+import inspect
 from abc import ABC, abstractmethod
-from collections.abc import Iterator
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 
+from datoso.actions.context import DatContext
 from datoso.configuration import config, logger
 from datoso.database.models.dat import Dat
+from datoso.database.rom_index import index_dat, rom_index, unindex_dat
+from datoso.database.seeds.mia import get_mias
 from datoso.helpers import compare_dates
-from datoso.helpers.file_utils import copy_path, get_ext, remove_path
-from datoso.mias.mia import mark_mias
+from datoso.helpers.file_utils import (
+    content_hash,
+    copy_path,
+    get_ext,
+    path_lock,
+    remove_path,
+)
 from datoso.repositories.dat_file import DatFile
-from datoso.repositories.dedupe import Dedupe
+from datoso.repositories.dedupe import Dedupe, get_dat_file
+
+
+class ActionRegistry:
+    """Registry of the actions by name.
+
+    Every concrete subclass of `Process` is registered when it is defined, by its full name (module and
+    class name) and by its class name, so the actions defined by a seed plugin are used in its actions
+    like the actions of datoso. The class name stays with the first action registered with it, another
+    action with the same class name is only registered by its full name.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._actions: dict[str, type[Process]] = {}
+
+    @staticmethod
+    def full_name(action: type['Process']) -> str:
+        """Get the full name of an action, its module and class name."""
+        return f'{action.__module__}.{action.__qualname__}'
+
+    def register(self, action: type['Process'], name: str | None = None) -> type['Process']:
+        """Register an action, by name if given, or by its full name and its class name if it is free."""
+        if name:
+            self._actions[name] = action
+            return action
+        full_name = self.full_name(action)
+        self._actions[full_name] = action
+        registered = self._actions.get(action.__name__)
+        if registered is None or self.full_name(registered) == full_name:
+            self._actions[action.__name__] = action
+        else:
+            logger.warning('Action %s is already %s, use %s', action.__name__, self.full_name(registered), full_name)
+        return action
+
+    def get(self, name: str) -> type['Process']:
+        """Get an action by name."""
+        try:
+            return self._actions[name]
+        except KeyError:
+            msg = f'Unknown action {name}'
+            raise LookupError(msg) from None
+
+    def __contains__(self, name: str) -> bool:
+        """Check if an action is registered."""
+        return name in self._actions
+
+
+action_registry = ActionRegistry()
+
+
+@dataclass(frozen=True)
+class PipelinePlan:
+    """Actions of a seed compiled once, and run against every dat.
+
+    Every action is resolved in the registry with its parameters bound, and consecutive transform
+    actions (see `Transform`) are grouped in a single step that is fused in a single pass over the dat.
+    """
+
+    steps: tuple[tuple[Callable[..., 'Process'], ...], ...]
+
+    @classmethod
+    def compile(cls, actions: list[dict], registry: ActionRegistry = action_registry) -> 'PipelinePlan':
+        """Compile a list of actions."""
+        steps = []
+        step = []
+        for action in actions:
+            action_class = registry.get(action['action'])
+            if step and getattr(action_class, 'fusable', False) and getattr(step[-1].func, 'fusable', False):
+                step.append(partial(action_class, **action))
+                continue
+            if step:
+                steps.append(tuple(step))
+            step = [partial(action_class, **action)]
+        if step:
+            steps.append(tuple(step))
+        return cls(tuple(steps))
+
+    @property
+    def serial(self) -> bool:
+        """Whether an action depends on what the other dats of the run save, see `Process.serial`."""
+        return any(getattr(action.func, 'serial', False) for step in self.steps for action in step)
 
 
 class Processor:
     """Process actions."""
 
-    _file_dat = None
-    _database_dat = None
+    _plan: PipelinePlan = None
     actions: list = None
     seed = None
     file = None
+    overwrite = False
 
     def __init__(self, **kwargs) -> None:  # noqa: ANN003
-        """Initialize the processor."""
+        """Initialize the processor, with the actions or the plan they were compiled to."""
         self._file_data = None
+        plan = kwargs.pop('plan', None)
+        self.context = DatContext(kwargs.pop('_file_dat', None), kwargs.pop('_database_dat', None))
         self.__dict__.update(kwargs)
         if not self.actions:
             self.actions = []
+        self._plan = plan
+
+    @property
+    def _file_dat(self) -> DatFile | None:
+        """Get the dat file of the context."""
+        return self.context.file_dat
+
+    @property
+    def _database_dat(self) -> Dat | None:
+        """Get the database record of the context."""
+        return self.context.database_dat
+
+    @property
+    def plan(self) -> PipelinePlan:
+        """Get the plan of the actions, compiled on first use."""
+        if self._plan is None:
+            self._plan = PipelinePlan.compile(self.actions)
+        return self._plan
+
+    def steps(self) -> Iterator[tuple[Callable[..., 'Process'], ...]]:
+        """Get the steps of the plan, consecutive transform actions are a single step."""
+        return iter(self.plan.steps)
+
+    def create(self, action: Callable[..., 'Process']) -> 'Process':
+        """Create the process of an action of the plan."""
+        return action(file=self.file, seed=self.seed, previous=self._file_data, context=self.context,
+                      overwrite=self.overwrite)
+
+    def load_database_dat(self) -> Dat | None:
+        """Load the dat and its database record as the LoadDatFile action of the plan does, None if it can't."""
+        for step in self.steps():
+            for action in step:
+                if isinstance(action.func, type) and issubclass(action.func, LoadDatFile):
+                    process = self.create(action)
+                    try:
+                        process.load_file_dat()
+                        return process.load_database_dat()
+                    except Exception:  # noqa: BLE001
+                        return None
+        return None
 
     def process(self) -> Iterator[str]:
-        """Process actions."""
-        for action in self.actions:
-            action_class = globals()[
-                action['action']](
-                    file=self.file, seed=self.seed, previous=self._file_data,
-                    _file_dat=self._file_dat, _database_dat=self._database_dat,
-                    **action)
-            yield action_class.process()
-            self._file_dat = action_class.file_dat
-            self._database_dat = action_class.database_dat
+        """Process actions.
+
+        Consecutive transform actions (see `Transform`) are fused in a single pass over the dat. The
+        actions share the context of the dat, the dat file and the database record are loaded once.
+        """
+        for step in self.steps():
+            if len(step) > 1:
+                processes = [self.create(action) for action in step]
+                yield from TransformPass(processes).process()
+                action_class = processes[-1]
+            else:
+                action_class = self.create(step[0])
+                yield action_class.process()
             if action_class.stop:
                 break
 
@@ -46,14 +183,47 @@ class Processor:
 class Process(ABC):
     """Process Base class."""
 
-    _file_dat = None
-    _database_dat = None
+    context: DatContext = None
     status = None
     stop = False
+    # the action reads the records or files other dats of the run may change (an older version of
+    # the same dat, a parent), a dat that depends on another dat of the run is not processed in parallel
+    # from a snapshot of the database but after it (see `Seed.split_dependent`)
+    serial = False
+    # the dat in the dat root is replaced even if it looks the same, e.g. it was copied while being fetched
+    overwrite = False
+
+    def __init_subclass__(cls, **kwargs) -> None:  # noqa: ANN003
+        """Register every action, the abstract base classes of actions are not actions."""
+        super().__init_subclass__(**kwargs)
+        if not inspect.isabstract(cls):
+            action_registry.register(cls)
 
     def __init__(self, **kwargs) -> None:  # noqa: ANN003
-        """Initialize the process."""
+        """Initialize the process, in the context shared with the other actions or a new one."""
+        context = kwargs.pop('context', None)
+        file_dat = kwargs.pop('_file_dat', None)
+        database_dat = kwargs.pop('_database_dat', None)
         self.__dict__.update(kwargs)
+        self.context = context or DatContext(file_dat, database_dat)
+
+    @property
+    def _file_dat(self) -> DatFile | None:
+        """Get the dat file of the context, None if not loaded."""
+        return self.context.file_dat
+
+    @_file_dat.setter
+    def _file_dat(self, value: DatFile | None) -> None:
+        self.context.file_dat = value
+
+    @property
+    def _database_dat(self) -> Dat | None:
+        """Get the database record of the context, None if not loaded."""
+        return self.context.database_dat
+
+    @_database_dat.setter
+    def _database_dat(self, value: Dat | None) -> None:
+        self.context.database_dat = value
 
     @abstractmethod
     def process(self) -> str:
@@ -69,8 +239,19 @@ class Process(ABC):
 
     @property
     def file_data(self) -> dict:
-        """Get file data."""
-        return self.file_dat.dict() if self.file_dat else {}
+        """Get file data, computed once per dat."""
+        return self.context.cached('file_data', self.file_dat.dict) if self.file_dat else {}
+
+    def overwrites(self) -> bool:
+        """Whether the dat in the dat root is replaced even if it exists, for this dat or as configured."""
+        return self.overwrite or config.getboolean('PROCESS', 'Overwrite', fallback=False)
+
+    def newer_in_database(self) -> bool:
+        """Check if the dat in the database is newer than the dat file, by their normalized dates if stored."""
+        if not self.database_data or not self.database_data.get('date', None) or not self.file_data.get('date', None):
+            return False
+        return compare_dates(self.database_data.get('sort_date', None) or self.database_dat.date,
+                             self.file_data.get('sort_date', None) or self.file_dat.date)
 
     @property
     def file_dat(self) -> DatFile:
@@ -85,8 +266,8 @@ class Process(ABC):
 
     @property
     def database_data(self) -> dict:
-        """Get database data."""
-        return self.database_dat.to_dict() if self.database_dat else {}
+        """Get database data, computed once per dat."""
+        return self.context.cached('database_data', self.database_dat.to_dict) if self.database_dat else {}
 
     @property
     def database_dat(self) -> Dat:
@@ -122,7 +303,13 @@ class LoadDatFile(Process):
 class DeleteOld(Process):
     """Delete old dat file."""
 
+    serial = True
+
     def destination(self) -> Path:
+        """Get the destination of the dat in folder, computed once per dat."""
+        return self.context.cached(('destination', getattr(self, 'folder', None)), self._destination)
+
+    def _destination(self) -> Path:
         """Parse path."""
         static_path = self.database_dat.static_path if self.database_dat else None
         path = self.file_dat.path if self.file_dat.path is not None else static_path
@@ -137,8 +324,7 @@ class DeleteOld(Process):
     def process(self) -> str:
         """Delete old dat file."""
         try:
-            if self.database_data and self.database_data.get('date', None) and self.file_data.get('date', None) \
-                and compare_dates(self.database_dat.date, self.file_dat.date):
+            if self.newer_in_database():
                 self.stop = True
                 return 'No Action Taken, Newer Found'
         except ValueError as e:
@@ -153,16 +339,19 @@ class DeleteOld(Process):
             new_file = self.destination()
             if old_file == new_file \
                 and self.database_data.get('date', None) == self.file_data.get('date', None) \
-                and not config.getboolean('PROCESS', 'Overwrite', fallback=False) \
+                and not self.overwrites() \
                 and self.database_dat.is_enabled():
                 return 'Exists'
 
-        remove_path(Path(self.database_dat.new_file), remove_empty_parent=True)
+        with path_lock(self.database_dat.new_file):
+            remove_path(Path(self.database_dat.new_file), remove_empty_parent=True)
         if not self.database_dat.is_enabled():
             self.stop = True
             self.database_dat.new_file = None
+            self.context.invalidate()
             self.database_dat.save()
             self.database_dat.flush()
+            unindex_dat(self.database_dat.seed, self.database_dat.name)
             return 'Disabled'
         return 'Deleted'
 
@@ -171,6 +360,10 @@ class Copy(Process):
     """Copy files."""
 
     def destination(self) -> Path:
+        """Get the destination of the dat in folder, computed once per dat."""
+        return self.context.cached(('destination', self.folder), self._destination)
+
+    def _destination(self) -> Path:
         """Parse path."""
         static_path = self.database_dat.static_path if self.database_dat else None
         path = self.file_dat.path if self.file_dat.path is not None else static_path
@@ -181,21 +374,32 @@ class Copy(Process):
             else Path(self.folder) / path / self.file_dat.name
 
     def process(self) -> str:
-        """Copy files."""
+        """Copy files, holding the lock of the destination as other seeds may be writing it."""
+        destination = self.destination()
+        with path_lock(destination):
+            return self.copy(destination)
+
+    def copy_path(self, origin: str | Path | None, destination: Path) -> None:
+        """Copy, hardlink or reflink the dat to destination, as configured in CopyMode."""
+        copy_path(origin, destination, mode=config.get('PROCESS', 'CopyMode', fallback='copy'),
+                  skip_identical=config.getboolean('PROCESS', 'CopySkipIdentical', fallback=True))
+
+    def copy(self, destination: Path) -> str:
+        """Copy files to destination."""
         result = None
         origin = self.file if self.file else None
-        destination = self.destination()
         if not self.database_dat:
-            copy_path(origin, destination)
+            self.copy_path(origin, destination)
             return 'Copied'
         if not self.database_dat.is_enabled():
             self.file_dat.new_file = None
+            self.context.invalidate()
             return 'Ignored'
         old_file = Path(self.database_data.get('new_file', '') or '')
         new_file = destination
 
         if old_file == new_file and destination.exists() \
-            and not config.getboolean('PROCESS', 'Overwrite', fallback=False):
+            and not self.overwrites():
             self.stop = True
             return 'Exists'
 
@@ -203,7 +407,7 @@ class Copy(Process):
             result = 'Created'
         elif old_file != new_file:
             result = 'Updated'
-        elif config.getboolean('PROCESS', 'Overwrite', fallback=False):
+        elif self.overwrites():
             result = 'Overwritten'
         elif not new_file.exists():
             result = 'Updated'
@@ -212,14 +416,12 @@ class Copy(Process):
             raise TypeError(msg)
 
         try:
-            if self.database_data \
-                and self.database_data.get('date', None) \
-                and self.file_data.get('date', None) \
-                and compare_dates(self.database_dat.date, self.file_dat.date):
+            if self.newer_in_database():
                 return 'No Action Taken, Newer Found'
 
             self.database_dat.new_file = destination
-            copy_path(origin, destination)
+            self.context.invalidate()
+            self.copy_path(origin, destination)
         except ValueError:
             pass
         return result
@@ -231,7 +433,7 @@ class SaveToDatabase(Process):
     def process(self) -> str:
         """Save process to database."""
         try:
-            data_to_save = {**self.database_data, **self.file_data}
+            data_to_save = {**self.database_data, **self.file_data, **self.source_data()}
             instance = Dat(**data_to_save)
             instance.save()
             instance.flush()
@@ -239,29 +441,148 @@ class SaveToDatabase(Process):
         except Exception as e:  # noqa: BLE001
             logger.exception(e)
             return 'Error'
-        else:
-            return 'Saved'
+        self.update_rom_index(instance)
+        return 'Saved'
+
+    def source_data(self) -> dict:
+        """Get the size, modification time and content hash of the source, so it is skipped while unchanged."""
+        file = getattr(self, 'file', None)
+        if not file or not Path(file).is_file():
+            return {}
+        stat = Path(file).stat()
+        return {'source_size': stat.st_size, 'source_mtime': stat.st_mtime_ns, 'source_hash': content_hash(file)}
+
+    def update_rom_index(self, instance: Dat) -> None:
+        """Index the roms of the saved dat, only if its file changed since it was indexed.
+
+        The copy in the dat root holds the games of the source until a transform rewrites it, which
+        indexes it again, so the source already parsed by the pipeline gives its records.
+        """
+        file = instance.new_file or instance.file
+        if not file or not Path(file).is_file():
+            return
+        try:
+            if rom_index.is_indexed(instance.seed, instance.name, file):
+                return
+            index_dat(instance.seed, instance.name, file, self.file_dat.iter_game_records(keep_source=False))
+        except Exception as e:  # noqa: BLE001
+            logger.debug('Could not index %s: %s', file, e)
+
+
+class Transform(Process):
+    """Base class of the actions that rewrite the dat copied to the dat root.
+
+    An action that is `enabled` gives the `transform` to apply to every game of the dat and then its
+    `result`. Run alone it reads and writes the dat itself, consecutive transforms are fused by the
+    processor in a `TransformPass`.
+    """
 
+    fusable = True
+    changed = False
 
-class MarkMias(Process):
+    @abstractmethod
+    def enabled(self) -> bool:
+        """Whether the action has something to do, it is 'Skipped' if not."""
+
+    @abstractmethod
+    def transform(self, dat: DatFile) -> Callable[[dict], dict | None]:
+        """Get the transform of the games of the dat."""
+
+    @abstractmethod
+    def result(self) -> str:
+        """Get the status of the action once every game was transformed, and set `changed`."""
+
+
+class TransformPass:
+    """Consecutive transform actions fused in a single pass over the dat copied to the dat root.
+
+    The dat is read once, every game goes through the transform of each enabled action in order, and
+    the dat is written once if any of them changed it. Each action still reports its own status.
+    """
+
+    def __init__(self, processes: list[Transform]) -> None:
+        """Initialize the pass."""
+        self.processes = processes
+
+    def process(self) -> list[str]:
+        """Run the pass, return the status of every action."""
+        enabled = [process.enabled() for process in self.processes]
+        if not any(enabled):
+            return ['Skipped'] * len(self.processes)
+        database_dat = self.processes[0].database_dat
+        file = getattr(database_dat, 'new_file', None) or getattr(database_dat, 'file', None)
+        try:
+            dat = get_dat_file(file)
+            dat.transform(*[process.transform(dat)
+                            for process, is_enabled in zip(self.processes, enabled, strict=True) if is_enabled])
+        except Exception as e:  # noqa: BLE001
+            logger.exception(e)
+            return ['Error' if is_enabled else 'Skipped' for is_enabled in enabled]
+        statuses = [process.result() if is_enabled else 'Skipped'
+                    for process, is_enabled in zip(self.processes, enabled, strict=True)]
+        if any(process.changed for process in self.processes):
+            save_transformed(dat, database_dat)
+        dat.close()
+        return statuses
+
+
+def save_transformed(dat: DatFile, database_dat: Dat) -> None:
+    """Save a dat rewritten by transforms and index its roms again, the rom index must not keep the old ones."""
+    dat.save()
+    if getattr(database_dat, 'seed', None) and getattr(database_dat, 'name', None):
+        index_dat(database_dat.seed, database_dat.name, dat.file, dat.iter_game_records(keep_source=False))
+
+
+class MarkMias(Transform):
     """Mark missing in action."""
 
+    def enabled(self) -> bool:
+        """Whether missing in action are processed."""
+        return config.getboolean('PROCESS', 'ProcessMissingInAction', fallback=False)
+
+    def transform(self, dat: DatFile) -> Callable[[dict], dict | None]:
+        """Mark the missing in action of a game."""
+        return dat.mark_mias_transform(get_mias())
+
+    def result(self) -> str:
+        """Marked."""
+        self.changed = True
+        return 'Marked'
+
     def process(self) -> str:
         """Mark missing in action."""
-        if not config.getboolean('PROCESS', 'ProcessMissingInAction', fallback=False):
+        if not self.enabled():
             return 'Skipped'
-        mark_mias(dat_file=self.database_dat.new_file)
+        dat = get_dat_file(self.database_dat.new_file)
+        dat.mark_mias(get_mias())
+        save_transformed(dat, self.database_dat)
+        dat.close()
         return 'Marked'
 
 
-class AutoMerge(Process):
+class AutoMerge(Transform):
     """Save process to database."""
 
     child_db = None
+    merged_roms: list = None
+
+    def enabled(self) -> bool:
+        """Whether the dat is automerged."""
+        return bool(getattr(self.database_dat, 'automerge', None))
+
+    def transform(self, dat: DatFile) -> Callable[[dict], dict | None]:
+        """Remove from a game the roms of the previous games."""
+        self.merged_roms = []
+        return Dedupe(dat).transform(self.merged_roms)
+
+    def result(self) -> str:
+        """Automerged if any rom was removed."""
+        self.changed = bool(self.merged_roms)
+        return 'Automerged' if self.changed else 'Skipped'
 
     def process(self) -> str:
         """Save process to database."""
-        if getattr(self.database_dat, 'automerge', None):
+        if self.enabled():
             merged = Dedupe(self.database_dat)
         else:
             return 'Skipped'
@@ -271,9 +592,26 @@ class AutoMerge(Process):
         return 'Skipped'
 
 
-class Deduplicate(Process):
+class Deduplicate(Transform):
     """Save process to database."""
 
+    serial = True
+    merged_roms: list = None
+
+    def enabled(self) -> bool:
+        """Whether the dat has a parent."""
+        return bool(getattr(self.database_dat, 'parent', None))
+
+    def transform(self, dat: DatFile) -> Callable[[dict], dict | None]:
+        """Remove from a game the roms of the parent."""
+        self.merged_roms = []
+        return Dedupe(dat, self.database_dat.parent).transform(self.merged_roms)
+
+    def result(self) -> str:
+        """Deduped if any rom was removed."""
+        self.changed = bool(self.merged_roms)
+        return 'Deduped' if self.changed else 'Skipped'
+
     def process(self) -> str:
         """Save process to database."""
         if parent := getattr(self.database_dat, 'parent', None):
@@ -284,9 +622,3 @@ class Deduplicate(Process):
             merged.save()
             return 'Deduped'
         return 'Skipped'
-
-
-
-if __name__ == '__main__':
-    procesor = Processor()
-    procesor.process()
@@ -2,12 +2,15 @@
 from argparse import ArgumentParser
 
 from datoso.commands.commands import (
+    command_cache,
     command_config,
     command_dat,
+    command_database,
     command_deduper,
     command_doctor,
     command_import,
     command_log,
+    command_rom,
     command_seed,
     command_seed_details,
     command_seed_installed,
@@ -41,6 +44,31 @@ def add_config_parser(subparser: ArgumentParser) -> None:
     where_group.add_argument('-l','--local', action='store_true',
                     help='When set, saves to `.datosorc` in current directory, disabled by default')
 
+def add_cache_parser(subparser: ArgumentParser) -> None:
+    """Cache parser."""
+    parser_cache = subparser.add_parser('cache', help='Show or clear the cache of parsed dats')
+    group_cache = parser_cache.add_mutually_exclusive_group()
+    group_cache.add_argument('-l', '--list', action='store_true', help='List cached dats, least recently used first')
+    group_cache.add_argument('-c', '--clear', action='store_true', help='Remove every cached dat')
+    parser_cache.set_defaults(func=command_cache)
+
+def add_database_parser(subparser: ArgumentParser) -> None:
+    """Database parser."""
+    parser_database = subparser.add_parser('database', help='Show the database or migrate it to sqlite')
+    parser_database.add_argument('-m', '--migrate', action='store_true',
+                                 help='Copy the json database to the sqlite database, replacing its records')
+    parser_database.set_defaults(func=command_database)
+
+def add_rom_parser(subparser: ArgumentParser) -> None:
+    """Rom parser."""
+    parser_rom = subparser.add_parser('rom', help='Find the dats containing a rom by its hash')
+    parser_rom.add_argument('hash', nargs='?', help='crc, md5, sha1 or sha256 of the rom')
+    parser_rom.add_argument('-t', '--type', choices=['crc', 'md5', 'sha1', 'sha256'],
+                            help='Type of the hash, detected by its length by default')
+    parser_rom.add_argument('-r', '--reindex', action='store_true',
+                            help='Index the roms of every dat in the database that changed since it was indexed')
+    parser_rom.set_defaults(func=command_rom)
+
 def add_doctor_parser(subparser: ArgumentParser) -> None:
     """Doctor parser."""
     parser_doctor = subparser.add_parser('doctor', help='Doctor installed seeds')
@@ -124,10 +152,16 @@ def add_all_seed_parser(subparser: ArgumentParser) -> None:
         parser_command_process.add_argument('-p', '--process', action='store_true', help='Process dats from seed')
         parser_command_process.add_argument('-a', '--actions', action='append', help='Action to execute')
         parser_command_process.add_argument('-fd', '--filter', help='Filter dats to process')
+        parser_command_process.add_argument('-j', '--jobs', type=int,
+                                            help='Number of processes to process dats with (default PROCESS.Jobs)')
+        parser_command_process.add_argument('-pl', '--pipeline', action='store_true',
+                                            help='With fetch, process every dat as soon as it is fetched')
         if seed_name == 'all':
             parser_command.add_argument('-e', '--exclude', action='append',
                                         help='Exclude seed or seeds (only work with all)')
             parser_command.add_argument('-o', '--only', action='append', help='Only seed or seeds')
+            parser_command.add_argument('-P', '--parallel', type=int,
+                                        help='Number of seeds to fetch and process at the same time')
         else:
             parser_command_process.add_argument('-o', '--overwrite', action='store_true', help='Force overwrite dats')
             seed.args(parser_command)
@@ -15,11 +15,19 @@ from datoso.commands.helpers.dat import helper_command_dat
 from datoso.commands.helpers.seed import command_seed_all, command_seed_parse_actions
 from datoso.commands.seed import Seed
 from datoso.configuration import config
-from datoso.database.models.dat import Dat
+from datoso.database import (
+    DATABASE_URL,
+    SQLITE_DATABASE_URL,
+    DatabaseSingleton,
+    migrate_to_sqlite,
+)
+from datoso.database.models.dat import Dat, batched_writes
+from datoso.database.rom_index import index_dat, rom_index
 from datoso.helpers import Bcolors
 from datoso.helpers.file_utils import parse_path
 from datoso.helpers.plugins import installed_seeds, seed_description
-from datoso.repositories.dedupe import Dedupe
+from datoso.repositories.dat_cache import dat_cache
+from datoso.repositories.dedupe import Dedupe, get_dat_file
 from datoso.seeds.rules import Rules
 from datoso.seeds.unknown_seed import detect_seed
 
@@ -64,27 +72,28 @@ def command_import(args) -> None:  # noqa: ANN001
 
     fromhere = ''
     found = False
-    for dat_name in dats:
-        if fromhere in (dat_name, ''):
-            found = True
-        if not found:
-            continue
-        if args.ignore and any(x in dat_name for x in args.ignore):
-            print(f'Ignoring {Bcolors.WARNING}{dat_name}{Bcolors.ENDC}')
-            continue
-        print(f'{dat_name} - ', end='')
-        try:
-            seed, _class = detect_seed(dat_name, rules)
-            print(f'{seed} - {_class.__name__ if _class else None}')
-            dat = _class(file=dat_name)
-            dat.load()
-            database = Dat(**{**dat.dict(), 'seed': seed, 'new_file': dat_name})
-            database.save()
-            database.flush()
-        except LookupError as e:
-            print(f'{Bcolors.FAIL}Error detecting seed type err1{Bcolors.ENDC} - {e}')
-        except TypeError as e:
-            print(f'{Bcolors.FAIL}Error detecting seed type err2{Bcolors.ENDC} - {e}')
+    with batched_writes():
+        for dat_name in dats:
+            if fromhere in (dat_name, ''):
+                found = True
+            if not found:
+                continue
+            if args.ignore and any(x in dat_name for x in args.ignore):
+                print(f'Ignoring {Bcolors.WARNING}{dat_name}{Bcolors.ENDC}')
+                continue
+            print(f'{dat_name} - ', end='')
+            try:
+                seed, _class = detect_seed(dat_name, rules)
+                print(f'{seed} - {_class.__name__ if _class else None}')
+                dat = _class(file=dat_name)
+                dat.load()
+                database = Dat(**{**dat.dict(), 'seed': seed, 'new_file': dat_name})
+                database.save()
+                database.flush()
+            except LookupError as e:
+                print(f'{Bcolors.FAIL}Error detecting seed type err1{Bcolors.ENDC} - {e}')
+            except TypeError as e:
+                print(f'{Bcolors.FAIL}Error detecting seed type err2{Bcolors.ENDC} - {e}')
 
 
 def command_dat(args: Namespace) -> None:
@@ -121,6 +130,22 @@ def command_seed_details(args: Namespace) -> None:
     print(f'  * Description: {module.__description__}')
 
 
+def command_seed_pipeline(args: Namespace) -> None:
+    """Fetch a seed and process each of its dats as soon as it is fetched."""
+    seed = Seed(name=args.seed)
+    message = f'{Bcolors.OKCYAN}Fetching and processing seed {Bcolors.OKGREEN}{args.seed}{Bcolors.ENDC}'
+    print('='*(len(message)-14))
+    print(message)
+    print('-'*(len(message)-14))
+    jobs = getattr(args, 'jobs', None) or config.getint('PROCESS', 'Jobs', fallback=1)
+    if seed.fetch_and_process_dats(fltr=getattr(args, 'filter', None), actions_to_execute=args.actions, jobs=jobs):
+        print(f'Errors fetching {Bcolors.FAIL}{args.seed}{Bcolors.ENDC}')
+        print('Please enable logs for more information or use -v parameter')
+        command_doctor(args)
+        sys.exit(1)
+    print(f'{Bcolors.OKBLUE}Finished fetching and processing {Bcolors.OKGREEN}{args.seed}{Bcolors.ENDC}')
+
+
 def command_seed(args: Namespace) -> None:
     """Commands with the seed (must be installed)."""
     command_seed_parse_actions(args)
@@ -129,6 +154,8 @@ def command_seed(args: Namespace) -> None:
         sys.exit(0)
     if getattr(args, 'details', False):
         command_seed_details(args)
+    elif getattr(args, 'fetch', False) and getattr(args, 'process', False) and getattr(args, 'pipeline', False):
+        command_seed_pipeline(args)
     else:
         seed = Seed(name=args.seed)
         if getattr(args, 'fetch', False):
@@ -147,7 +174,8 @@ def command_seed(args: Namespace) -> None:
             print('='*(len(message)-14))
             print(message)
             print('-'*(len(message)-14))
-            if seed.process_dats(fltr=getattr(args, 'filter', None), actions_to_execute=args.actions):
+            jobs = getattr(args, 'jobs', None) or config.getint('PROCESS', 'Jobs', fallback=1)
+            if seed.process_dats(fltr=getattr(args, 'filter', None), actions_to_execute=args.actions, jobs=jobs):
                 print(f'Errors processing {Bcolors.FAIL}{args.seed}{Bcolors.ENDC}')
                 print('Please enable logs for more information or use -v parameter')
                 command_doctor(args)
@@ -286,6 +314,73 @@ def command_config(args: Namespace) -> None:
         print(json.dumps(config_dict, indent=4))
 
 
+def command_cache(args: Namespace) -> None:
+    """Show or clear the cache of parsed dats."""
+    if getattr(args, 'clear', False):
+        removed = dat_cache.clear()
+        print(f'Removed {Bcolors.OKGREEN}{removed}{Bcolors.ENDC} cached dats from {dat_cache.path}')
+        return
+    if getattr(args, 'list', False):
+        for _, stat, meta in dat_cache.entries():
+            status = f'{Bcolors.OKGREEN}fresh{Bcolors.ENDC}' if dat_cache.is_fresh(meta) \
+                else f'{Bcolors.WARNING}stale{Bcolors.ENDC}'
+            print(f'{status} {stat.st_size / 1024 / 1024:8.2f} MB {meta["dat_class"]:<20} {meta["source"]}')
+    files = dat_cache.files()
+    print(f'Cache path: {Bcolors.OKCYAN}{dat_cache.path}{Bcolors.ENDC}')
+    print(f'Enabled: {dat_cache.enabled}')
+    print(f'Cached dats: {len(files)}')
+    print(f'Size: {sum(stat.st_size for _, stat in files) / 1024 / 1024:.2f} MB '
+          f'of {dat_cache.max_size / 1024 / 1024:.0f} MB')
+
+
+def command_database(args: Namespace) -> None:
+    """Show the database or migrate it to sqlite."""
+    if getattr(args, 'migrate', False):
+        counts = migrate_to_sqlite()
+        print(f'Migrated {Bcolors.OKGREEN}{sum(counts.values())}{Bcolors.ENDC} records from {DATABASE_URL} '
+              f'to {SQLITE_DATABASE_URL}')
+        for table, count in counts.items():
+            print(f'  {table}: {count}')
+        print(f'Use it with {Bcolors.OKCYAN}datoso config --set DATABASE.Backend sqlite{Bcolors.ENDC}')
+        return
+    backend = config.get('DATABASE', 'Backend') or 'json'
+    database = DatabaseSingleton().DB
+    print(f'Backend: {Bcolors.OKCYAN}{backend}{Bcolors.ENDC}')
+    print(f'Path: {SQLITE_DATABASE_URL if backend == "sqlite" else DATABASE_URL}')
+    for table in sorted(database.tables()):
+        print(f'  {table}: {len(database.table(table))}')
+
+
+def command_rom(args: Namespace) -> None:
+    """Find the dats containing a rom by its hash."""
+    if getattr(args, 'reindex', False):
+        indexed = 0
+        for dat in Dat.all():
+            file = dat.get('new_file')
+            if not file or not Path(file).is_file():
+                continue
+            try:
+                dat_file = get_dat_file(file)
+                indexed += index_dat(dat['seed'], dat['name'], file, dat_file.iter_game_records(keep_source=False))
+            except ValueError as e:
+                print(f'{Bcolors.WARNING}Could not index {file}: {e}{Bcolors.ENDC}')
+        dats, roms = rom_index.stats()
+        print(f'Indexed {Bcolors.OKGREEN}{indexed}{Bcolors.ENDC} dats, {dats} dats and {roms} roms in {rom_index.path}')
+    if not args.hash:
+        return
+    try:
+        found = rom_index.find(args.hash, args.type)
+    except ValueError as e:
+        print(f'{Bcolors.FAIL}{e}{Bcolors.ENDC}')
+        sys.exit(1)
+    if not found:
+        print(f'{Bcolors.WARNING}No dats found with {args.hash}{Bcolors.ENDC}')
+        return
+    for rom in found:
+        print(f'{Bcolors.OKCYAN}{rom["seed"]}:{rom["dat"]}{Bcolors.ENDC} - {rom["game"]} - '
+              f'{rom["name"]} ({rom["size"]})')
+
+
 def command_list(_) -> None:  # noqa: ANN001
     """List installed seeds."""
     description_len = 60
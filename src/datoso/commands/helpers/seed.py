@@ -1,15 +1,28 @@
 """Helper functions for the seed command."""
+import io
+import logging
+import logging.handlers
+import multiprocessing
 import re
 import sys
 from argparse import Namespace
 from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from copy import copy
+from multiprocessing.synchronize import Lock
 
 from datoso.commands.seed import Seed
 from datoso.configuration import config
 from datoso.configuration.configuration import get_seed_name
+from datoso.database import journal, use_memory_database
+from datoso.database.models.dat import Dat, replay
+from datoso.database.rom_index import rom_index
 from datoso.helpers import Bcolors
 from datoso.helpers.plugins import installed_seeds
 
+logger = logging.getLogger(__name__)
+
 
 def command_seed_parse_actions(args: Namespace) -> None:
     """Parse the actions."""
@@ -23,8 +36,9 @@ def command_seed_parse_actions(args: Namespace) -> None:
         print(f'{Bcolors.FAIL}No action specified{Bcolors.ENDC} (fetch, process, details)')
         sys.exit(1)
 
-def command_seed_all(args: Namespace, command_seed: Callable) -> None:
-    """Run the seed command for all seeds."""
+def selected_seeds(args: Namespace) -> list[str]:
+    """Get the names of the seeds to run, without the excluded and ignored ones."""
+    seed_names = []
     for seed in installed_seeds():
         seed_name = get_seed_name(seed)
         if (args.exclude and seed_name in args.exclude) or \
@@ -34,5 +48,124 @@ def command_seed_all(args: Namespace, command_seed: Callable) -> None:
             ignore_regex = re.compile(config['PROCESS']['SeedIgnoreRegEx'])
             if ignore_regex.match(seed_name):
                 continue
+        seed_names.append(seed_name)
+    return seed_names
+
+
+class BufferingLogHandler(logging.handlers.BufferingHandler):
+    """Keep every log record of a seed until the seed ends."""
+
+    def __init__(self) -> None:
+        """Initialize the handler."""
+        super().__init__(capacity=0)
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:  # noqa: ARG002, N802
+        """Never flush while the seed runs."""
+        return False
+
+
+_seed_worker: tuple[Namespace, Callable, Lock] | None = None
+
+
+def _init_seed_worker(args: Namespace, command_seed: Callable, output_lock: Lock) -> None:
+    """Initialize a worker process of `command_seed_parallel`."""
+    global _seed_worker  # noqa: PLW0603
+    _seed_worker = args, command_seed, output_lock
+    use_memory_database()
+    rom_index.forget()
+
+
+def _run_seed(seed_name: str) -> tuple[int, list]:
+    """Run the seed command for a seed in a worker, return its exit code and the records it saved.
+
+    The output and the logs of the seed are buffered and written at once when it ends, so the seeds
+    running at the same time do not interleave.
+    """
+    args, command_seed, output_lock = _seed_worker
+    args = copy(args)
+    args.seed = seed_name
+    root = logging.getLogger()
+    handlers = root.handlers
+    buffered = BufferingLogHandler()
+    root.handlers = [buffered]
+    output = io.StringIO()
+    code = 0
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            command_seed(args)
+    except SystemExit as e:
+        code = e.code or 0
+    except Exception:
+        logger.exception('Error running seed %s', seed_name)
+        code = 1
+    finally:
+        root.handlers = handlers
+    with output_lock:
+        sys.stdout.write(output.getvalue())
+        sys.stdout.flush()
+        for record in buffered.buffer:
+            root.handle(record)
+    return code, journal.drain()
+
+
+def seed_dependencies(seed_names: list[str]) -> dict[str, set[str]]:
+    """Get the other seeds of seed_names each seed has dats with a parent in, from the database records."""
+    dependencies = {seed_name: set() for seed_name in seed_names}
+    for record in Dat.all():
+        parent = record.get('parent')
+        if record.get('seed') not in dependencies or not isinstance(parent, str) or ':' not in parent:
+            continue
+        parent_seed = parent.split(':', 1)[0]
+        if parent_seed in dependencies and parent_seed != record['seed']:
+            dependencies[record['seed']].add(parent_seed)
+    return dependencies
+
+
+def seed_waves(seed_names: list[str], dependencies: dict[str, set[str]]) -> list[list[str]]:
+    """Group the seeds so every seed runs after the seeds it depends on, in order.
+
+    The seeds of a dependency cycle are run one per group.
+    """
+    waves = []
+    done = set()
+    pending = list(seed_names)
+    while pending:
+        wave = [seed_name for seed_name in pending if dependencies.get(seed_name, set()) <= done] or pending[:1]
+        waves.append(wave)
+        done.update(wave)
+        pending = [seed_name for seed_name in pending if seed_name not in done]
+    return waves
+
+
+def command_seed_parallel(args: Namespace, command_seed: Callable, seed_names: list[str], parallel: int) -> int:
+    """Run the seed command for some seeds in parallel processes, return the number of seeds that failed.
+
+    Every seed runs in its own process with the database in memory, the records it saved are
+    replayed here when it ends, so the database file has a single writer. A seed with dats whose
+    parent is in another seed runs after it, in a pool forked once its records are replayed.
+    """
+    context = multiprocessing.get_context('fork')
+    failed = 0
+    for wave in seed_waves(seed_names, seed_dependencies(seed_names)):
+        with ProcessPoolExecutor(max_workers=min(parallel, len(wave)), mp_context=context,
+                                 initializer=_init_seed_worker,
+                                 initargs=(args, command_seed, context.Lock())) as executor:
+            for future in as_completed([executor.submit(_run_seed, seed_name) for seed_name in wave]):
+                code, entries = future.result()
+                replay(entries)
+                failed += bool(code)
+    return failed
+
+
+def command_seed_all(args: Namespace, command_seed: Callable) -> None:
+    """Run the seed command for all seeds, parallel seeds at a time if set."""
+    seed_names = selected_seeds(args)
+    parallel = getattr(args, 'parallel', None) or 1
+    # workers are forked with the arguments, there is no pool where fork is not available
+    if parallel > 1 and len(seed_names) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        if command_seed_parallel(args, command_seed, seed_names, parallel):
+            sys.exit(1)
+        return
+    for seed_name in seed_names:
         args.seed = seed_name
         command_seed(args)
@@ -1,17 +1,50 @@
 """Fetch and Process Commands for Seeds."""
 # ruff: noqa: ERA001
+import inspect
+import multiprocessing
 import re
 from argparse import ArgumentParser
-from collections.abc import Iterator
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import chain
 from pathlib import Path
+from queue import SimpleQueue
+
+from tinydb import Query
 
 from datoso import __app_name__
-from datoso.actions.processor import Processor
+from datoso.actions.processor import PipelinePlan, Processor
 from datoso.configuration import config
+from datoso.database import journal, use_memory_database
+from datoso.database.models.dat import Dat, batched_writes, replay
+from datoso.database.rom_index import rom_index
 from datoso.helpers import Bcolors
-from datoso.helpers.file_utils import parse_path
+from datoso.helpers.file_utils import content_hash, parse_path
 from datoso.helpers.plugins import PluginType, installed_seeds
 
+# seconds a fetched dat must be unchanged to be processed while the seed is being fetched
+LANDED_INTERVAL = 1.0
+
+_worker: tuple['Seed', list[tuple[Path, list]]] | None = None
+
+
+def _init_worker(seed: 'Seed', dat_plans: list[tuple[Path, PipelinePlan]]) -> None:
+    """Initialize a worker process of `Seed.process_parallel`."""
+    global _worker  # noqa: PLW0603
+    _worker = seed, dat_plans
+    use_memory_database()
+    rom_index.forget()
+
+
+def _process_task(file: Path, index: int) -> tuple[list, list]:
+    """Process a dat in a worker, return its output and the records it saved."""
+    seed, dat_plans = _worker
+    output = seed.process_file(file, dat_plans[index][1])
+    return output, journal.drain()
+
+
 STATUS_TO_SHOW = ['Updated', 'Created', 'Error', 'Disabled', 'Deduped', 'Automerged', 'No Action Taken, Newer Found', 'Overwritten']
 
 class Seed:
@@ -22,6 +55,11 @@ class Seed:
     module = None
     actions: dict = None
     config = None
+    # the records of the dats of the seed by source file, to skip the unchanged sources
+    _sources: dict | None = None
+    # the dats that changed after they were processed while the seed was fetched, processed again
+    # replacing their copy
+    _refetched: set | None = None
 
     def __init__(self, **kwargs) -> None:  # noqa: ANN003
         """Initialize the seed."""
@@ -95,10 +133,24 @@ class Seed:
         """Return the description of the seed."""
         return self.get_module().__description__
 
-    def fetch(self) -> None:
-        """Fetch seed."""
+    def fetch(self, landed: Callable[[str | Path], None] | None = None) -> None:
+        """Fetch seed.
+
+        A fetch that accepts a `landed` callback calls it with every dat once it is written whole.
+        """
         fetch = self.get_module('fetch')
-        fetch.fetch()
+        if landed and self.signals_landed():
+            fetch.fetch(landed=landed)
+        else:
+            fetch.fetch()
+
+    def signals_landed(self) -> bool:
+        """Check if the fetch of the seed calls back with every dat once it is written whole."""
+        try:
+            fetch = self.get_module('fetch')
+        except AttributeError:
+            return False
+        return 'landed' in inspect.signature(fetch.fetch).parameters
 
     def args(self, parser: ArgumentParser) -> ArgumentParser:
         """Seed args."""
@@ -166,6 +218,45 @@ class Seed:
             output.append('Disabled')
         return output
 
+    def source_records(self) -> dict[str, dict]:
+        """Get the database records of the dats of the seed by the source file they were processed from."""
+        return {record['file']: record for record in Dat.search(Query().seed == self.name) if record.get('file')}
+
+    def is_unchanged(self, file: Path) -> bool:
+        """Check if the source of a dat is unchanged since it was processed and its dat is still in place.
+
+        The size and modification time are compared first, the content hash only if the size matches but
+        the modification time does not.
+        """
+        record = (self._sources or {}).get(str(file))
+        if not record or not record.get('source_hash') or record.get('status') not in (None, 'enabled') \
+                or not record.get('new_file') or not Path(record['new_file']).exists():
+            return False
+        try:
+            stat = file.stat()
+        except OSError:
+            return False
+        if not file.is_file() or stat.st_size != record.get('source_size'):
+            return False
+        if stat.st_mtime_ns == record.get('source_mtime'):
+            return True
+        if content_hash(file) != record['source_hash']:
+            return False
+        # same content with a new modification time, stored so next time only the stat is compared
+        dat = Dat(name=record['name'], seed=record['seed'])
+        dat.load()
+        dat.source_mtime = stat.st_mtime_ns
+        dat.save()
+        dat.flush()
+        return True
+
+    def process_file(self, file: Path, plan: PipelinePlan) -> list:
+        """Process a dat, unless its source is unchanged since it was processed (see `is_unchanged`)."""
+        overwrite = file in (self._refetched or ())
+        if not overwrite and self.is_unchanged(file):
+            return ['Unchanged'] if config.getboolean('COMMAND', 'Verbose', fallback=False) else []
+        return self.process_action(Processor(seed=self.name, file=file, plan=plan, overwrite=overwrite))
+
     def get_action(self, action: str) -> dict:
         """Get action."""
         for actions in self.actions.values():
@@ -184,31 +275,182 @@ class Seed:
                 and not self.get_action('Deduplicate'):
                 seed_actions.append({ 'action': 'Deduplicate' })
 
-    def process_dats(self, fltr: str | None=None, actions_to_execute: list | None=None) -> None:
-        """Process dats."""
+    def dat_plans(self, actions_to_execute: list | None=None) -> list[tuple[Path, PipelinePlan]]:
+        """Get every folder of dats of the seed with the plan of the actions to process its dats, compiled once."""
         tmp_path = config['PATHS'].get('DownloadPath', 'tmp')
         dat_origin = parse_path(tmp_path) / self.get_prefix(self.name) / 'dats'
-        line = ''
         self.get_actions()
         self.add_default_actions()
 
+        dat_plans = []
         for path, seed_actions in self.actions.items():
-            new_path = Path(path.format(dat_origin=dat_origin))
             actions = self.format_actions(seed_actions, data={
                 'dat_destination': config['PATHS'].get('DatPath', 'DatRoot'),
                 })
             # TODO(laromicas): override actions to process from config
             if actions_to_execute:
                 actions = [x for x in actions if x['action'] in actions_to_execute]
-            for file in new_path.iterdir() if new_path.is_dir() else []:
-                if self.should_ignore_file(fltr, file):
+            dat_plans.append((Path(path.format(dat_origin=dat_origin)), PipelinePlan.compile(actions)))
+        return dat_plans
+
+    def dat_tasks(self, dat_plans: list[tuple[Path, PipelinePlan]], fltr: str | None=None) -> list[tuple[Path, int]]:
+        """Get the dats to process, each one with the index of its folder in dat_plans."""
+        return [(file, index) for index, (path, _) in enumerate(dat_plans)
+                for file in (path.iterdir() if path.is_dir() else [])
+                if not self.should_ignore_file(fltr, file)]
+
+    @staticmethod
+    def fingerprint(file: Path) -> tuple | None:
+        """Get the size, date and inode of a dat, None if it doesn't exist."""
+        try:
+            stat = file.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def fingerprints(self, dat_plans: list[tuple[Path, PipelinePlan]], fltr: str | None=None) -> dict[Path, tuple]:
+        """Get the size, date and inode of every dat to process."""
+        return {file: fingerprint for file, _ in self.dat_tasks(dat_plans, fltr)
+                if (fingerprint := self.fingerprint(file)) is not None}
+
+    def landed_tasks(self, fetching: Future, dat_plans: list[tuple[Path, PipelinePlan]],
+                     fltr: str | None=None, before: dict[Path, tuple] | None=None,
+                     yielded: dict[Path, tuple] | None=None,
+                     landed: SimpleQueue | None=None) -> Iterator[tuple[Path, int]]:
+        """Yield the dats to process while the seed is being fetched, each one as soon as it lands.
+
+        A dat has landed when the fetch put its path in landed (see `fetch`), or when the fetch doesn't
+        call back, when it is not as it was before the fetch started (the fingerprints in before) and is
+        unchanged for LANDED_INTERVAL seconds. The fingerprint of every dat is kept in yielded, so the
+        dats left or changed once the fetch ends are processed by `fetched_tasks`.
+        """
+        before = before or {}
+        yielded = {} if yielded is None else yielded
+        signalled = set()
+        seen = {}
+        while not fetching.done():
+            while landed is not None and not landed.empty():
+                signalled.add(Path(landed.get()).resolve())
+            for file, index in self.dat_tasks(dat_plans, fltr):
+                fingerprint = self.fingerprint(file)
+                if fingerprint is None or yielded.get(file) == fingerprint or before.get(file) == fingerprint:
                     continue
+                if (file.resolve() in signalled) if landed is not None else (seen.get(file) == fingerprint):
+                    signalled.discard(file.resolve())
+                    yielded[file] = fingerprint
+                    yield file, index
+                else:
+                    seen[file] = fingerprint
+            wait([fetching], timeout=LANDED_INTERVAL)
+
+    def fetched_tasks(self, dat_plans: list[tuple[Path, PipelinePlan]], fltr: str | None=None,
+                      yielded: dict[Path, tuple] | None=None) -> list[tuple[Path, int]]:
+        """Get the dats to process once the seed is fetched, the ones not yielded by `landed_tasks` or changed since.
+
+        A dat that changed was processed while it was still being written, it is processed again
+        replacing its copy.
+        """
+        yielded = yielded or {}
+        tasks = []
+        for file, index in self.dat_tasks(dat_plans, fltr):
+            if file in yielded:
+                if yielded[file] == self.fingerprint(file):
+                    continue
+                self._refetched.add(file)
+            tasks.append((file, index))
+        return tasks
+
+    def process_sequential(self, tasks: Iterable[tuple[Path, int]],
+                           dat_plans: list[tuple[Path, PipelinePlan]]) -> Iterator[tuple[Path, Callable[[], list]]]:
+        """Yield every dat with the function that processes it."""
+        for file, index in tasks:
+            yield file, partial(self.process_file, file, dat_plans[index][1])
+
+    def process_parallel(self, tasks: Iterable[tuple[Path, int]], dat_plans: list[tuple[Path, PipelinePlan]],
+                         jobs: int) -> Iterator[tuple[Path, Callable[[], list]]]:
+        """Process the dats in a pool of processes, yield every dat, in order, with the function returning its output.
+
+        The workers keep the database in memory, the records they save are replayed here so the
+        database file has a single writer.
+        """
+        def result(future: Future) -> list:
+            output, entries = future.result()
+            replay(entries)
+            return output
+
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                                 initializer=_init_worker, initargs=(self, dat_plans)) as executor:
+            pending = deque()
+            for file, index in tasks:
+                pending.append((file, executor.submit(_process_task, file, index)))
+                while pending and (len(pending) > jobs or pending[0][1].done()):
+                    file_done, future = pending.popleft()
+                    yield file_done, partial(result, future)
+            while pending:
+                file_done, future = pending.popleft()
+                yield file_done, partial(result, future)
+
+    def dat_dependencies(self, file: Path, plan: PipelinePlan) -> tuple[tuple, tuple | None] | None:
+        """Get the seed and name of the dat of a file and of its parent, None if the dat can't be loaded."""
+        database_dat = Processor(seed=self.name, file=file, plan=plan).load_database_dat()
+        if database_dat is None:
+            return None
+        parent = getattr(database_dat, 'parent', None)
+        parent = tuple(parent.split(':', 1)) if isinstance(parent, str) and ':' in parent else None
+        return (database_dat.seed, database_dat.name), parent
+
+    def split_dependent(self, tasks: list[tuple[Path, int]],
+                        dat_plans: list[tuple[Path, PipelinePlan]]) -> tuple[list, list]:
+        """Split the tasks into the dats that can be processed in parallel and the ones that depend on them.
+
+        A dat depends on the dats of the run its actions read the records of (see `PipelinePlan.serial`):
+        an earlier dat with the same seed and name, or its parent. The dependent dats are processed one by
+        one once the others are saved, as are the dats that can't be loaded to tell.
+        """
+        if not any(plan.serial for _, plan in dat_plans):
+            return tasks, []
+        dependencies = [self.dat_dependencies(file, dat_plans[index][1]) for file, index in tasks]
+        names = {dependency[0] for dependency in dependencies if dependency}
+        seen = set()
+        independent, dependent = [], []
+        for task, dependency in zip(tasks, dependencies, strict=True):
+            if not dat_plans[task[1]][1].serial:
+                independent.append(task)
+            elif dependency is None:
+                dependent.append(task)
+            else:
+                (dependent if dependency[0] in seen or dependency[1] in names else independent).append(task)
+            if dependency:
+                seen.add(dependency[0])
+        return independent, dependent
+
+    def process_tasks(self, tasks: Iterable[tuple[Path, int]], dat_plans: list[tuple[Path, PipelinePlan]],
+                      jobs: int = 1) -> None:
+        """Process the dats of tasks, in jobs processes if more than one, showing their progress in order.
+
+        The workers only see the database as it was when the pool started, the dats that depend on what
+        other dats of the run save are processed one by one after the pool (see `split_dependent`).
+        """
+        line = ''
+        self._sources = {} if config.getboolean('PROCESS', 'Overwrite', fallback=False) else self.source_records()
+        # workers are forked with the seed and its actions, there is no pool where fork is not available
+        if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            tasks, dependent = self.split_dependent(list(tasks), dat_plans)
+            results = chain(self.process_parallel(tasks, dat_plans, jobs) if len(tasks) > 1
+                            else self.process_sequential(tasks, dat_plans),
+                            self.process_sequential(dependent, dat_plans))
+        else:
+            results = self.process_sequential(tasks, dat_plans)
+
+        # the database file is written once for a batch of dats, not once per dat
+        with batched_writes():
+            for file, result in results:
                 if not config.getboolean('COMMAND', 'Quiet', fallback=False):
                     self.delete_line(line)
                     line = f'Processing {Bcolors.OKCYAN}{file.name}{Bcolors.ENDC}'
                     print(line, end=' ', flush=True)
-                procesor = Processor(seed=self.name, file=file, actions=actions)
-                output = self.process_action(procesor)
+                output = result()
                 if not config.getboolean('COMMAND', 'Quiet', fallback=False):
                     self.delete_line(line)
                     line = f'Processed {Bcolors.OKCYAN}{file.name}{Bcolors.ENDC}'
@@ -222,6 +464,32 @@ class Seed:
                     print(line)
         self.delete_line(line)
 
+    def process_dats(self, fltr: str | None=None, actions_to_execute: list | None=None, jobs: int = 1) -> None:
+        """Process dats, in jobs processes if more than one."""
+        dat_plans = self.dat_plans(actions_to_execute)
+        tasks = self.dat_tasks(dat_plans, fltr)
+        self.process_tasks(tasks, dat_plans, jobs if len(tasks) > 1 else 1)
+
+    def fetch_and_process_dats(self, fltr: str | None=None, actions_to_execute: list | None=None,
+                               jobs: int = 1) -> bool | None:
+        """Fetch the seed and process its dats as they land, instead of after the whole fetch.
+
+        Return the result of the fetch, the errors it raises are raised once its dats are processed.
+        The dats landed while the seed is fetched are processed one by one, as no process can be
+        forked while the fetch runs in a thread, the dats left once the fetch ends in jobs processes.
+        """
+        dat_plans = self.dat_plans(actions_to_execute)
+        before = self.fingerprints(dat_plans, fltr)
+        yielded = {}
+        self._refetched = set()
+        landed = SimpleQueue() if self.signals_landed() else None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            fetching = executor.submit(self.fetch, landed.put) if landed is not None else executor.submit(self.fetch)
+            self.process_tasks(self.landed_tasks(fetching, dat_plans, fltr, before, yielded, landed), dat_plans)
+        tasks = self.fetched_tasks(dat_plans, fltr, yielded)
+        self.process_tasks(tasks, dat_plans, jobs if len(tasks) > 1 else 1)
+        return fetching.result()
+
     @staticmethod
     def list_installed() -> Iterator['Seed']:
         """Installed seeds."""
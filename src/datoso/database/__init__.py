@@ -1,14 +1,20 @@
 """Database module."""
+import json
 import os
+from collections.abc import Callable
+from contextlib import ExitStack
+from datetime import datetime
 from pathlib import Path, PosixPath
 from threading import Lock
-from typing import Any
+from typing import IO, Any, ClassVar
 
 from tinydb import JSONStorage, TinyDB
 from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import MemoryStorage
 
 from datoso.configuration import config
-from datoso.helpers.file_utils import copy_path, parse_path
+from datoso.database.sqlite import SQLiteDatabase, SQLiteStorage
+from datoso.helpers.file_utils import copy_file, parse_path, path_lock
 
 XDG_DATA_HOME = Path(os.environ.get('XDG_DATA_HOME', '~/.local/share')).expanduser()
 
@@ -16,6 +22,7 @@ database_path = parse_path(config['PATHS'].get('DatosoPath', '~/.local/share/dat
 database_path.mkdir(parents=True, exist_ok=True)
 
 DATABASE_URL = str(database_path / config['PATHS'].get('DatabaseFile', 'datoso.json'))
+SQLITE_DATABASE_URL = str(database_path / config['PATHS'].get('SQLiteDatabaseFile', 'datoso.db'))
 
 class Types:
     """Types class."""
@@ -30,9 +37,15 @@ class Types:
     PosixPath = PosixPath
 
 class JSONStorageWithBackup(JSONStorage):
-    """TinyDB JSON storage with backup."""
+    """TinyDB JSON storage with backup.
+
+    The database is backed up once per run, before its first write, to a timestamped snapshot next to
+    it. The last DATABASE.Backups snapshots are kept.
+    """
 
     path: str = DATABASE_URL
+    # the databases backed up by this run
+    backed_up: ClassVar[set[str]] = set()
 
     def __init__(self, path: str, create_dirs=None, encoding=None, access_mode='r+', **kwargs) -> None:  # noqa: ANN001, ANN003
         """Initialize the JSONStorageWithBackup."""
@@ -65,14 +78,28 @@ class JSONStorageWithBackup(JSONStorage):
 
     def write(self, data: dict[str, dict[str, Any]]) -> None:
         """Write data to the storage."""
-        self.make_backup()
         data = self.sanitize_data(data)
         # data = self.remove_nulls(data) # noqa: ERA001
+        self.make_backup()
         super().write(data)
 
+    def backups(self) -> list[Path]:
+        """Get the snapshots of the database, oldest first."""
+        path = Path(self.path)
+        return sorted(path.parent.glob(f'{path.name}.*.bak'))
+
     def make_backup(self) -> None:
-        """Make a backup of the database."""
-        copy_path(self.path, f'{self.path}.bak')
+        """Make a snapshot of the database, on its first write of this run, and remove the oldest ones."""
+        if self.path in self.backed_up:
+            return
+        self.backed_up.add(self.path)
+        keep = int(config.get('DATABASE', 'Backups') or 0)
+        if keep <= 0 or not os.path.getsize(self.path):  # noqa: PTH202
+            return
+        # a reflink where the filesystem supports it, the database is written in place so it can't be a hardlink
+        copy_file(self.path, f'{self.path}.{datetime.now():%Y%m%d%H%M%S%f}.bak', mode='reflink')  # noqa: DTZ005
+        for backup in self.backups()[:-keep]:
+            backup.unlink(missing_ok=True)
 
 
 class DatabaseSingletonMeta(type):
@@ -100,11 +127,210 @@ class DatabaseSingletonMeta(type):
         return cls._instances[cls]
 
 
+def json_database() -> TinyDB:
+    """Open the TinyDB database, a JSON file written whole on every flush."""
+    return TinyDB(DATABASE_URL, storage=CachingMiddleware(JSONStorageWithBackup), indent=4)
+
+
+def sqlite_database() -> SQLiteDatabase:
+    """Open the SQLite database, with indexed lookups and transactional writes."""
+    return SQLiteDatabase(SQLITE_DATABASE_URL)
+
+
+BACKENDS = {
+    'json': json_database,
+    'sqlite': sqlite_database,
+}
+
+
+def database_url(backend: str | None = None) -> str:
+    """Get the path of the database file of a backend, the one configured in DATABASE.Backend by default."""
+    backend = backend or config.get('DATABASE', 'Backend') or 'json'
+    return SQLITE_DATABASE_URL if backend.lower() == 'sqlite' else DATABASE_URL
+
+
+def open_database(backend: str | None = None) -> TinyDB | SQLiteDatabase:
+    """Open the database of a backend, the one configured in DATABASE.Backend by default."""
+    backend = backend or config.get('DATABASE', 'Backend') or 'json'
+    try:
+        return BACKENDS[backend.lower()]()
+    except KeyError:
+        msg = f'Unknown database backend {backend}, accepts={",".join(BACKENDS)}'
+        raise ValueError(msg) from None
+
+
 class DatabaseSingleton(metaclass=DatabaseSingletonMeta):
     """Database Singleton class."""
 
     DB = None
     def __init__(self) -> None:
         """Initialize the DatabaseSingleton."""
-        self.DB = TinyDB(DATABASE_URL, storage=CachingMiddleware(JSONStorageWithBackup), indent=4)
+        self.DB = open_database()
         self.table = None
+
+
+class Journal:
+    """Journal of the records saved by a process whose database is kept in memory.
+
+    Workers processing dats in parallel do not write the database file, the records they save are
+    journaled and sent back to the main process, the single writer that replays them.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the journal, inactive until `use_memory_database` is called."""
+        self.active = False
+        self.entries: list[tuple[str, dict]] = []
+
+    def record(self, model: str, document: dict) -> None:
+        """Record a saved document of a model."""
+        if self.active:
+            self.entries.append((model, document))
+
+    def drain(self) -> list[tuple[str, dict]]:
+        """Return the recorded entries and empty the journal."""
+        entries, self.entries = self.entries, []
+        return entries
+
+
+journal = Journal()
+
+
+class UnitOfWork:
+    """Batch the flushes of the database file, as every flush rewrites the whole file.
+
+    While it is active, flushing the database only counts the records saved, the file is written every
+    batch_size records and when the unit of work ends. The saved records are appended to a journal next
+    to the database file until they are written, so the records of an interrupted run are not lost. The
+    journal is locked while the unit of work is active, so a single run writes it at a time.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        """Initialize the unit of work of a database file, the one of the configured backend by default."""
+        self._path = Path(f'{path}.journal') if path else None
+        self.depth = 0
+        self.batch_size = 0
+        self.pending = 0
+        self._file: IO | None = None
+        self._lock: ExitStack | None = None
+
+    @property
+    def path(self) -> Path:
+        """Get the path of the journal, next to the database file."""
+        return self._path or Path(f'{database_url()}.journal')
+
+    @property
+    def active(self) -> bool:
+        """Check if flushes are being batched."""
+        return self.depth > 0
+
+    def entries(self) -> list[tuple[str, dict]]:
+        """Get the records journaled and not written to the database file, by an interrupted run."""
+        entries = []
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        model, document = json.loads(line)
+                    except ValueError:
+                        # the last line of a run interrupted while writing it
+                        break
+                    entries.append((model, document))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def begin(self, batch_size: int = 0,
+              recover: Callable[[list[tuple[str, dict]]], None] | None = None) -> None:
+        """Start batching the flushes, the units of work nested in another are part of it.
+
+        The outermost unit of work locks the journal until it ends. The records journaled by an interrupted
+        run are passed to recover to be saved before the journal is emptied, without recover it does not begin.
+        """
+        if not self.depth:
+            lock = ExitStack()
+            lock.enter_context(path_lock(self.path))
+            try:
+                if entries := self.entries():
+                    if recover is None:
+                        msg = f'The journal of an unfinished run must be replayed first: {self.path}'
+                        raise RuntimeError(msg)
+                    recover(entries)
+                self._file = open(self.path, 'w', encoding='utf-8')  # noqa: SIM115
+            except BaseException:
+                lock.close()
+                raise
+            self._lock = lock
+            self.batch_size = batch_size
+            self.pending = 0
+        self.depth += 1
+
+    def record(self, model: str, document: dict) -> None:
+        """Journal a saved document of a model until the database file is written, synced to the disk."""
+        if self._file:
+            self._file.write(json.dumps([model, document], default=str) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def flush(self, storage: CachingMiddleware) -> None:
+        """Flush the database, only every batch_size records while the unit of work is active."""
+        if not self.active:
+            storage.flush()
+            return
+        self.pending += 1
+        if self.batch_size and self.pending >= self.batch_size:
+            self.commit(storage)
+
+    def commit(self, storage: CachingMiddleware) -> None:
+        """Write the database file and empty the journal."""
+        storage.flush()
+        self.pending = 0
+        if self._file:
+            self._file.seek(0)
+            self._file.truncate()
+
+    def end(self, storage: CachingMiddleware) -> None:
+        """End the unit of work, the outermost one writes the database file and removes the journal."""
+        self.depth -= 1
+        if self.depth:
+            return
+        try:
+            self.commit(storage)
+            self._file.close()
+            self._file = None
+            self.path.unlink(missing_ok=True)
+        finally:
+            self._lock.close()
+            self._lock = None
+
+
+unit_of_work = UnitOfWork()
+
+
+def use_memory_database() -> None:
+    """Keep the database of this process in memory, from a snapshot of the current one, and journal its writes."""
+    database = DatabaseSingleton()
+    if isinstance(database.DB, SQLiteDatabase):
+        database.DB = database.DB.memory_copy()
+    else:
+        memory = TinyDB(storage=MemoryStorage)
+        memory.storage.write(database.DB.storage.read() or {})
+        database.DB = memory
+    journal.active = True
+
+
+def migrate_to_sqlite(source: str = DATABASE_URL, destination: str = SQLITE_DATABASE_URL) -> dict[str, int]:
+    """Copy the JSON database to the SQLite database, replacing its tables.
+
+    Return the number of documents copied of every table.
+    """
+    storage = JSONStorage(source, access_mode='r')
+    try:
+        data = storage.read() or {}
+    finally:
+        storage.close()
+    sqlite = SQLiteStorage(destination)
+    try:
+        sqlite.write(data)
+    finally:
+        sqlite.close()
+    return {name: len(documents) for name, documents in data.items()}
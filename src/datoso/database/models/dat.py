@@ -1,4 +1,6 @@
 """Database models for the datfile."""
+from collections.abc import Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import PosixPath
 from typing import Any
@@ -8,7 +10,8 @@ from tinydb import Query, TinyDB
 from tinydb.queries import QueryInstance
 from tinydb.table import Document, Table
 
-from datoso.database import DatabaseSingleton
+from datoso.configuration import config
+from datoso.database import DatabaseSingleton, journal, unit_of_work
 
 
 @dataclass
@@ -54,6 +57,7 @@ class Base:
             self._table.upsert(self.to_dict(), query.id == self._id)
         else:
             self._id = self._table.upsert(self.to_dict(), query or self.query())
+        (journal if journal.active else unit_of_work).record(type(self).__name__, self.to_dict())
 
     def to_dict(self) -> dict:
         """Convert to dictionary."""
@@ -101,8 +105,12 @@ class Base:
         self._table.remove(*args, **kwargs)
 
     def flush(self) -> None:
-        """Flush the database."""
-        self._table.storage.flush()
+        """Flush the database, the database of a journaled process is only in memory.
+
+        Inside `batched_writes` the database is flushed once for a batch of records.
+        """
+        if not journal.active:
+            unit_of_work.flush(self._table.storage)
 
     def get_db(self) -> TinyDB:
         """Get the database."""
@@ -125,12 +133,18 @@ class Dat(Base):
     new_file: str | None = None
     path: str | None = None
     date: str | None = None
+    # the date normalized to be compared (see normalize_date)
+    sort_date: str | None = None
     version: str | None = None
     system_type: str | None = None
     static_path: str | None = None
     status: str | None = None
     automerge: bool | None = None
     parent: str | None = None
+    # the size, modification time (ns) and sha1 of the source the dat was processed from
+    source_size: int | None = None
+    source_mtime: int | None = None
+    source_hash: str | None = None
 
     def query(self) -> QueryInstance:
         """Query to update or load a record."""
@@ -229,3 +243,32 @@ class MIA(Base):
         if self.crc32:
             return query.crc32 == self.crc32
         return None
+
+
+def replay(entries: list[tuple[str, dict]]) -> None:
+    """Save the records journaled by another process (see `datoso.database.Journal`) and flush the database."""
+    models = {model.__name__: model for model in (Dat, Seed, System, MIA)}
+    record = None
+    for model, document in entries:
+        record = models[model](**document)
+        record.save()
+    if record:
+        record.flush()
+
+
+@contextmanager
+def batched_writes(batch_size: int | None = None) -> Iterator[None]:
+    """Write the database file every batch_size records saved inside and once at the end, not on every flush.
+
+    The records journaled by an interrupted run are saved first (see `datoso.database.UnitOfWork`).
+    """
+    if journal.active:
+        # the database is in memory, there are no writes to batch
+        yield
+        return
+    unit_of_work.begin(config.getint('PROCESS', 'DatabaseBatchSize', fallback=500)
+                       if batch_size is None else batch_size, recover=replay)
+    try:
+        yield
+    finally:
+        unit_of_work.end(DatabaseSingleton().DB.storage)
@@ -0,0 +1,208 @@
+"""Global index of the roms of every dat in the database, to find dats by rom hash without parsing them."""
+import json
+import logging
+import sqlite3
+from collections.abc import Generator, Iterable
+from pathlib import Path
+
+from datoso.configuration import config
+from datoso.database import database_path
+from datoso.helpers.file_utils import file_fingerprint
+from datoso.repositories.hashes_index import (
+    HASH_LENGTHS,
+    HashesIndex,
+    normalize_hash,
+    normalize_size,
+)
+from datoso.repositories.records import GameRecord, RomRecord
+
+logger = logging.getLogger(__name__)
+
+ROM_INDEX_VERSION = 1
+HASH_COLUMNS = ('crc', 'md5', 'sha1', 'sha256')
+# seconds to wait for another process writing the index
+LOCK_TIMEOUT = 60
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS dats (
+    id INTEGER PRIMARY KEY,
+    seed TEXT NOT NULL,
+    name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    UNIQUE (seed, name)
+);
+CREATE TABLE IF NOT EXISTS roms (
+    dat_id INTEGER NOT NULL REFERENCES dats (id) ON DELETE CASCADE,
+    game TEXT,
+    name TEXT,
+    size TEXT,
+    crc TEXT,
+    md5 TEXT,
+    sha1 TEXT,
+    sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS roms_dat ON roms (dat_id);
+{''.join(f'CREATE INDEX IF NOT EXISTS roms_{column} ON roms ({column}) WHERE {column} IS NOT NULL;'
+         for column in HASH_COLUMNS)}
+PRAGMA user_version = {ROM_INDEX_VERSION};
+"""
+
+
+def canonical_hash(rom_hash: str, value: str | None) -> str | None:
+    """Get the canonical text of a hash, lowercase hex without prefix (crc zero padded to 8 digits)."""
+    key = normalize_hash(rom_hash, value)
+    if isinstance(key, int):
+        return f'{key:0{HASH_LENGTHS[rom_hash]}x}'
+    if isinstance(key, bytes):
+        return key.hex()
+    return key
+
+
+def detect_hash(value: str) -> str | None:
+    """Detect the type of a hash by its length."""
+    length = len(value.strip().lower().removeprefix('0x'))
+    return next((rom_hash for rom_hash, hash_length in HASH_LENGTHS.items() if hash_length == length), None)
+
+
+class RomIndex:
+    """SQLite index of the roms of every dat saved to the database, stored under DatosoPath.
+
+    Every dat is indexed with the fingerprint of its file, a dat is indexed again only when its file
+    changed, and the stored roms are used only while the fingerprint matches.
+    """
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        """Initialize the index, the database is opened on first use."""
+        self.path = Path(path) if path else database_path / config.get('PATHS', 'RomIndexFile', fallback='roms.db')
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection to the index, creating the tables if needed."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # dats may be indexed by several processes at once, wait for the lock instead of failing
+            self._connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+            self._connection.execute('PRAGMA foreign_keys = ON')
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def forget(self) -> None:
+        """Drop the connection without closing it, for a forked process that must open its own."""
+        self._connection = None
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def _fingerprint(file: str | Path) -> str | None:
+        """Get the fingerprint of a file as stored in the index, None if it doesn't exist."""
+        try:
+            return json.dumps(file_fingerprint(file))
+        except OSError:
+            return None
+
+    def _dat_id(self, seed: str, name: str, file: str | Path) -> int | None:
+        """Get the id of a dat if it is indexed and its file is unchanged."""
+        fingerprint = self._fingerprint(file)
+        if fingerprint is None:
+            return None
+        row = self.connection.execute(
+            'SELECT id, file, fingerprint FROM dats WHERE seed = ? AND name = ?', (seed, name)).fetchone()
+        if row and row[1] == str(file) and row[2] == fingerprint:
+            return row[0]
+        return None
+
+    def is_indexed(self, seed: str, name: str, file: str | Path) -> bool:
+        """Check if a dat is indexed and its file is unchanged."""
+        return self._dat_id(seed, name, file) is not None
+
+    @staticmethod
+    def _rows(games: Iterable[GameRecord]) -> Generator[tuple, None, None]:
+        """Yield a row for every rom of the games."""
+        for game in games:
+            for rom in game.roms:
+                yield (game.name, rom.name, None if (size := normalize_size(rom.size)) is None else str(size),
+                       *(canonical_hash(column, getattr(rom, column)) for column in HASH_COLUMNS))
+
+    def update_dat(self, seed: str, name: str, file: str | Path, games: Iterable[GameRecord]) -> bool:
+        """Index the roms of a dat, unless its file is unchanged since it was indexed, return if it was indexed.
+
+        The roms of the dat are replaced in a single transaction.
+        """
+        if self.is_indexed(seed, name, file):
+            return False
+        fingerprint = self._fingerprint(file)
+        if fingerprint is None:
+            return False
+        with self.connection as connection:
+            connection.execute('DELETE FROM dats WHERE seed = ? AND name = ?', (seed, name))
+            dat_id = connection.execute(
+                'INSERT INTO dats (seed, name, file, fingerprint) VALUES (?, ?, ?, ?)',
+                (seed, name, str(file), fingerprint)).lastrowid
+            connection.executemany(
+                f'INSERT INTO roms (dat_id, game, name, size, {", ".join(HASH_COLUMNS)}) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((dat_id, *row) for row in self._rows(games)))
+        return True
+
+    def remove_dat(self, seed: str, name: str) -> None:
+        """Remove a dat and its roms from the index."""
+        with self.connection as connection:
+            connection.execute('DELETE FROM dats WHERE seed = ? AND name = ?', (seed, name))
+
+    def find(self, value: str, rom_hash: str | None = None) -> list[dict]:
+        """Find the roms with a hash, the type of the hash is detected by its length if not given."""
+        rom_hash = rom_hash or detect_hash(value)
+        if rom_hash not in HASH_COLUMNS:
+            msg = f'Unknown hash type for {value}'
+            raise ValueError(msg)
+        cursor = self.connection.execute(
+            f'SELECT dats.seed, dats.name, dats.file, roms.game, roms.name, roms.size, '
+            f'{", ".join(f"roms.{column}" for column in HASH_COLUMNS)} '
+            f'FROM roms JOIN dats ON dats.id = roms.dat_id WHERE roms.{rom_hash} = ? '
+            'ORDER BY dats.seed, dats.name, roms.game',
+            (canonical_hash(rom_hash, value),))
+        keys = ('seed', 'dat', 'file', 'game', 'name', 'size', *HASH_COLUMNS)
+        return [dict(zip(keys, row, strict=True)) for row in cursor]
+
+    def hashes_index(self, seed: str, name: str, file: str | Path) -> HashesIndex | None:
+        """Build the hashes index of a dat from the stored roms, None if it is not indexed or its file changed."""
+        dat_id = self._dat_id(seed, name, file)
+        if dat_id is None:
+            return None
+        cursor = self.connection.execute(
+            f'SELECT name, size, {", ".join(HASH_COLUMNS)} FROM roms WHERE dat_id = ?', (dat_id,))
+        shas = HashesIndex()
+        shas.add_roms(RomRecord(name, size, crc, md5, sha1, sha256) for name, size, crc, md5, sha1, sha256 in cursor)
+        return shas
+
+    def stats(self) -> tuple[int, int]:
+        """Get the number of dats and roms in the index."""
+        dats = self.connection.execute('SELECT COUNT(*) FROM dats').fetchone()[0]
+        roms = self.connection.execute('SELECT COUNT(*) FROM roms').fetchone()[0]
+        return dats, roms
+
+
+def index_dat(seed: str, name: str, file: str | Path, games: Iterable[GameRecord]) -> bool:
+    """Index the roms of a dat in the global index, errors are logged and never interrupt the processing."""
+    try:
+        return rom_index.update_dat(seed, name, file, games)
+    except (sqlite3.Error, OSError) as exc:
+        logger.debug('Could not index %s:%s: %s', seed, name, exc)
+        return False
+
+
+def unindex_dat(seed: str, name: str) -> None:
+    """Remove a dat from the global index, errors are logged and never interrupt the processing."""
+    try:
+        rom_index.remove_dat(seed, name)
+    except (sqlite3.Error, OSError) as exc:
+        logger.debug('Could not remove %s:%s from the index: %s', seed, name, exc)
+
+
+rom_index = RomIndex()
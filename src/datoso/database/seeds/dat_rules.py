@@ -7,6 +7,7 @@ import requests
 from datoso import ROOT_FOLDER
 from datoso.configuration import config
 from datoso.database.models import System
+from datoso.database.models.dat import batched_writes
 
 fields = [
     'company',
@@ -47,24 +48,26 @@ def import_dats() -> None:
     with open(Path(ROOT_FOLDER,'systems.json'), 'w', encoding='utf-8') as file:
         json.dump(systems, file, indent=4)
     System.truncate()
-    for system in systems:
-        try:
-            row = System.from_dict(system)
-            row.save()
-            row.flush()
-        except Exception as e:  # noqa: BLE001
-            print(f'Error importing system: {system}', e)
-            print(e)
+    with batched_writes():
+        for system in systems:
+            try:
+                row = System.from_dict(system)
+                row.save()
+                row.flush()
+            except Exception as e:  # noqa: BLE001
+                print(f'Error importing system: {system}', e)
+                print(e)
 
 
 def init() -> None:
     """Seed the database with Systems."""
     with open(Path(ROOT_FOLDER,'systems.json'), encoding='utf-8') as file:
         systems = json.load(file)
-    for system in systems:
-        row = System.from_dict(system)
-        row.save()
-        row.flush()
+    with batched_writes():
+        for system in systems:
+            row = System.from_dict(system)
+            row.save()
+            row.flush()
 
 
 def detect_first_run() -> None:
@@ -0,0 +1,279 @@
+"""SQLite storage of the database, with the interface of TinyDB used by the models.
+
+Every table keeps its documents as JSON. The TinyDB queries of the models that compare fields for
+equality (the name and seed of a dat, the company and system of a system...) are run as lookups on an
+index of those fields, created on first use, the other queries scan the table.
+"""
+import json
+import sqlite3
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+from tinydb.queries import QueryLike
+from tinydb.table import Document
+
+SQLITE_VERSION = 1
+# seconds to wait for another process writing the database
+LOCK_TIMEOUT = 60
+
+
+def quote(identifier: str) -> str:
+    """Quote an identifier (a table or index name) for SQL."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def field_expression(field: str) -> str:
+    """Get the SQL expression of a field of the documents, the same in the indexes and the queries using them."""
+    path = '$."' + field.replace('"', '\\"') + '"'
+    return "json_extract(document, '" + path.replace("'", "''") + "')"
+
+
+def equalities(query_hash: tuple | None) -> dict[str, Any] | None:
+    """Get the fields and values compared by a query, None if it is not an equality or an and of equalities."""
+    if not isinstance(query_hash, tuple) or not query_hash:
+        return None
+    if query_hash[0] == '==':
+        _, path, value = query_hash
+        # bools are stored as json true and false, that sqlite reads as 1 and 0
+        if len(path) != 1 or not isinstance(path[0], str) or isinstance(value, bool) \
+                or not isinstance(value, str | int | float):
+            return None
+        return {path[0]: value}
+    if query_hash[0] == 'and':
+        fields = {}
+        for part in query_hash[1]:
+            part_fields = equalities(part)
+            if part_fields is None:
+                return None
+            fields.update(part_fields)
+        return fields
+    return None
+
+
+class SQLiteStorage:
+    """Connection to the SQLite database, the writes are made in a transaction committed on flush."""
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        """Initialize the storage, a database in memory if there is no path, it is opened on first use."""
+        self.path = Path(path) if path else None
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection to the database."""
+        if self._connection is None:
+            if self.path is None:
+                self._connection = sqlite3.connect(':memory:')
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # several processes may write the database, wait for the lock instead of failing
+                self._connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+                self._connection.execute('PRAGMA journal_mode = WAL')
+                self._connection.execute('PRAGMA synchronous = NORMAL')
+            # written only on a new database, writing takes the lock another process may hold
+            if not self._connection.execute('PRAGMA user_version').fetchone()[0]:
+                self._connection.execute(f'PRAGMA user_version = {SQLITE_VERSION}')
+        return self._connection
+
+    def tables(self) -> list[str]:
+        """Get the names of the tables."""
+        return [name for name, in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+
+    def create_table(self, name: str) -> None:
+        """Create a table if it does not exist."""
+        if name in self.tables():
+            return
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {quote(name)} (id INTEGER PRIMARY KEY, document TEXT NOT NULL)')
+
+    def read(self) -> dict[str, dict[str, dict]]:
+        """Read every table, as TinyDB storages do."""
+        return {name: {str(doc_id): json.loads(document) for doc_id, document in
+                       self.connection.execute(f'SELECT id, document FROM {quote(name)}')}
+                for name in self.tables()}
+
+    def write(self, data: dict[str, dict[str, dict]]) -> None:
+        """Replace the tables in data with its documents, as TinyDB storages do."""
+        for name, documents in data.items():
+            self.create_table(name)
+            self.connection.execute(f'DELETE FROM {quote(name)}')
+            self.connection.executemany(f'INSERT INTO {quote(name)} (id, document) VALUES (?, ?)',
+                                        ((int(doc_id), json.dumps(document, default=str))
+                                         for doc_id, document in documents.items()))
+
+    def memory_copy(self) -> 'SQLiteStorage':
+        """Copy the committed database to a database in memory, opened with a new connection.
+
+        A forked process must not use the connection of its parent, it is dropped without closing it.
+        """
+        if self.path is None:
+            return self
+        self._connection = None
+        memory = SQLiteStorage()
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        try:
+            connection.backup(memory.connection)
+        finally:
+            connection.close()
+        return memory
+
+    def flush(self) -> None:
+        """Commit the writes."""
+        if self._connection is not None:
+            self._connection.commit()
+
+    def close(self) -> None:
+        """Commit the writes and close the connection."""
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+
+class SQLiteTable:
+    """Table of documents of a SQLite database, with the methods of a TinyDB table used by the models."""
+
+    def __init__(self, storage: SQLiteStorage, name: str) -> None:
+        """Initialize the table, creating it if it does not exist."""
+        self.storage = storage
+        self.name = name
+        self._indexes: set[tuple[str, ...]] = set()
+        self.storage.create_table(name)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection to the database."""
+        return self.storage.connection
+
+    def _index(self, fields: tuple[str, ...]) -> None:
+        """Create the index of some fields of the documents if it does not exist."""
+        if fields in self._indexes:
+            return
+        index_name = f'{self.name}_{"_".join(fields)}'
+        if not self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                       (index_name,)).fetchone():
+            self.connection.execute(f'CREATE INDEX {quote(index_name)} ON {quote(self.name)} '
+                                    f'({", ".join(field_expression(field) for field in fields)})')
+        self._indexes.add(fields)
+
+    def _select(self, cond: QueryLike | None = None, doc_ids: list[int] | None = None) -> Iterator[Document]:
+        """Get the documents matching a query or with some ids, every document if there is neither."""
+        sql = f'SELECT id, document FROM {quote(self.name)}'
+        params: list = []
+        fields = equalities(getattr(cond, '_hash', None)) if cond is not None else None
+        if doc_ids is not None:
+            sql += f' WHERE id IN ({", ".join("?" * len(doc_ids))})'
+            params = list(doc_ids)
+        elif fields:
+            names = tuple(sorted(fields))
+            self._index(names)
+            sql += ' WHERE ' + ' AND '.join(f'{field_expression(field)} = ?' for field in names)
+            params = [fields[field] for field in names]
+        for doc_id, document in self.connection.execute(sql, params).fetchall():
+            document = Document(json.loads(document), doc_id)
+            # the lookup is checked by the query, which compares the types too
+            if cond is None or cond(document):
+                yield document
+
+    def _write(self, document: Document) -> None:
+        """Write a document."""
+        self.connection.execute(f'UPDATE {quote(self.name)} SET document = ? WHERE id = ?',
+                                (json.dumps(document, default=str), document.doc_id))
+
+    def all(self) -> list[Document]:
+        """Get every document."""
+        return list(self._select())
+
+    def search(self, cond: QueryLike) -> list[Document]:
+        """Get the documents matching a query."""
+        return list(self._select(cond))
+
+    def get(self, cond: QueryLike | None = None, doc_id: int | None = None) -> Document | None:
+        """Get a document matching a query or by id, None if there is none."""
+        return next(self._select(cond, [doc_id] if doc_id is not None else None), None)
+
+    def contains(self, cond: QueryLike | None = None, doc_id: int | None = None) -> bool:
+        """Check if a document matches a query or has an id."""
+        return self.get(cond, doc_id) is not None
+
+    def count(self, cond: QueryLike) -> int:
+        """Count the documents matching a query."""
+        return len(self.search(cond))
+
+    def insert(self, document: dict) -> int:
+        """Insert a document, return its id."""
+        cursor = self.connection.execute(f'INSERT INTO {quote(self.name)} (document) VALUES (?)',
+                                         (json.dumps(document, default=str),))
+        return cursor.lastrowid
+
+    def update(self, fields: dict | Callable[[dict], None], cond: QueryLike | None = None,
+               doc_ids: list[int] | None = None) -> list[int]:
+        """Update the fields of the documents matching a query or with some ids, every document if there is neither.
+
+        fields may be a function, that updates a document in place.
+        """
+        updated = []
+        for document in list(self._select(cond, doc_ids)):
+            if callable(fields):
+                fields(document)
+            else:
+                document.update(fields)
+            self._write(document)
+            updated.append(document.doc_id)
+        return updated
+
+    def upsert(self, document: dict, cond: QueryLike) -> list[int]:
+        """Update the documents matching a query with the fields of document, insert it if there is none."""
+        return self.update(document, cond) or [self.insert(document)]
+
+    def remove(self, cond: QueryLike | None = None, doc_ids: list[int] | None = None) -> list[int]:
+        """Remove the documents matching a query or with some ids."""
+        if cond is None and doc_ids is None:
+            msg = 'Use truncate() to remove all documents'
+            raise RuntimeError(msg)
+        removed = [document.doc_id for document in self._select(cond, doc_ids)]
+        self.connection.executemany(f'DELETE FROM {quote(self.name)} WHERE id = ?',
+                                    ((doc_id,) for doc_id in removed))
+        return removed
+
+    def truncate(self) -> None:
+        """Remove every document."""
+        self.connection.execute(f'DELETE FROM {quote(self.name)}')
+
+    def __len__(self) -> int:
+        """Count the documents."""
+        return self.connection.execute(f'SELECT COUNT(*) FROM {quote(self.name)}').fetchone()[0]
+
+    def __iter__(self) -> Iterator[Document]:
+        """Iterate over the documents."""
+        return self._select()
+
+
+class SQLiteDatabase:
+    """SQLite database, with the methods of a TinyDB database used by the models."""
+
+    def __init__(self, path: str | Path | None = None, storage: SQLiteStorage | None = None) -> None:
+        """Initialize the database, in memory if there is no path."""
+        self.storage = storage or SQLiteStorage(path)
+        self._tables: dict[str, SQLiteTable] = {}
+
+    def table(self, name: str) -> SQLiteTable:
+        """Get a table, creating it if it does not exist."""
+        if name not in self._tables:
+            self._tables[name] = SQLiteTable(self.storage, name)
+        return self._tables[name]
+
+    def tables(self) -> set[str]:
+        """Get the names of the tables."""
+        return set(self.storage.tables())
+
+    def memory_copy(self) -> 'SQLiteDatabase':
+        """Copy the committed database to a database in memory (see `SQLiteStorage.memory_copy`)."""
+        storage = self.storage.memory_copy()
+        return self if storage is self.storage else SQLiteDatabase(storage=storage)
+
+    def close(self) -> None:
+        """Commit the writes and close the database."""
+        self.storage.close()
@@ -1,5 +1,7 @@
 """Helpers."""
 import re
+from datetime import UTC, datetime
+from functools import lru_cache
 from numbers import Number
 from pathlib import Path
 
@@ -100,25 +102,39 @@ def show_progress(block_num: Number, block_size: Number, total_size: Number) ->
     else:
         print(f' {block_num * block_size / 1024 / 1024:.1f} MB', end='\r')
 
-def compare_dates(date1: str | None, date2: str | None) -> bool:
-    """Compare two dates."""
-    if date1 is None or date2 is None:
-        return False
-    #replace not_allowed characters for space in dates
-    date1 = re.sub(r'[^\w\s\,\-\:]', ' ', date1)
-    date2 = re.sub(r'[^\w\s\,\-\:]', ' ', date2)
-    dayfirst = date1[2] in ['/', '-']
+@lru_cache(maxsize=4096)
+def parse_date(date: str) -> datetime | None:
+    """Parse the date of a dat, None if it is not a date.
+
+    Dates with a timezone are converted to UTC without it, so every date can be compared. Dats share
+    a few distinct dates, so the parsed dates are memoized.
+    """
     try:
-        if isinstance(date1, str):
-            date1 = parser.parse(date1, fuzzy=True, dayfirst=dayfirst)
-            # Prevents bug
-            # ValueError: offset must be a timedelta strictly between -timedelta(hours=24) and timedelta(hours=24)
-            str(date1)
-        if isinstance(date2, str):
-            date2 = parser.parse(date2, fuzzy=True, dayfirst=dayfirst)
-            # Prevents bug
-            # ValueError: offset must be a timedelta strictly between -timedelta(hours=24) and timedelta(hours=24)
-            str(date2)
+        parsed = datetime.fromisoformat(date)
     except ValueError:
+        # replace not allowed characters for space in dates
+        cleaned = re.sub(r'[^\w\s\,\-\:]', ' ', date)
+        dayfirst = cleaned[2:3] == '-'
+        try:
+            parsed = parser.parse(cleaned, fuzzy=True, dayfirst=dayfirst)
+        except (ValueError, OverflowError):
+            return None
+    try:
+        return parsed.astimezone(UTC).replace(tzinfo=None) if parsed.tzinfo else parsed
+    except (ValueError, OverflowError):
+        # ValueError: offset must be a timedelta strictly between -timedelta(hours=24) and timedelta(hours=24)
+        return None
+
+def normalize_date(date: str | None) -> str | None:
+    """Normalize the date of a dat to a sortable string (YYYY-MM-DD HH:MM:SS), None if it is not a date."""
+    parsed = parse_date(date) if date else None
+    return parsed.isoformat(sep=' ', timespec='seconds') if parsed else None
+
+def compare_dates(date1: str | None, date2: str | None) -> bool:
+    """Compare two dates, whether date1 is newer than date2."""
+    if not date1 or not date2:
+        return False
+    parsed1, parsed2 = parse_date(date1), parse_date(date2)
+    if parsed1 is None or parsed2 is None:
         return False
-    return date1 > date2
+    return parsed1 > parsed2
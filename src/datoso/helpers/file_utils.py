@@ -1,26 +1,114 @@
 """File utils."""
+import hashlib
 import os
+import secrets
 import shutil
-from contextlib import suppress
+import tempfile
+from collections.abc import Generator
+from contextlib import contextmanager, suppress
 from pathlib import Path
+from typing import IO
 
+try:
+    import fcntl
+except ImportError:  # not available on windows, paths are not locked there
+    fcntl = None
 
-def copy_path(origin: str | Path, destination: str | Path) -> None:
-    """Copy file to destination."""
+LOCKS_PATH = Path(tempfile.gettempdir()) / 'datoso-locks'
+# ioctl to clone a file in linux copy-on-write filesystems (btrfs, xfs...)
+FICLONE = 0x40049409
+
+
+def copy_path(origin: str | Path, destination: str | Path, *, mode: str = 'copy',
+              skip_identical: bool = False) -> None:
+    """Copy file or folder to destination.
+
+    Files are copied, hardlinked or reflinked depending on mode (see `copy_file`), and not copied at all
+    if skip_identical and the destination has the same content. Folders are synced (see `sync_tree`).
+    """
     Path(destination).parent.mkdir(parents=True, exist_ok=True)
     try:
         if Path(origin).is_dir():
-            with suppress(FileNotFoundError):
-                shutil.rmtree(destination)
-            shutil.copytree(origin, destination)
-        else:
-            shutil.copy(origin, destination)
+            sync_tree(origin, destination, mode=mode, skip_identical=skip_identical)
+        elif not (skip_identical and same_content(origin, destination)):
+            copy_file(origin, destination, mode=mode)
     except shutil.SameFileError:
         pass
     except FileNotFoundError:
         msg = f'File {origin} not found.'
         raise FileNotFoundError(msg) from None
 
+def same_content(origin: str | Path, destination: str | Path) -> bool:
+    """Check if two files have the same content, they are the same file or have the same size and sha1."""
+    try:
+        origin_stat, destination_stat = os.stat(origin), os.stat(destination)  # noqa: PTH116
+    except OSError:
+        return False
+    if os.path.samestat(origin_stat, destination_stat):
+        return True
+    return origin_stat.st_size == destination_stat.st_size and content_hash(origin) == content_hash(destination)
+
+def reflink(origin: str | Path, destination: str | Path) -> None:
+    """Clone a file on a copy-on-write filesystem, raise OSError where it is not supported."""
+    if fcntl is None:
+        msg = 'Reflinks are not supported'
+        raise OSError(msg)
+    with open(origin, 'rb') as source, open(destination, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+def copy_file(origin: str | Path, destination: str | Path, *, mode: str = 'copy') -> None:
+    """Copy a file, as a hardlink or a reflink if mode is 'hardlink' or 'reflink'.
+
+    The link is made next to destination and renamed into place, if the filesystem does not support it
+    (or origin and destination are in different filesystems) the file is copied.
+    """
+    destination = Path(destination)
+    if mode in ('hardlink', 'reflink'):
+        temp_path = destination.with_name(f'.{destination.name}.{secrets.token_hex(4)}.tmp')
+        try:
+            if mode == 'hardlink':
+                os.link(origin, temp_path)
+            else:
+                reflink(origin, temp_path)
+            os.replace(temp_path, destination)
+        except OSError:
+            with suppress(FileNotFoundError):
+                temp_path.unlink()
+        else:
+            return
+    shutil.copy(origin, destination)
+
+def sync_tree(origin: str | Path, destination: str | Path, *, mode: str = 'copy', skip_identical: bool = True) -> None:
+    """Make destination a copy of the origin folder, copying only the files that changed.
+
+    The files and folders of destination that are not in origin are removed.
+    """
+    origin, destination = Path(origin), Path(destination)
+    if destination.is_file():
+        destination.unlink()
+    destination.mkdir(parents=True, exist_ok=True)
+    expected = set()
+    for root, _, files in os.walk(origin):
+        relative = Path(root).relative_to(origin)
+        expected.add(relative)
+        if (destination / relative).is_file():
+            (destination / relative).unlink()
+        (destination / relative).mkdir(exist_ok=True)
+        for name in files:
+            expected.add(relative / name)
+            source, target = Path(root) / name, destination / relative / name
+            if target.is_dir():
+                shutil.rmtree(target)
+            if not (skip_identical and same_content(source, target)):
+                copy_file(source, target, mode=mode)
+    for root, _, files in os.walk(destination, topdown=False):
+        relative = Path(root).relative_to(destination)
+        for name in files:
+            if relative / name not in expected:
+                (Path(root) / name).unlink()
+        if relative not in expected:
+            Path(root).rmdir()
+
 def remove_folder(path: str | Path) -> None:
     """Remove folder."""
     with suppress(PermissionError):
@@ -60,6 +148,58 @@ def move_path(origin: str | Path, destination: str | Path) -> None:
     except shutil.Error:
         remove_path(origin)
 
+@contextmanager
+def atomic_write(path: str | Path, mode: str = 'w', encoding: str | None = 'utf-8') -> Generator[IO, None, None]:
+    """Open a temporary file next to path and rename it into place once it is written.
+
+    If the block raises, the temporary file is removed and path is left untouched.
+    """
+    path = Path(path)
+    temp_path = path.with_name(f'.{path.name}.{secrets.token_hex(4)}.tmp')
+    if 'b' in mode:
+        encoding = None
+    try:
+        with open(temp_path, mode.replace('w', 'x'), encoding=encoding) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            temp_path.unlink()
+        raise
+
+@contextmanager
+def path_lock(path: str | Path) -> Generator[None, None, None]:
+    """Lock a path across processes, so processes writing the same path do it one at a time.
+
+    The lock is held on a file in the temporary directory, named after the resolved path.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCKS_PATH, exist_ok=True)  # noqa: PTH103
+    name = hashlib.sha1(str(Path(path).expanduser().resolve()).encode()).hexdigest()  # noqa: S324
+    with open(LOCKS_PATH / f'{name}.lock', 'w', encoding='utf-8') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def file_fingerprint(file: str | Path, *, hash_content: bool = False) -> tuple:
+    """Get the fingerprint of a file, its size, mtime, inode and optionally the sha1 of its content."""
+    stat = os.stat(file)  # noqa: PTH116
+    fingerprint = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    if hash_content:
+        fingerprint = (*fingerprint, content_hash(file))
+    return fingerprint
+
+def content_hash(file: str | Path) -> str:
+    """Get the sha1 of the content of a file, read in chunks."""
+    with open(file, 'rb') as fild:
+        return hashlib.file_digest(fild, 'sha1').hexdigest()
+
 def get_ext(path: str | Path) -> str:
     """Get extension of file."""
     return Path(path).suffix
@@ -0,0 +1,118 @@
+"""Bloom filter of rom hashes, to rule out roms that are not in a parent without reading the parent."""
+import math
+from collections.abc import Callable, Iterable
+from hashlib import blake2b
+
+from datoso.repositories.hashes_index import HASH_LENGTHS, HashesIndex, rom_key
+from datoso.repositories.records import RomRecord
+
+FALSE_POSITIVE_RATE = 0.01
+MAX_HASHES = 16
+
+
+def key_bytes(rom_hash: str, key: int | bytes | tuple) -> bytes:
+    """Get the bytes of a composite (hash, size) key, prefixed by the type of hash."""
+    if isinstance(key, int):
+        key = key.to_bytes((key.bit_length() + 7) // 8 or 1, 'big')
+    elif not isinstance(key, bytes):
+        key = repr(key).encode()
+    return rom_hash.encode() + b':' + key
+
+
+class BloomFilter:
+    """Bloom filter over the composite keys of a HashesIndex.
+
+    A key is hashed once with blake2b and its bit positions are derived by double hashing. There are no
+    false negatives, a key that was added is always found; a missing key is found with a probability close
+    to the false positive rate the filter was sized for.
+    """
+
+    __slots__ = ('bits', 'count', 'hashes', 'size')
+
+    def __init__(self, capacity: int, false_positive_rate: float = FALSE_POSITIVE_RATE) -> None:
+        """Initialize an empty filter sized for capacity keys."""
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = min(MAX_HASHES, max(1, round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __getstate__(self) -> tuple:
+        """Get the state to pickle."""
+        return self.size, self.hashes, self.count, bytes(self.bits)
+
+    def __setstate__(self, state: tuple) -> None:
+        """Set the unpickled state."""
+        self.size, self.hashes, self.count, bits = state
+        self.bits = bytearray(bits)
+
+    def _positions(self, data: bytes) -> Iterable[int]:
+        """Get the bit positions of some data."""
+        digest = int.from_bytes(blake2b(data, digest_size=16).digest(), 'little')
+        first, second = digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, data: bytes) -> None:
+        """Add some data to the filter."""
+        bits = self.bits
+        for position in self._positions(data):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, data: bytes) -> bool:
+        """Check if some data may be in the filter."""
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(data))
+
+    @classmethod
+    def from_index(cls, shas: HashesIndex, false_positive_rate: float = FALSE_POSITIVE_RATE) -> 'BloomFilter':
+        """Build a filter with every key of a hashes index."""
+        bloom = cls(sum(len(getattr(shas, rom_hash)) for rom_hash in shas.valid_hashes), false_positive_rate)
+        for rom_hash in shas.valid_hashes:
+            for key in getattr(shas, rom_hash):
+                bloom.add(key_bytes(rom_hash, key))
+        return bloom
+
+    def may_have_rom(self, rom: RomRecord, rom_hash: str | None = None) -> bool:
+        """Check if a rom may be in the index the filter was built from."""
+        for valid_hash in [rom_hash] if rom_hash else HASH_LENGTHS:
+            key = rom_key(valid_hash, getattr(rom, valid_hash, None), rom.size)
+            if key is not None and key_bytes(valid_hash, key) in self:
+                return True
+        return False
+
+
+class PrefilteredIndex:
+    """Hashes index of a parent behind a bloom filter.
+
+    Only the roms the filter may have are checked against the exact index, which is built on the first
+    of them, so a parent sharing no roms with a child is never read.
+    """
+
+    def __init__(self, bloom: BloomFilter, exact: Callable[[], HashesIndex]) -> None:
+        """Initialize the index, exact builds the exact index of the parent."""
+        self.bloom = bloom
+        self._exact = exact
+        self._shas = None
+
+    @property
+    def shas(self) -> HashesIndex:
+        """Get the exact index, building it on first use."""
+        if self._shas is None:
+            self._shas = self._exact()
+        return self._shas
+
+    def has_roms(self, roms: Iterable[RomRecord | dict], rom_hash: str | None = None) -> list[bool]:
+        """Check a batch of roms, return for each one if a rom with the same hash and size is in the parent."""
+        roms = [rom if isinstance(rom, RomRecord) else RomRecord.from_dict(rom, keep_source=False) for rom in roms]
+        candidates = [i for i, rom in enumerate(roms) if self.bloom.may_have_rom(rom, rom_hash)]
+        found = [False] * len(roms)
+        if candidates:
+            for i, was_found in zip(candidates, self.shas.has_roms([roms[i] for i in candidates], rom_hash),
+                                    strict=True):
+                found[i] = was_found
+        return found
+
+    def has_rom(self, rom: RomRecord | dict, rom_hash: str | None = None) -> bool:
+        """Check if a rom is in the parent."""
+        return self.has_roms([rom], rom_hash)[0]
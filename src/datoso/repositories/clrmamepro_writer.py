@@ -0,0 +1,87 @@
+"""Streaming writer for ClrMamePro and DOSCenter dats."""
+import re
+from typing import IO, Any
+
+from datoso.repositories.xml_writer import to_string
+
+BARE_VALUE = re.compile(r'[^\s"\'()\\]+')
+
+
+def format_value(value: Any, *, quote: bool = False) -> str:  # noqa: ANN401
+    """Format a value, quoted if it is not a single bare word (or quote is set)."""
+    value = to_string(value)
+    if not quote and BARE_VALUE.fullmatch(value):
+        return value
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+class ClrMameProWriter:
+    """Write the blocks of a ClrMamePro dat (as parsed by `ClrMameProDatFile.read_block`) one at a time.
+
+    The header is written with `write_header` and then every game with `write`, nothing but the block
+    being written is held in memory.
+    """
+
+    rom_key = 'rom'
+    attr_prefix = '@'
+    # keys that are always quoted, as the dats that are not generated by datoso do
+    quoted_keys = frozenset(('name', 'description'))
+    # the usual order of the values of a rom, any other value follows them
+    rom_order = ('name', 'size', 'crc', 'md5', 'sha1', 'sha256')
+
+    def __init__(self, output: IO[str], *, newl: str = '\n', indent: str = '\t') -> None:
+        """Initialize the writer."""
+        self.output = output
+        self.newl = newl
+        self.indent = indent
+        self.blocks = 0
+
+    def line(self, key: str, value: Any) -> str:  # noqa: ANN401
+        """Format a line of a block."""
+        return f'{key} {format_value(value, quote=key in self.quoted_keys)}'
+
+    def header_line(self, key: str, value: Any) -> str:  # noqa: ANN401
+        """Format a line of the header."""
+        return self.line(key, value)
+
+    def rom_line(self, rom: dict) -> str:
+        """Format a rom."""
+        rom = {key.removeprefix(self.attr_prefix): value for key, value in rom.items() if value is not None}
+        keys = [key for key in self.rom_order if key in rom] + [key for key in rom if key not in self.rom_order]
+        values = ' '.join(self.line(key, rom[key]) for key in keys)
+        return f'{self.rom_key} ( {values} )'
+
+    def _write_block(self, tag: str, lines: list[str]) -> None:
+        """Write a block, separated from the previous one by an empty line."""
+        if self.blocks:
+            self.output.write(self.newl)
+        self.output.write(f'{tag} ({self.newl}')
+        self.output.writelines(f'{self.indent}{line}{self.newl}' for line in lines)
+        self.output.write(f'){self.newl}')
+        self.blocks += 1
+
+    def write_header(self, tag: str, header: dict) -> None:
+        """Write the header block."""
+        self._write_block(tag, [self.header_line(key, value) for key, value in header.items() if value is not None])
+
+    def write(self, tag: str, node: dict) -> None:
+        """Write a game (or any other top level block)."""
+        lines = []
+        for key, value in node.items():
+            for item in value if isinstance(value, list) else [value]:
+                if item is None:
+                    continue
+                if key == self.rom_key and isinstance(item, dict):
+                    lines.append(self.rom_line(item))
+                else:
+                    lines.append(self.line(key, item))
+        self._write_block(tag, lines)
+
+
+class DOSCenterWriter(ClrMameProWriter):
+    """Write the blocks of a DOSCenter dat, its header lines are `key: value`."""
+
+    def header_line(self, key: str, value: Any) -> str:  # noqa: ANN401
+        """Format a line of the header."""
+        # the keys of the header are lowercased when it is read, DOSCenter capitalizes them
+        return f'{key[:1].upper()}{key[1:]}: {to_string(value).strip()}'
@@ -0,0 +1,317 @@
+"""Persistent cache of parsed dats, so unchanged dats are not parsed again."""
+import hashlib
+import logging
+import os
+import pickle
+import secrets
+from collections.abc import Generator, Iterator
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Any
+
+from datoso.configuration import config
+from datoso.helpers.file_utils import file_fingerprint, parse_path
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.pickle'
+FILTER_SUFFIX = '.bloom'
+
+
+class CacheEntry:
+    """A cached dat, its metadata and its parsed entries as (tag, node)."""
+
+    def __init__(self, path: Path, meta: dict) -> None:
+        """Initialize the entry."""
+        self.path = path
+        self.meta = meta
+
+    def __getitem__(self, key: str) -> Any:  # noqa: ANN401
+        """Get a metadata value."""
+        return self.meta[key]
+
+    def __iter__(self) -> Iterator[tuple[str, Any]]:
+        """Yield the parsed entries, in the order they are in the dat."""
+        with open(self.path, 'rb') as fild:
+            pickle.load(fild)  # noqa: S301
+            while True:
+                try:
+                    yield pickle.load(fild)  # noqa: S301
+                except EOFError:
+                    return
+
+
+class CacheWriter:
+    """Write the parsed entries of a dat to a temporary cache file as they are parsed.
+
+    Errors writing the cache are logged and discard the file, they never interrupt the parsing.
+    """
+
+    def __init__(self, meta: dict, path: Path | None = None) -> None:
+        """Initialize the writer, without a path the entries are discarded."""
+        self.meta = meta
+        self.path = path
+        self.file = None
+
+    def start(self) -> None:
+        """Create the temporary file and write the metadata, once it is complete."""
+        if not self.path or self.file:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, 'xb')  # noqa: SIM115
+            pickle.dump(self.meta, self.file, pickle.HIGHEST_PROTOCOL)
+        except OSError as exc:
+            self.fail(exc)
+
+    def add(self, tag: str, node: Any) -> None:  # noqa: ANN401
+        """Write a parsed entry."""
+        self.start()
+        if self.file:
+            try:
+                pickle.dump((tag, node), self.file, pickle.HIGHEST_PROTOCOL)
+            except OSError as exc:
+                self.fail(exc)
+
+    def commit(self, destination: Path) -> bool:
+        """Move the temporary file to its final destination."""
+        self.start()
+        if not self.file:
+            return False
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.replace(self.path, destination)
+        except OSError as exc:
+            self.fail(exc)
+            return False
+        self.file = self.path = None
+        return True
+
+    def fail(self, exc: Exception) -> None:
+        """Log a write error and discard the file."""
+        logger.debug('Could not cache %s: %s', self.meta.get('source'), exc)
+        self.discard()
+
+    def discard(self) -> None:
+        """Remove the temporary file."""
+        if self.file:
+            with suppress(OSError):
+                self.file.close()
+        if self.path:
+            with suppress(OSError):
+                self.path.unlink(missing_ok=True)
+        self.file = self.path = None
+
+
+class DatCache:
+    """Cache of parsed dats under DatosoPath, one file per dat.
+
+    Every file is a pickle stream, the metadata (source, fingerprint, class, root attributes) and then
+    every parsed entry of the dat. Entries are used only while the fingerprint of the source matches.
+    The modification time of the cache files tracks their last use, the least recently used are evicted
+    when the cache grows over CACHE.MaxSize.
+    """
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        """Initialize the cache."""
+        self.path = Path(path) if path else \
+            parse_path(config.get('PATHS', 'DatosoPath', fallback='~/.config/datoso')) / 'cache'
+        self._size = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache is enabled."""
+        return config.getboolean('CACHE', 'Enabled', fallback=True)
+
+    @property
+    def max_size(self) -> int:
+        """Maximum size of the cache in bytes."""
+        return int(config.get('CACHE', 'MaxSize', fallback=256)) * 1024 * 1024
+
+    @property
+    def hash_content(self) -> bool:
+        """Whether the content hash of the dats is part of their fingerprint."""
+        return config.getboolean('CACHE', 'HashContent', fallback=False)
+
+    def entry_path(self, file: str | Path) -> Path:
+        """Get the path of the cache file for a dat."""
+        key = hashlib.sha1(str(Path(file).resolve()).encode()).hexdigest()  # noqa: S324
+        return self.path / f'{key}{CACHE_SUFFIX}'
+
+    def read_meta(self, path: Path) -> dict | None:
+        """Read the metadata of a cache file."""
+        try:
+            with open(path, 'rb') as fild:
+                meta = pickle.load(fild)  # noqa: S301
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError):
+            return None
+        return meta if isinstance(meta, dict) and meta.get('version') == CACHE_VERSION else None
+
+    def get(self, file: str | Path, dat_class: type | None = None) -> CacheEntry | None:
+        """Get the cached dat if it is up to date (and was parsed by dat_class)."""
+        if not self.enabled or not file:
+            return None
+        path = self.entry_path(file)
+        meta = self.read_meta(path)
+        if not meta or meta['source'] != str(Path(file).resolve()) \
+                or (dat_class and meta['dat_class'] != dat_class.__name__):
+            return None
+        if not self.is_fresh(meta):
+            return None
+        with suppress(OSError):
+            os.utime(path)
+        return CacheEntry(path, meta)
+
+    def is_fresh(self, meta: dict) -> bool:
+        """Check if the source of a cache file is unchanged."""
+        try:
+            return file_fingerprint(meta['source'], hash_content=meta['hash_content']) == meta['fingerprint']
+        except OSError:
+            return False
+
+    def get_filter(self, file: str | Path) -> Any | None:  # noqa: ANN401
+        """Get the stored filter of a dat if the dat is unchanged since it was built."""
+        if not self.enabled or not file:
+            return None
+        path = self.entry_path(file).with_suffix(FILTER_SUFFIX)
+        try:
+            with open(path, 'rb') as fild:
+                meta = pickle.load(fild)  # noqa: S301
+                if not isinstance(meta, dict) or meta.get('version') != CACHE_VERSION \
+                        or meta['source'] != str(Path(file).resolve()) or not self.is_fresh(meta):
+                    return None
+                value = pickle.load(fild)  # noqa: S301
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError):
+            return None
+        with suppress(OSError):
+            os.utime(path)
+        return value
+
+    def put_filter(self, file: str | Path, value: Any, fingerprint: tuple | None = None) -> bool:  # noqa: ANN401
+        """Store the filter of a dat, fingerprint is the one of the dat the filter was built from.
+
+        Errors are logged and never interrupt the processing.
+        """
+        if not self.enabled or not file:
+            return False
+        hash_content = self.hash_content
+        try:
+            current = file_fingerprint(file, hash_content=hash_content)
+        except OSError:
+            return False
+        if fingerprint is not None and fingerprint != current:
+            return False
+        writer = CacheWriter({
+            'version': CACHE_VERSION,
+            'source': str(Path(file).resolve()),
+            'fingerprint': current,
+            'hash_content': hash_content,
+            'dat_class': type(value).__name__,
+        }, self.path / f'.{secrets.token_hex(8)}.tmp')
+        writer.start()
+        if writer.file:
+            try:
+                pickle.dump(value, writer.file, pickle.HIGHEST_PROTOCOL)
+            except OSError as exc:
+                writer.fail(exc)
+        if not writer.commit(self.entry_path(file).with_suffix(FILTER_SUFFIX)):
+            return False
+        self._size = None
+        with suppress(OSError):
+            self.evict()
+        return True
+
+    @contextmanager
+    def writer(self, file: str | Path, dat_class: type, **meta: Any) -> Generator[CacheWriter, None, None]:  # noqa: ANN401
+        """Write the entries of a dat to the cache while it is parsed, the cache file is replaced when the block ends.
+
+        Nothing is stored if the block raises or the generator reading the dat is closed before its end,
+        nor if the dat changed while it was read.
+        """
+        if not self.enabled or not file:
+            yield CacheWriter({})
+            return
+        hash_content = self.hash_content
+        try:
+            fingerprint = file_fingerprint(file, hash_content=hash_content)
+        except OSError:
+            yield CacheWriter({})
+            return
+        writer = CacheWriter({
+            **meta,
+            'version': CACHE_VERSION,
+            'source': str(Path(file).resolve()),
+            'fingerprint': fingerprint,
+            'hash_content': hash_content,
+            'dat_class': dat_class.__name__,
+        }, self.path / f'.{secrets.token_hex(8)}.tmp')
+        try:
+            yield writer
+        except BaseException:
+            writer.discard()
+            raise
+        try:
+            unchanged = file_fingerprint(file, hash_content=hash_content) == fingerprint
+        except OSError:
+            unchanged = False
+        destination = self.entry_path(file)
+        previous_size = destination.stat().st_size if destination.exists() else 0
+        if not unchanged:
+            writer.discard()
+        elif writer.commit(destination):
+            with suppress(OSError):
+                if self._size is not None:
+                    self._size += destination.stat().st_size - previous_size
+                self.evict()
+
+    def files(self) -> list[tuple[Path, os.stat_result]]:
+        """Get the cache files (parsed dats and filters) and their stats, the least recently used first."""
+        if not self.path.exists():
+            return []
+        files = []
+        for path in [*self.path.glob(f'*{CACHE_SUFFIX}'), *self.path.glob(f'*{FILTER_SUFFIX}')]:
+            with suppress(OSError):
+                files.append((path, path.stat()))
+        return sorted(files, key=lambda file: file[1].st_mtime_ns)
+
+    def entries(self) -> Generator[tuple[Path, os.stat_result, dict], None, None]:
+        """Yield every cache file with its stats and metadata, the least recently used first."""
+        for path, stat in self.files():
+            meta = self.read_meta(path)
+            if meta:
+                yield path, stat, meta
+
+    def size(self) -> int:
+        """Get the size of the cache in bytes."""
+        if self._size is None:
+            self._size = sum(stat.st_size for _, stat in self.files())
+        return self._size
+
+    def evict(self, max_size: int | None = None) -> int:
+        """Remove the least recently used files until the cache fits in max_size, return how many were removed."""
+        max_size = self.max_size if max_size is None else max_size
+        if self.size() <= max_size:
+            return 0
+        files = self.files()
+        total = sum(stat.st_size for _, stat in files)
+        removed = 0
+        for path, stat in files:
+            if total <= max_size:
+                break
+            with suppress(FileNotFoundError):
+                path.unlink()
+            total -= stat.st_size
+            removed += 1
+        self._size = total
+        return removed
+
+    def clear(self) -> int:
+        """Remove every cache file, return how many were removed."""
+        self._size = None
+        return self.evict(0)
+
+
+dat_cache = DatCache()
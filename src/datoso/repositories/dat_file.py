@@ -1,18 +1,43 @@
 """Dat classes to parse different types of dat files."""
+import codecs
 import logging
+import mmap
 import os
+import pickle
+import re
 import shlex
-from collections.abc import Callable, Generator
+import tempfile
+from collections.abc import Callable, Generator, Iterable
+from contextlib import suppress
 from enum import Enum
+from functools import partial
 from hashlib import md5
+from itertools import islice
 from pathlib import Path
-from typing import Any
-
-import xmltodict
+from typing import IO, Any, Self
+from xml.etree.ElementTree import Element, iterparse
 
 from datoso.configuration import config
 from datoso.database.models.dat import System
+from datoso.helpers import normalize_date
+from datoso.helpers.file_utils import atomic_write, file_fingerprint
+from datoso.repositories.bloom_filter import BloomFilter, PrefilteredIndex
+from datoso.repositories.clrmamepro_writer import ClrMameProWriter, DOSCenterWriter
+from datoso.repositories.dat_cache import dat_cache
 from datoso.repositories.hashes_index import HashesIndex
+from datoso.repositories.index_cache import index_cache
+from datoso.repositories.records import GameRecord, RomRecord
+from datoso.repositories.xml_writer import XMLWriter
+
+BLOCK_TOKENS = re.compile(r'(")|(\()|(\))')
+BLOCK_TOKENS_BYTES = re.compile(rb'(")|(\()|(\))')
+XML_ENCODING = re.compile(rb'<\?xml[^>]*?encoding=["\']([A-Za-z0-9._-]+)["\']')
+# A word is a run of bare characters and quoted strings, anything else (a backslash or an unclosed quote)
+# is captured so the line can be handed over to shlex.
+LINE_TOKENS = re.compile(r'(?:[^ \t\r\n"\'\\]+|"[^"\\]*"|\'[^\']*\')+|([^ \t\r\n])')
+QUOTED_STRING = re.compile(r'"([^"\\]*)"|\'([^\']*)\'')
+# streamed games prepared at once by the transforms that look up a whole chunk of games (see `MergeTransform`)
+TRANSFORM_CHUNK_SIZE = 4096
 
 
 class FileHeaders(Enum):
@@ -22,8 +47,265 @@ class FileHeaders(Enum):
     CLRMAMEPRO = 'clrma'
     DOSCENTER = 'DOSCe'
 
+
+def add_node(container: dict, key: str, value: Any) -> None:  # noqa: ANN401
+    """Add a value to a container, turning repeated keys into lists the same way xmltodict does."""
+    if key not in container:
+        container[key] = value
+    elif isinstance(container[key], list):
+        container[key].append(value)
+    else:
+        container[key] = [container[key], value]
+
+
+def scan_blocks(buffer: str | bytes | mmap.mmap) -> Generator[tuple[int, int], None, None]:
+    """Yield the (start, end) offsets of the content of every top level parenthesized block.
+
+    The buffer is scanned once, the regex skips over everything that is not a quote or a parenthesis,
+    and parentheses inside quoted strings are ignored.
+    """
+    tokens = BLOCK_TOKENS if isinstance(buffer, str) else BLOCK_TOKENS_BYTES
+    depth = 0
+    start = 0
+    within_string = False
+    for match in tokens.finditer(buffer):
+        if match.lastindex == 1:
+            within_string = not within_string
+        elif within_string:
+            continue
+        elif match.lastindex == 2:  # noqa: PLR2004
+            if depth == 0:
+                start = match.end()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                yield start, match.start()
+
+
+def _unquote(match: re.Match) -> str:
+    """Return the content of a quoted string."""
+    return match.group(1) if match.group(1) is not None else match.group(2)
+
+
+def split_line(line: str) -> list[str]:
+    """Split a line of a ClrMamePro dat with the same result as `shlex.split`.
+
+    Lines made of bare words and quoted strings are split with a precompiled regex, lines with escapes
+    or unclosed quotes are left to shlex, which raises ValueError for the malformed ones.
+    """
+    tokens = []
+    for match in LINE_TOKENS.finditer(line):
+        if match.lastindex:
+            return shlex.split(line)
+        token = match.group()
+        tokens.append(QUOTED_STRING.sub(_unquote, token) if '"' in token or "'" in token else token)
+    return tokens
+
+
+def element_to_dict(element: Element) -> dict | str | None:
+    """Convert an element to the same structure `xmltodict.parse` would return for it."""
+    node = {f'@{key}': value for key, value in element.attrib.items()}
+    for child in element:
+        add_node(node, child.tag, element_to_dict(child))
+    text = ''.join([element.text or '', *(child.tail or '' for child in element)]).strip()
+    if not node:
+        return text or None
+    if text:
+        node['#text'] = text
+    return node
+
+
+def parent_index(file: str | Path | None, exact: Callable[[], HashesIndex]) -> HashesIndex | PrefilteredIndex:
+    """Get the index of the roms of a parent dat, behind its bloom filter if PROCESS.ParentBloomFilter is on.
+
+    exact builds the exact index of the parent. The first time, the filter is built from the exact index
+    and stored in the cache; while the parent is unchanged only the roms the filter may have are checked
+    against the exact index, which is built only if there is any.
+    """
+    if not file or not config.getboolean('PROCESS', 'ParentBloomFilter', fallback=False):
+        return exact()
+    bloom = dat_cache.get_filter(file)
+    if isinstance(bloom, BloomFilter):
+        return PrefilteredIndex(bloom, exact)
+    try:
+        fingerprint = file_fingerprint(file, hash_content=dat_cache.hash_content)
+    except OSError:
+        fingerprint = None
+    shas = exact()
+    if fingerprint is not None:
+        dat_cache.put_filter(file, BloomFilter.from_index(shas), fingerprint)
+    return shas
+
+
+def chain_transforms(game: dict, transforms: tuple[Callable[[dict], dict | None], ...]) -> dict | None:
+    """Apply transforms to a game in order, stopping at the first one that drops it."""
+    for transform in transforms:
+        game = transform(game)
+        if game is None:
+            return None
+    return game
+
+
+def game_roms(game: dict) -> list:
+    """Get the roms of a parsed game."""
+    if 'rom' not in game:
+        return []
+    return game['rom'] if isinstance(game['rom'], list) else [game['rom']]
+
+
+class MergeTransform:
+    """Transform that removes from a game the roms in the hashes index of a parent.
+
+    `prepare` checks the roms of a chunk of games (every game of a loaded dat) against the parent with a
+    single `has_roms` call, the games are then transformed one at a time from its results. A game that was
+    not prepared, or whose roms changed since, is checked on its own.
+    """
+
+    def __init__(self, shas: HashesIndex | PrefilteredIndex, dedupe_game: Callable[..., dict | None]) -> None:
+        """Initialize the transform, dedupe_game filters the duplicates out of a game (see `DatFile._dedupe_game`)."""
+        self.shas = shas
+        self.dedupe_game = dedupe_game
+        # the records of the roms of the chunk and if the parent has them
+        self.records: list[RomRecord] = []
+        self.found: list[bool] = []
+        # the games of the chunk by id, with their roms and where their records start and end
+        self.games: dict[int, tuple[dict, Any, int, int]] = {}
+
+    def prepare(self, games: list[dict]) -> None:
+        """Check the roms of a chunk of games against the parent, replacing the previous chunk."""
+        self.games = {}
+        self.records = []
+        for game in games:
+            start = len(self.records)
+            self.records.extend(RomRecord.from_dict(rom, keep_source=False) for rom in game_roms(game))
+            self.games[id(game)] = (game, game.get('rom'), start, len(self.records))
+        self.found = self.shas.has_roms(self.records)
+
+    def __call__(self, game: dict) -> dict | None:
+        """Remove from a game the roms of the parent, None if no roms remain."""
+        prepared = self.games.get(id(game))
+        if prepared is not None and prepared[0] is game and prepared[1] is game.get('rom'):
+            _, roms, start, end = prepared
+            if end - start == (len(roms) if isinstance(roms, list) else 1):
+                return self.dedupe_game(game, prepared=(self.records[start:end], self.found[start:end]))
+        return self.dedupe_game(game, find_duplicates=self.shas.has_roms)
+
+
+class PrefixedFile:
+    """Binary file reader that serves an already read prefix before opening the file for the rest."""
+
+    def __init__(self, file: str | Path, prefix: bytes, *, complete: bool) -> None:
+        """Initialize the reader."""
+        self.file = file
+        self.prefix = prefix
+        self.complete = complete
+        self._offset = 0
+        self._file = None
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, from the prefix first."""
+        if self._offset < len(self.prefix):
+            end = self._offset + size if size >= 0 else len(self.prefix)
+            chunk = self.prefix[self._offset:end]
+            self._offset += len(chunk)
+            return chunk
+        if self.complete:
+            return b''
+        if not self._file:
+            self._file = open(self.file, 'rb')  # noqa: SIM115
+            self._file.seek(len(self.prefix))
+        return self._file.read(size)
+
+    def close(self) -> None:
+        """Close the file if it was opened."""
+        if self._file:
+            self._file.close()
+
+    def __enter__(self) -> Self:
+        """Enter the context."""
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        """Exit the context."""
+        self.close()
+
+
+class FileSniff:
+    """Detect the type of a dat file from a prefix read once.
+
+    The prefix is handed to the detected class so the header can be parsed without reading it again.
+    """
+
+    size = 64 * 1024
+    boms = (
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF32_LE, 'utf-32'),
+        (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'),
+    )
+    db_export_lines = 50
+
+    def __init__(self, file: str | Path) -> None:
+        """Read the prefix of the file and detect its type."""
+        self.file = file
+        with open(file, 'rb') as fild:
+            self.prefix = fild.read(self.size)
+        self.complete = len(self.prefix) < self.size
+        self.encoding = self.detect_encoding()
+        self.text = self.prefix.decode(self.encoding, errors='ignore')
+        self.dat_class = self.detect_class()
+
+    def detect_encoding(self) -> str:
+        """Detect the encoding from the BOM or the XML declaration."""
+        for bom, encoding in self.boms:
+            if self.prefix.startswith(bom):
+                return encoding
+        if match := XML_ENCODING.match(self.prefix):
+            encoding = match.group(1).decode('ascii').lower()
+            with suppress(LookupError):
+                return codecs.lookup(encoding).name
+        return 'utf-8'
+
+    def detect_class(self) -> type['DatFile'] | None:
+        """Detect the dat class from the first characters of the file."""
+        file_header = self.text[:10].encode('ascii', errors='ignore')[:5].decode()
+        if file_header == FileHeaders.XML.value:
+            # Check if it's a DB Export format (no header element)
+            return XMLDBExportDatFile if self.is_db_export() else XMLDatFile
+        if file_header == FileHeaders.CLRMAMEPRO.value:
+            return ClrMameProDatFile
+        if file_header == FileHeaders.DOSCENTER.value:
+            return DOSCenterDatFile
+        return None
+
+    def is_db_export(self) -> bool:
+        """Check if XML file is DB Export format (has no header element)."""
+        for line in self.text.splitlines()[:self.db_export_lines]:
+            if '<header>' in line or '<header ' in line:
+                return False  # Has header, not DB Export
+            if '<game' in line:
+                return True  # Found game before header, it's DB Export
+        return False  # Default to regular XML
+
+    def open(self) -> PrefixedFile:
+        """Open the file, reusing the prefix already read."""
+        return PrefixedFile(self.file, self.prefix, complete=self.complete)
+
+    def first_block(self) -> str | None:
+        """Return the first block of a ClrMamePro file if it is complete within the prefix."""
+        for start, end in scan_blocks(self.prefix):
+            return self.prefix[start:end].decode(self.encoding, errors='ignore')
+        return None
+
+
 class DatFile:
-    """Base class for dat files. Abstract class."""
+    """Base class for dat files. Abstract class.
+
+    A dat is saved to a new file renamed over it (see `atomic_write`), never written in place, so a dat
+    hardlinked to its download by the Copy action (PROCESS.CopyMode) never changes the download.
+    """
 
     name: str = None
     file: str = None
@@ -44,6 +326,11 @@ class DatFile:
 
     header: dict = None
     games: list = None
+    merged_roms: list = None
+
+    # prefix of the file read when detecting its type, used once by `load`
+    sniff: 'FileSniff' = None
+    encoding: str = 'utf-8'
 
     def __init__(self, **kwargs: Any) -> None:  # noqa: ANN401
         """Initialize the dat file."""
@@ -51,6 +338,8 @@ class DatFile:
         if not self.name and not self.file:
             msg = 'No file specified'
             raise ValueError(msg)
+        if self.sniff:
+            self.encoding = self.sniff.encoding
         if not self.name:
             self.load()
 
@@ -111,25 +400,185 @@ class DatFile:
                                                *suffixes] if x])
         return self.path
 
+    def iter_games(self) -> Generator[dict, None, None]:
+        """Yield every game of the dat file."""
+        yield from self.games or []
+
+    def iter_game_records(self, *, keep_source: bool = True) -> Generator[GameRecord, None, None]:
+        """Yield a compact record for every game of the dat file."""
+        for game in self.iter_games():
+            yield GameRecord.from_dict(game, keep_source=keep_source)
+
     def get_rom_shas(self) -> None:
         """Get the shas for the roms and creates an index."""
+        self.shas = HashesIndex()
+        self.shas.add_roms(rom for game in self.iter_game_records(keep_source=False) for rom in game.roms)
 
-    def dedupe(self) -> None:
-        """Dedupe the dat file."""
+    def rom_shas(self) -> HashesIndex:
+        """Create the index of the roms and return it."""
+        self.get_rom_shas()
+        return self.shas
+
+    def parent_index(self) -> HashesIndex | PrefilteredIndex:
+        """Get the index to merge a child with this dat, see `parent_index`.
+
+        The exact index is shared through the index cache by every child of the run.
+        """
+        if not self.file:
+            return parent_index(self.file, self.rom_shas)
+        return parent_index(self.file, partial(index_cache.get, index_cache.key(self.file), self.file, self.rom_shas))
+
+    def _dedupe_game(self, game: dict, find_duplicates: Callable[[list[RomRecord]], list[bool]] | None = None,
+                     merged_roms: list | None = None,
+                     prepared: tuple[list[RomRecord], list[bool]] | None = None) -> dict | None:
+        """Filter duplicate roms out of a single game, returning None if no roms remain.
+
+        The removed roms are added to `merged_roms` (if given) besides the ones of the dat. prepared are
+        the records of the roms and which ones are duplicates, if they were already checked.
+        """
+        if 'rom' not in game:
+            return None
+        roms = game_roms(game)
+        if prepared is not None:
+            records, duplicates = prepared
+        else:
+            # The records don't keep the rom dict, the index must not hold on to streamed games
+            records = [RomRecord.from_dict(rom, keep_source=False) for rom in roms]
+            duplicates = find_duplicates(records)
+        new_roms = []
+        for rom, record, duplicate in zip(roms, records, duplicates, strict=True):
+            if duplicate:
+                self.merged_roms.append(record)
+                if merged_roms is not None:
+                    merged_roms.append(record)
+            else:
+                new_roms.append(rom)
+        if not new_roms:
+            return None
+        new_game = {key: value for key, value in game.items() if key != 'rom'}
+        new_game['rom'] = new_roms
+        return new_game
+
+    def _prepared(self, entries: Iterable[tuple[str, Any]],
+                  prepares: tuple[Callable[[list[dict]], None], ...]) -> Generator[tuple[str, Any], None, None]:
+        """Yield streamed entries, the games of every chunk of TRANSFORM_CHUNK_SIZE are prepared before it."""
+        if not prepares:
+            yield from entries
+            return
+        entries = iter(entries)
+        while chunk := list(islice(entries, TRANSFORM_CHUNK_SIZE)):
+            games = [game for tag, node in chunk for game in self._entry_games(tag, node)]
+            for prepare in prepares:
+                prepare(games)
+            yield from chunk
+
+    def _entry_games(self, _tag: str, node: Any) -> list[dict]:  # noqa: ANN401
+        """Get the games of an entry."""
+        return [node] if isinstance(node, dict) else []
+
+    def _transform(self, transform: Callable[[dict], dict | None],
+                   prepares: tuple[Callable[[list[dict]], None], ...] = ()) -> None:
+        """Apply `transform` to every loaded game, dropping the games it returns None for.
+
+        prepares are called with every game before they are transformed.
+        """
+        if self.games:
+            for prepare in prepares:
+                prepare(self.games)
+            self.games[:] = [new_game for game in self.games for new_game in (transform(game),) if new_game is not None]
+
+    def transform(self, *transforms: Callable[[dict], dict | None]) -> None:
+        """Apply the transforms to every game of the dat in a single pass, in order.
+
+        A game a transform returns None for is dropped and not passed to the next ones. The transforms
+        with a `prepare` method (see `MergeTransform`) are given the games of a chunk before it is transformed.
+        """
+        prepares = tuple(transform.prepare for transform in transforms if hasattr(transform, 'prepare'))
+        if len(transforms) == 1:
+            self._transform(transforms[0], prepares)
+        elif transforms:
+            self._transform(partial(chain_transforms, transforms=transforms), prepares)
+
+    def _dedupe_transform(self, find_duplicates: Callable[[list[RomRecord]], list[bool]],
+                          merged_roms: list | None = None) -> Callable[[dict], dict | None]:
+        """Get the transform that filters out duplicate roms from a game, dropping empty games/dirs.
+
+        find_duplicates: given the rom records of a game, return for each one if it's a duplicate that
+        should be removed.
+        """
+        if not self.merged_roms:
+            self.merged_roms = []
+        return partial(self._dedupe_game, find_duplicates=find_duplicates, merged_roms=merged_roms)
+
+    def dedupe_transform(self, merged_roms: list | None = None) -> Callable[[dict], dict | None]:
+        """Get the transform that removes from a game the roms of the previous games."""
+        self.shas = HashesIndex()
+        return self._dedupe_transform(self.shas.add_new_roms, merged_roms)
+
+    def merge_transform(self, shas: HashesIndex | PrefilteredIndex,
+                        merged_roms: list | None = None) -> MergeTransform:
+        """Get the transform that removes from a game the roms in the hashes index of a parent.
+
+        The roms of a chunk of games are checked at once, see `MergeTransform`.
+        """
+        if not self.merged_roms:
+            self.merged_roms = []
+        return MergeTransform(shas, partial(self._dedupe_game, merged_roms=merged_roms))
 
     def merge_with(self, parent: 'DatFile') -> None:
         """Merge the dat file with the parent."""
+        self.merge_with_index(parent.parent_index())
+
+    def merge_with_index(self, shas: HashesIndex | PrefilteredIndex) -> None:
+        """Merge the dat file with the hashes index of a parent, the parent doesn't need to be parsed."""
+        self.transform(self.merge_transform(shas))
+
+    def dedupe(self) -> None:
+        """Dedupe the dat file."""
+        self.transform(self.dedupe_transform())
+
+    def mark_mia(self, rom: dict, mias: dict) -> None:
+        """Mark the mias in the dat file."""
+        key = rom.get('@sha1') or rom.get('@md5') or rom.get('@crc32') or f"{self.get_system()} - {rom.get('name')}"
+        return key in mias
+
+    def _mark_game_mias(self, game: dict, mias: dict, *, mark_all_roms_in_set: bool) -> dict:
+        """Mark the mias of a single game."""
+        if 'rom' not in game:
+            return game
+        roms = game['rom'] if isinstance(game['rom'], list) else [game['rom']]
+        miad = False
+        for rom in roms:
+            if self.mark_mia(rom, mias):
+                rom['@mia'] = 'yes'
+                miad = True
+        if miad and mark_all_roms_in_set:
+            for rom in roms:
+                rom['@mia'] = 'yes'
+        return game
+
+    def mark_mias_transform(self, mias: dict) -> Callable[[dict], dict]:
+        """Get the transform that marks the mias of a game."""
+        mark_all_roms_in_set = config.getboolean('PROCESS', 'MarkAllRomsInSet', fallback=False)
+        return partial(self._mark_game_mias, mias=mias, mark_all_roms_in_set=mark_all_roms_in_set)
+
+    def mark_mias(self, mias: dict) -> None:
+        """Mark the mias in the dat file."""
+        self.transform(self.mark_mias_transform(mias))
+
 
     def dict(self) -> dict:
         """Return a dictionary with the dat file information."""
         self.initial_parse()
+        date = self.get_date()
         return {
             'name': self.name,
             'file': self.file,
             'full_name': self.full_name,
             'seed': self.seed,
             'version': self.get_version(),
-            'date': self.get_date(),
+            'date': date,
+            'sort_date': normalize_date(date),
             'modifier': self.get_modifier(),
             'company': self.get_company(),
             'system': self.get_system(),
@@ -141,8 +590,8 @@ class DatFile:
     def from_file(file: str | Path | None) -> 'DatFile':
         """Create a class dynamically."""
         try:
-            dat_file = DatFile.class_from_file(dat_file=file)
-            return dat_file(file=file) if dat_file else None
+            sniff = FileSniff(file)
+            return sniff.dat_class(file=file, sniff=sniff) if sniff.dat_class else None
         except Exception:
             logging.exception('Error detecting seed type')
             raise
@@ -150,106 +599,158 @@ class DatFile:
     @staticmethod
     def class_from_file(dat_file: str | Path | None) -> 'DatFile':
         """Create a class dynamically."""
-        with open(dat_file, encoding='utf-8', errors='ignore') as file:
-            file_header = file.read(10).encode('ascii', errors='ignore')[:5].decode()
-        if file_header == FileHeaders.XML.value:
-            # Check if it's a DB Export format (no header element)
-            if DatFile._is_xml_db_export(dat_file):
-                return XMLDBExportDatFile
-            return XMLDatFile
-        if file_header == FileHeaders.CLRMAMEPRO.value:
-            return ClrMameProDatFile
-        if file_header == FileHeaders.DOSCENTER.value:
-            return DOSCenterDatFile
-        return None
+        return FileSniff(dat_file).dat_class
 
     @staticmethod
     def _is_xml_db_export(dat_file: str | Path) -> bool:
         """Check if XML file is DB Export format (has no header element)."""
-        with open(dat_file, encoding='utf-8', errors='ignore') as file:
-            # Read first few lines to check for header element
-            for _ in range(50):  # Check first 50 lines
-                line = file.readline()
-                if not line:
-                    break
-                if '<header>' in line or '<header ' in line:
-                    return False  # Has header, not DB Export
-                if '<game' in line:
-                    return True  # Found game before header, it's DB Export
-        return False  # Default to regular XML
+        return FileSniff(dat_file).is_db_export()
 
 class XMLDatFile(DatFile):
-    """XML dat file."""
+    """XML dat file.
+
+    Only the header is kept in memory unless the dat is loaded with `load_games`, games are streamed from
+    the file one at a time whenever they are needed.
+    """
 
     shas = None
     main_key = 'datafile'
     game_key = 'game'
     header: dict = None
-    merged_roms: list = None
     merge_options = 'dedupe' # dedupe, merge
+    root_attributes: dict = None
+    games_loaded: bool = False
+    _source: str | Path = None
+    _spool: IO[bytes] = None
 
     def load(self, *, load_games: bool = False) -> None:
         """Load the data from a XML file."""
-        with open(self.file, encoding='utf-8-sig') as fild:
-            # Load the entire file or just header based on load_games flag
-            xml_content = fild.read() if load_games else self._read_header_only(fild)
-
-            self.data = xmltodict.parse(xml_content)
-            self.detect_main_key()
-            self.header = self.data[self.main_key].get('header', {})
-            if self.header:
-                self.name = self.header.get('name')
-                self.full_name = self.header.get('description')
-                self.date = self.header.get('date')
-                self.homepage = self.header['homepage'] if 'homepage' in self.header and self.header['homepage'] \
-                    and 'insert' not in self.header['homepage'] else None
-                self.url = self.header['url'] if 'url' in self.header and self.header['url'] \
-                    and 'insert' not in self.header['url'] else None
-                self.author = self.header['author'] if 'author' in self.header and self.header['author'] \
-                    and 'insert' not in self.header['author'] else None
-                self.email = self.header['email'] if 'email' in self.header and self.header['email'] \
-                    and 'insert' not in self.header['email'] else None
-            else:
-                self.name = self.data[self.main_key].get('@name')
-                self.full_name = self.data[self.main_key].get('@description')
-            if load_games:
-                self.detect_game_key()
-
-    def _read_header_only(self, file_obj: Any) -> str:  # noqa: ANN401
-        """Read only the header portion of the XML file for memory efficiency."""
-        lines = []
-        header_closed = False
-        main_tag = None
-
-        for line in file_obj:
-            lines.append(line)
-
-            # Capture the main tag name (e.g., "datafile", "logiqx", etc.)
-            stripped = line.strip()
-            if main_tag is None and '<' in line and not stripped.startswith('<?') and not stripped.startswith('<!'):
-                # Extract tag name from opening tag
-                tag_start = line.find('<') + 1
-                tag_end = line.find('>', tag_start)
-                if tag_end > tag_start:
-                    tag_name = line[tag_start:tag_end].split()[0].strip()
-                    if tag_name and not tag_name.startswith('/'):
-                        main_tag = tag_name
-
-            # Check if we've reached the end of the header
-            if '</header>' in line:
-                header_closed = True
+        container = self._read(load_games=load_games)
+        self.data = {self.main_key: container}
+        self.header = self.data[self.main_key].get('header', {})
+        if self.header:
+            self.name = self.header.get('name')
+            self.full_name = self.header.get('description')
+            self.date = self.header.get('date')
+            self.homepage = self.header['homepage'] if 'homepage' in self.header and self.header['homepage'] \
+                and 'insert' not in self.header['homepage'] else None
+            self.url = self.header['url'] if 'url' in self.header and self.header['url'] \
+                and 'insert' not in self.header['url'] else None
+            self.author = self.header['author'] if 'author' in self.header and self.header['author'] \
+                and 'insert' not in self.header['author'] else None
+            self.email = self.header['email'] if 'email' in self.header and self.header['email'] \
+                and 'insert' not in self.header['email'] else None
+        else:
+            self.name = self.data[self.main_key].get('@name')
+            self.full_name = self.data[self.main_key].get('@description')
+        if load_games:
+            self.detect_game_key()
+
+    def _read(self, *, load_games: bool = False) -> dict:
+        """Read the root element of the file, stopping after the header unless `load_games` is set."""
+        self.close()
+        self._source = self.file
+        self.games_loaded = load_games
+        sniff, self.sniff = self.sniff, None
+        container = {}
+        for tag, node in self._iter_elements(sniff):
+            if not load_games and tag != 'header':
+                break
+            add_node(container, tag, node)
+            if not load_games:
                 break
+        return {**self.root_attributes, **container}
 
-        # Add closing tag for the main element
-        if header_closed and main_tag:
-            lines.append(f'</{main_tag}>\n')
+    def _iter_elements(self, sniff: FileSniff | None = None) -> Generator[tuple[str, Any], None, None]:
+        """Stream the children of the root element as (tag, node).
 
-        return ''.join(lines)
+        Every child is converted as soon as it is closed and then cleared from the tree, so memory is
+        bounded by the biggest single game (or dir) instead of the whole file. When the file was sniffed
+        its prefix is parsed first, and the file is only opened if more than the prefix is needed.
+        A full pass stores the children in the dat cache, later passes read them from there while the
+        file is unchanged.
+        """
+        source = self._source or self.file
+        cached = dat_cache.get(source, type(self))
+        if cached:
+            self.main_key = cached['main_key']
+            self.root_attributes = cached['root_attributes']
+            yield from cached
+            return
+        depth = 0
+        root = None
+        with dat_cache.writer(source, type(self)) as cache, \
+                sniff.open() if sniff else open(source, 'rb') as fild:
+            for event, element in iterparse(fild, events=('start', 'end')):  # noqa: S314
+                if event == 'start':
+                    if root is None:
+                        root = element
+                        self.main_key = element.tag
+                        self.root_attributes = {f'@{key}': value for key, value in element.attrib.items()}
+                        cache.meta.update(main_key=self.main_key, root_attributes=self.root_attributes)
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    node = element_to_dict(element)
+                    cache.add(element.tag, node)
+                    yield element.tag, node
+                    root.clear()
+
+    def iter_entries(self) -> Generator[tuple[str, Any], None, None]:
+        """Yield every entry of the root element but the header (games, dirs, etc) as (tag, node)."""
+        if self._spool:
+            self._spool.seek(0)
+            while True:
+                try:
+                    yield pickle.load(self._spool)  # noqa: S301
+                except EOFError:
+                    return
+        elif self.games_loaded:
+            for key, value in self.data[self.main_key].items():
+                if key != 'header' and not key.startswith(('@', '#')):
+                    yield from ((key, node) for node in (value if isinstance(value, list) else [value]))
+        else:
+            yield from ((tag, node) for tag, node in self._iter_elements() if tag != 'header')
+
+    def _iter_tag(self, tag: str) -> Generator[Any, None, None]:
+        """Yield the entries with the given tag."""
+        yield from (node for entry_tag, node in self.iter_entries() if entry_tag == tag)
+
+    def iter_games(self) -> Generator[dict, None, None]:
+        """Yield every game of the dat, including the ones nested in <dir> elements."""
+        for tag, node in self.iter_entries():
+            if tag == 'dir':
+                yield from self._iter_games(node)
+            elif isinstance(node, dict):
+                yield node
 
-    def save(self) -> None:
-        """Save the data to a XML file."""
-        with open(self.file, 'w', encoding='utf-8') as fild:
-            fild.write(xmltodict.unparse(self.data, pretty=True))
+    def close(self) -> None:
+        """Close the temporary spool of streamed games, if any."""
+        if self._spool:
+            self._spool.close()
+        self._spool = None
+
+    def save(self, *, pretty: bool | None = None) -> None:
+        """Save the data to a XML file.
+
+        The header and then every game are written one at a time to a temporary file which replaces the
+        dat once complete, so streamed games can be read from the dat being overwritten.
+        """
+        if pretty is None:
+            pretty = not config.getboolean('PROCESS', 'CompactXML', fallback=False)
+        root = self.data[self.main_key]
+        with atomic_write(self.file) as fild:
+            writer = XMLWriter(fild, pretty=pretty)
+            writer.start(self.main_key, root)
+            if self.games_loaded:
+                writer.write_all({key: value for key, value in root.items() if value != []})
+            else:
+                if 'header' in root:
+                    writer.write('header', root['header'])
+                for tag, node in self.iter_entries():
+                    writer.write(tag, node)
+            writer.end()
 
     def detect_main_key(self) -> str:
         """Detect the main key for the dat file."""
@@ -274,35 +775,7 @@ class XMLDatFile(DatFile):
 
     def add_rom(self, rom: dict) -> None:
         """Add a rom to the dat file."""
-        self.shas.add_rom(self.parse_rom(rom))
-
-    def mark_mia(self, rom: dict, mias: dict) -> None:
-        """Mark the mias in the dat file."""
-        key = rom.get('@sha1') or rom.get('@md5') or rom.get('@crc32') or f"{self.get_system()} - {rom.get('name')}"
-        return key in mias
-
-    def mark_mias(self, mias: dict) -> None:
-        """Mark the mias in the dat file."""
-        mark_all_roms_in_set = config.getboolean('PROCESS', 'MarkAllRomsInSet', fallback=False)
-        if not isinstance(self.data[self.main_key][self.game_key], list):
-            self.data[self.main_key][self.game_key] = [self.data[self.main_key][self.game_key]]
-        for game in self.data[self.main_key][self.game_key]:
-            if 'rom' not in game:
-                continue
-            if not isinstance(game['rom'], list):
-                miad = self.mark_mia(game['rom'], mias)
-                if miad:
-                    game['rom']['@mia'] = 'yes'
-            else:
-                miad = False
-                for rom in game['rom']:
-                    miad = self.mark_mia(rom, mias)
-                    if miad:
-                        rom['@mia'] = 'yes'
-                if miad and mark_all_roms_in_set:
-                    for rom in game['rom']:
-                        rom['@mia'] = 'yes'
-                    break
+        self.shas.add_rom(RomRecord.from_dict(rom))
 
     def _iter_games(self, container: dict) -> Generator[dict, None, None]:
         """Recursively yield game dicts from a container that may hold 'game' and/or 'dir' entries.
@@ -312,111 +785,73 @@ class XMLDatFile(DatFile):
         more 'game'/'dir' entries. This allows dat files with nested <dir> elements to be walked
         the same way as flat ones.
         """
-        if 'game' in container:
-            games = container['game']
-            if not isinstance(games, list):
-                games = [games]
-            yield from games
-        if 'dir' in container:
-            dirs = container['dir']
-            if not isinstance(dirs, list):
-                dirs = [dirs]
-            for sub_dir in dirs:
-                yield from self._iter_games(sub_dir)
-
-    def _dedupe_game(
-        self,
-        game: dict,
-        has_rom: Callable[[dict], bool],
-        on_keep: Callable[[dict], None] | None,
-    ) -> dict | None:
-        """Filter duplicate roms out of a single game, returning None if no roms remain."""
-        roms = game['rom'] if isinstance(game['rom'], list) else [game['rom']]
-        new_roms = []
-        for rom in roms:
-            if has_rom(self.parse_rom(rom)):
-                self.merged_roms.append(self.parse_rom(rom))
-            else:
-                if on_keep:
-                    on_keep(rom)
-                new_roms.append(rom)
-        if not new_roms:
-            return None
-        new_game = {key: value for key, value in game.items() if key != 'rom'}
-        new_game['rom'] = new_roms
-        return new_game
-
-    def _dedupe_games(
-        self,
-        container: dict,
-        has_rom: Callable[[dict], bool],
-        on_keep: Callable[[dict], None] | None = None,
-    ) -> None:
-        """Recursively filter out duplicate roms from a container, dropping empty games/dirs.
-
-        `container` is a dict that may hold 'game' and/or 'dir' entries (see `_iter_games`).
+        if not isinstance(container, dict):
+            return
+        for key, value in container.items():
+            if key.startswith(('@', '#')):
+                continue
+            for node in value if isinstance(value, list) else [value]:
+                if key == 'dir':
+                    yield from self._iter_games(node)
+                elif isinstance(node, dict):
+                    yield node
+
+    def _transform_entry(self, tag: str, node: Any, transform: Callable[[dict], dict | None]) -> Any:  # noqa: ANN401
+        """Transform an entry, a 'dir' is transformed recursively and dropped if nothing is left in it."""
+        if not isinstance(node, dict):
+            return node
+        if tag == 'dir':
+            self._transform_games(node, transform)
+            return node if any(not key.startswith(('@', '#')) for key in node) else None
+        return transform(node)
+
+    def _transform_games(self, container: dict, transform: Callable[[dict], dict | None]) -> None:
+        """Recursively transform the games of a container, dropping empty games/dirs.
+
+        `container` is a dict that may hold games and/or 'dir' entries (see `_iter_games`).
         Games are kept in place wherever they appear in the tree; a game is dropped entirely if
-        all of its roms are duplicates, and a 'dir' is dropped if it ends up with no games and no
+        `transform` returns None for it, and a 'dir' is dropped if it ends up with no games and no
         sub-dirs left.
-
-        has_rom: given a parsed rom, return True if it's a duplicate that should be removed.
-        on_keep: optional callback invoked with the raw rom dict for every rom that is kept.
         """
-        if 'game' in container:
-            games = container['game']
-            if not isinstance(games, list):
-                games = [games]
-            new_games = [
-                new_game
-                for game in games if 'rom' in game
-                for new_game in (self._dedupe_game(game, has_rom, on_keep),)
-                if new_game is not None
+        for key in [key for key in container if key != 'header' and not key.startswith(('@', '#'))]:
+            nodes = container[key] if isinstance(container[key], list) else [container[key]]
+            new_nodes = [
+                new_node
+                for node in nodes
+                for new_node in (self._transform_entry(key, node, transform),)
+                if new_node is not None
             ]
-            if new_games:
-                container['game'] = new_games
-            else:
-                container.pop('game', None)
-
-        if 'dir' in container:
-            dirs = container['dir']
-            if not isinstance(dirs, list):
-                dirs = [dirs]
-            new_dirs = []
-            for sub_dir in dirs:
-                self._dedupe_games(sub_dir, has_rom, on_keep)
-                if 'game' in sub_dir or 'dir' in sub_dir:
-                    new_dirs.append(sub_dir)
-            if new_dirs:
-                container['dir'] = new_dirs
+            if new_nodes:
+                container[key] = new_nodes
             else:
-                container.pop('dir', None)
+                container.pop(key)
 
-    def get_rom_shas(self) -> None:
-        """Get the shas for the roms and creates an index."""
-        self.shas = HashesIndex()
+    def _entry_games(self, tag: str, node: Any) -> list[dict]:  # noqa: ANN401
+        """Get the games of an entry, the ones nested in a <dir> too."""
+        return list(self._iter_games({tag: node}))
 
-        for game in self._iter_games(self.data[self.main_key]):
-            if 'rom' not in game:
-                continue
-            if not isinstance(game['rom'], list):
-                self.add_rom(game['rom'])
-            else:
-                for rom in game['rom']:
-                    self.add_rom(rom)
+    def _transform(self, transform: Callable[[dict], dict | None],
+                   prepares: tuple[Callable[[list[dict]], None], ...] = ()) -> None:
+        """Apply `transform` to every game of the dat.
 
-    def merge_with(self, parent: DatFile) -> None:
-        """Merge the dat file with the parent."""
-        if not self.merged_roms:
-            self.merged_roms = []
-        parent.get_rom_shas()
-        self._dedupe_games(self.data[self.main_key], has_rom=parent.shas.has_rom)
-
-    def dedupe(self) -> None:
-        """Dedupe the dat file."""
-        self.shas = HashesIndex()
-        if not self.merged_roms:
-            self.merged_roms = []
-        self._dedupe_games(self.data[self.main_key], has_rom=self.shas.has_rom, on_keep=self.add_rom)
+        Loaded games are transformed in place, prepares are called with all of them first. Streamed games
+        are transformed one at a time into a temporary spool, which becomes the source of the games for
+        later passes and for `save`, prepares are called with every chunk of them (see `_prepared`).
+        """
+        if self.games_loaded:
+            if prepares:
+                games = list(self.iter_games())
+                for prepare in prepares:
+                    prepare(games)
+            self._transform_games(self.data[self.main_key], transform)
+            return
+        spool = tempfile.TemporaryFile()  # noqa: SIM115
+        for tag, node in self._prepared(self.iter_entries(), prepares):
+            new_node = self._transform_entry(tag, node, transform)
+            if new_node is not None:
+                pickle.dump((tag, new_node), spool, pickle.HIGHEST_PROTOCOL)
+        self.close()
+        self._spool = spool
 
     def get_name(self) -> str:
         """Get the name of the dat file."""
@@ -451,13 +886,11 @@ class XMLDatFile(DatFile):
         """Get the date from the dat file."""
         return self.date
 
-    def to_csv(self) -> str:
+    def to_csv(self) -> Generator[str, None, None]:
         """Convert the dat file to a CSV file."""
-        if not self.data[self.main_key][self.game_key]:
-            self.load()
-        if not self.data[self.main_key][self.game_key]:
-            raise ValueError('No games found in the dat file')
-        for game in self.data[self.main_key][self.game_key]:
+        found = False
+        for game in self.iter_games():
+            found = True
             if 'rom' in game:
                 roms = game['rom'] if isinstance(game['rom'], list) else [game['rom']]
                 for rom in roms:
@@ -470,6 +903,9 @@ class XMLDatFile(DatFile):
                     md5 = rom.get('@md5', '')
                     crc = rom.get('@crc', '')
                     yield f'"{clean_rom_name}"\t"{sha}"\t"{md5}"\t"{crc}"\n'
+        if not found:
+            msg = 'No games found in the dat file'
+            raise ValueError(msg)
 
 
 class XMLDBExportDatFile(XMLDatFile):
@@ -477,90 +913,78 @@ class XMLDBExportDatFile(XMLDatFile):
 
     def load(self, *, load_games: bool = False) -> None:
         """Load the data from a XML DB Export file (no header element)."""
-        with open(self.file, encoding='utf-8') as fild:
-            # Load the entire file or just first game based on load_games flag
-            xml_content = fild.read() if load_games else self._read_first_game_only(fild)
-
-            self.data = xmltodict.parse(xml_content)
-            self.detect_main_key()
-            # DB Export format has no header element
-            self.header = {}
-
-            # Set placeholder values for missing header fields
-            self.name = self.data[self.main_key].get('@name', 'DB Export')
-            self.full_name = self.data[self.main_key].get('@description', 'Database Export')
-            self.date = None  # Placeholder - to be determined later from filename or metadata
-            self.homepage = None
-            self.url = None
-            self.author = None
-            self.email = None
-
-            if load_games:
-                self.detect_game_key()
-
-    def _read_first_game_only(self, file_obj: Any) -> str:  # noqa: ANN401
-        """Read only the first game for structure detection in DB Export format."""
-        lines = []
-        main_tag = None
-        game_count = 0
-        max_games_to_read = 1
-
-        for line in file_obj:
-            lines.append(line)
-
-            # Capture the main tag name (e.g., "datafile")
-            stripped = line.strip()
-            if main_tag is None and '<' in line and not stripped.startswith('<?') and not stripped.startswith('<!'):
-                # Extract tag name from opening tag
-                tag_start = line.find('<') + 1
-                tag_end = line.find('>', tag_start)
-                if tag_end > tag_start:
-                    tag_name = line[tag_start:tag_end].split()[0].strip()
-                    if tag_name and not tag_name.startswith('/'):
-                        main_tag = tag_name
-
-            # Count game tags to stop after first game
-            if main_tag and '<game' in line and not line.strip().startswith('<!'):
-                game_count += 1
-            if game_count >= max_games_to_read and '</game>' in line:
-                # We've read enough to parse the structure
-                break
-
-        # Add closing tag for the main element
-        if game_count > 0 and main_tag:
-            lines.append(f'</{main_tag}>\n')
-
-        return ''.join(lines)
-
+        container = self._read(load_games=load_games)
+        self.data = {self.main_key: container}
+        # DB Export format has no header element
+        self.header = {}
+
+        # Set placeholder values for missing header fields
+        self.name = self.data[self.main_key].get('@name', 'DB Export')
+        self.full_name = self.data[self.main_key].get('@description', 'Database Export')
+        self.date = None  # Placeholder - to be determined later from filename or metadata
+        self.homepage = None
+        self.url = None
+        self.author = None
+        self.email = None
+
+        if load_games:
+            self.detect_game_key()
 
 class ClrMameProDatFile(DatFile):
-    """ClrMamePro dat file."""
+    """ClrMamePro dat file.
+
+    Only the header is kept in memory unless the dat is loaded with `load_games`, games are streamed from
+    the file one at a time whenever they are needed.
+    """
 
     header: dict = None
     games: list = None
+    # the keyword of every loaded game block ('game', 'resource', etc), in the same order
+    block_tags: list = None
+    games_loaded: bool = False
     main_key = 'clrmamepro'
     game_key = 'game'
+    header_tag = 'clrmamepro'
+    writer_class = ClrMameProWriter
+    _spool: IO[bytes] = None
 
     def get_next_block(self, data: str) -> tuple[str, str]:
         """Get the next block of data."""
-        parenthesis = 0
-        start = 0
-        end = 0
-        within_string = False
-        for i, char in enumerate(data):
-            if char == '"':
-                within_string = not within_string
-            if not within_string:
-                if char == '(':
-                    if parenthesis == 0:
-                        start = i + 1
-                    parenthesis += 1
-                if char == ')':
-                    parenthesis -= 1
-            if parenthesis == 0 and start >= 1:
-                end = i
-                break
-        return data[start:end], data[end + 1:] if end < len(data) else None
+        for start, end in scan_blocks(data):
+            return data[start:end], data[end + 1:] if end + 1 < len(data) else None
+        return '', None
+
+    def iter_blocks(self) -> Generator[tuple[str, str], None, None]:
+        """Yield the keyword and the content of every top level block of the file, the header first.
+
+        The file is memory mapped and scanned once, only the blocks being yielded are decoded.
+        """
+        with open(self.file, 'rb') as fild:
+            if not os.fstat(fild.fileno()).st_size:
+                return
+            with mmap.mmap(fild.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                previous = 0
+                for start, end in scan_blocks(buffer):
+                    # the keyword is everything between the previous block and the opening parenthesis
+                    tag = buffer[previous:start - 1].decode(self.encoding, errors='ignore').strip()
+                    yield tag or self.game_key, buffer[start:end].decode(self.encoding, errors='ignore')
+                    previous = end + 1
+
+    def iter_parsed_blocks(self) -> Generator[tuple[str, dict], None, None]:
+        """Yield every top level block of the file parsed as (keyword, block), the header first.
+
+        A full pass stores the parsed blocks in the dat cache, later passes read them from there while
+        the file is unchanged.
+        """
+        cached = dat_cache.get(self.file, type(self))
+        if cached:
+            yield from cached
+            return
+        with dat_cache.writer(self.file, type(self), encoding=self.encoding) as cache:
+            for tag, block in self.iter_blocks():
+                node = self.read_block(block)
+                cache.add(tag, node)
+                yield tag, node
 
     def read_block(self, data: str) -> dict:
         """Read a block of data from a ClrMame dat and parses it."""
@@ -572,7 +996,7 @@ class ClrMameProDatFile(DatFile):
                     line = line[6:-2]
                     rom = {'@name': None, '@crc': None, '@md5': None, '@sha1': None}
                     try:
-                        data = shlex.split(line)
+                        data = split_line(line)
                     except ValueError:
                         data = line.split(' ')
                     for i in range(0, len(data), 2):
@@ -581,7 +1005,7 @@ class ClrMameProDatFile(DatFile):
                     dictionary['rom'].append(rom)
                 else:
                     try:
-                        key, value = shlex.split(line)
+                        key, value = split_line(line)
                     except ValueError as exc:
                         msg = f'Error parsing line: {line} from: {self.file}'
                         raise ValueError(msg) from exc
@@ -591,19 +1015,24 @@ class ClrMameProDatFile(DatFile):
 
     def load(self, *, load_games: bool = False) -> None:
         """Load the data from a ClrMamePro file."""
+        self.close()
         self.games = []
+        self.block_tags = []
         self.main_key = 'datafile'
-        with open(self.file, encoding='utf-8', errors='ignore') as file:
-            data = file.read()
-
-            block, next_block = self.get_next_block(data)
-            self.header = self.read_block(block)
-            self.header = {k.lower(): v for k, v in self.header.items()}
-
+        self.games_loaded = load_games
+        sniff, self.sniff = self.sniff, None
+        header = sniff.first_block() if sniff and not load_games else None
+        if header is None:
+            blocks = self.iter_parsed_blocks()
+            _, self.header = next(blocks, (None, {}))
             if load_games:
-                while next_block:
-                    block, next_block = self.get_next_block(next_block)
-                    self.games.append(self.read_block(block))
+                for tag, node in blocks:
+                    self.block_tags.append(tag)
+                    self.games.append(node)
+            blocks.close()
+        else:
+            self.header = self.read_block(header)
+        self.header = {k.lower(): v for k, v in self.header.items()}
 
         self.data = {
             self.main_key: {
@@ -614,53 +1043,72 @@ class ClrMameProDatFile(DatFile):
         self.name = self.header['name']
         self.full_name = self.header['description']
 
-    def get_rom_shas(self) -> None:
-        """Get the shas for the roms and creates an index."""
-        self.shas = HashesIndex()
+    def iter_entries(self) -> Generator[tuple[str, dict], None, None]:
+        """Yield every block of the dat but the header as (keyword, block)."""
+        if self._spool:
+            self._spool.seek(0)
+            while True:
+                try:
+                    yield pickle.load(self._spool)  # noqa: S301
+                except EOFError:
+                    return
+        elif self.games_loaded:
+            yield from zip(self.block_tags, self.games, strict=True)
+        else:
+            blocks = self.iter_parsed_blocks()
+            next(blocks, None)
+            yield from blocks
+
+    def iter_games(self) -> Generator[dict, None, None]:
+        """Yield every game of the dat, streaming them from the file if they are not loaded."""
+        for _, node in self.iter_entries():
+            yield node
 
-        for game in self.games:
-            if 'rom' not in game:
-                continue
-            if not isinstance(game['rom'], list):
-                self.add_rom(game['rom'])
-            else:
-                for rom in game['rom']:
-                    self.add_rom(rom)
+    def close(self) -> None:
+        """Close the temporary spool of streamed games, if any."""
+        if self._spool:
+            self._spool.close()
+        self._spool = None
+
+    def _transform(self, transform: Callable[[dict], dict | None],
+                   prepares: tuple[Callable[[list[dict]], None], ...] = ()) -> None:
+        """Apply `transform` to every game of the dat.
+
+        Loaded games are transformed in place, prepares are called with all of them first. Streamed games
+        are transformed one at a time into a temporary spool, which becomes the source of the games for
+        later passes and for `save`, prepares are called with every chunk of them (see `_prepared`).
+        """
+        if self.games_loaded:
+            for prepare in prepares:
+                prepare(self.games)
+            entries = [(tag, new_node) for tag, node in self.iter_entries()
+                       for new_node in (transform(node),) if new_node is not None]
+            self.block_tags[:] = [tag for tag, _ in entries]
+            self.games[:] = [node for _, node in entries]
+            return
+        spool = tempfile.TemporaryFile()  # noqa: SIM115
+        for tag, node in self._prepared(self.iter_entries(), prepares):
+            new_node = transform(node)
+            if new_node is not None:
+                pickle.dump((tag, new_node), spool, pickle.HIGHEST_PROTOCOL)
+        self.close()
+        self._spool = spool
 
-    def merge_with(self, parent: DatFile) -> None:
-        """Merge the dat file with the parent."""
-        print('Not yet implemented')
-        return
-        if not self.merged_roms:
-            self.merged_roms = []
-        parent.get_rom_shas()
-        new_games = []
-        for game in self.data[self.main_key][self.game_key]:
-            if 'rom' not in game:
-                continue
-            new_game = {}
-            for key in game:
-                if key != 'rom':
-                    new_game[key] = game[key]
-            if not isinstance(game['rom'], list):
-                if parent.shas.has_rom(self.parse_rom(game['rom'])):
-                    self.merged_roms.append(self.parse_rom(game['rom']))
-                else:
-                    new_game['rom'] = game['rom']
-            else:
-                new_roms = []
-                for rom in game['rom']:
-                    if not parent.shas.has_rom(self.parse_rom(rom)):
-                        new_roms.append(rom)
-                    else:
-                        self.merged_roms.append(self.parse_rom(rom))
-                new_game['rom'] = new_roms
-            new_games.append(new_game)
-        self.data[self.main_key][self.game_key] = new_games
+    def save(self) -> None:
+        """Save the data to a ClrMamePro file.
+
+        The header and then every game are written one at a time to a temporary file which replaces the
+        dat once complete, so streamed games can be read from the dat being overwritten.
+        """
+        with atomic_write(self.file, encoding=self.encoding) as fild:
+            writer = self.writer_class(fild)
+            writer.write_header(self.header_tag, self.header)
+            for tag, node in self.iter_entries():
+                writer.write(tag, node)
 
     def add_rom(self, rom: dict) -> None:
         """Add a rom to the dat file."""
-        self.shas.add_rom(self.parse_rom(rom))
+        self.shas.add_rom(RomRecord.from_dict(rom))
 
     def parse_rom(self, rom: dict) -> dict:
         """Standarize the rom."""
@@ -675,6 +1123,9 @@ class ClrMameProDatFile(DatFile):
 class DOSCenterDatFile(ClrMameProDatFile):
     """DOSCenter dat file."""
 
+    header_tag = 'DOSCenter'
+    writer_class = DOSCenterWriter
+
     def read_block(self, data: str) -> dict:
         """Read a block of data from a DOSCenter dat and parses it."""
         dictionary = {}
@@ -685,7 +1136,7 @@ class DOSCenterDatFile(ClrMameProDatFile):
                     line = line[6:-2]
                     rom = {'@name': None, '@crc': None, '@md5': None, '@sha1': None}
                     try:
-                        data = shlex.split(line)
+                        data = split_line(line)
                     except ValueError:
                         data = line.split(' ')
                     for i in range(0, len(data), 2):
@@ -698,7 +1149,7 @@ class DOSCenterDatFile(ClrMameProDatFile):
                         if ':' in line:
                             key, value = line.split(':', 1)
                         if not key or "'" in key or '"' in key:
-                            key, value = shlex.split(line)
+                            key, value = split_line(line)
                     except ValueError:
                         split = ' '.split(line)
                         key, value = split[0], ' '.join(split[1:])
@@ -1,17 +1,21 @@
 """Dedupe module."""
 import logging
+from collections.abc import Callable
 from pathlib import Path
 
 from datoso.database.models.dat import Dat
-from datoso.repositories.dat_file import ClrMameProDatFile, DatFile
+from datoso.database.rom_index import index_dat, rom_index
+from datoso.repositories.dat_file import DatFile, parent_index
+from datoso.repositories.hashes_index import HashesIndex
+from datoso.repositories.index_cache import index_cache
 
 
 class DatDedupe:
     """Dat Dedupe class."""
 
-    _datdb: Dat
-    _datfile: DatFile
-    _file: str | Path
+    _db: Dat = None
+    _datfile: DatFile = None
+    _file: str | Path = None
 
     @property
     def datdb(self) -> Dat:
@@ -25,7 +29,9 @@ class DatDedupe:
 
     @property
     def datfile(self) -> DatFile:
-        """Return the dat file."""
+        """Return the dat file, it is parsed on first use."""
+        if self._datfile is None and self._file:
+            self._datfile = get_dat_file(self._file)
         return self._datfile
 
     @datfile.setter
@@ -43,6 +49,42 @@ class DatDedupe:
         """Set the file."""
         self._file = value
 
+    def indexed_shas(self) -> HashesIndex | None:
+        """Get the hashes index of the dat from the global rom index, None if it is not indexed or changed."""
+        if not self._db or not self._file:
+            return None
+        return rom_index.hashes_index(self._db.seed, self._db.name, self._file)
+
+    def rom_shas(self) -> HashesIndex:
+        """Get the hashes index of the dat, shared by the whole run through the index cache.
+
+        It is read from the global rom index if the dat is indexed, the dat is parsed if not.
+        """
+        def build() -> HashesIndex:
+            shas = self.indexed_shas()
+            return shas if shas is not None else self.datfile.rom_shas()
+        if not self._file:
+            return build()
+        key = index_cache.key(self._file, *((self._db.seed, self._db.name) if self._db else ()))
+        return index_cache.get(key, self._file, build)
+
+    def update_index(self) -> None:
+        """Index the roms of the dat in the global rom index."""
+        if self._db and self.datfile:
+            index_dat(self._db.seed, self._db.name, self.datfile.file,
+                      self.datfile.iter_game_records(keep_source=False))
+
+
+def get_dat_file(file: str | Path) -> DatFile:
+    """Return a DatFile from a file."""
+    try:
+        # games are streamed from the file, no need to load them
+        dat = DatFile.from_file(file=file)
+    except Exception as e:  # noqa: BLE001
+        msg = 'Invalid dat file'
+        raise ValueError(msg, e) from None
+    return dat
+
 
 class Dedupe:
     """Merge two dat files."""
@@ -74,7 +116,7 @@ class Dedupe:
                 obj.file = getattr(var, 'new_file', None) or var.file
             if isinstance(var, DatFile):
                 obj.datfile = var
-            else:
+            elif obj is self.child:
                 obj.datfile = self.get_dat_file(obj.file)
 
         load_metadata(child, self.child)
@@ -83,23 +125,22 @@ class Dedupe:
 
     def get_dat_file(self, file: str | Path) -> DatFile:
         """Return a DatFile from a file."""
-        try:
-            dat = DatFile.from_file(file=file)
-            if isinstance(dat, ClrMameProDatFile):
-                dat.load(load_games=True)
-            else:
-                dat.load(load_games=True)
-        except Exception as e:  # noqa: BLE001
-            msg = 'Invalid dat file'
-            raise ValueError(msg, e) from None
-        return dat
+        return get_dat_file(file)
+
+    def transform(self, merged_roms: list | None = None) -> Callable[[dict], dict | None]:
+        """Get the transform that dedupes a game of the child, against the parent if there is one.
+
+        A parent in the global rom index is not parsed, its roms are read from the index, and behind its
+        bloom filter neither is read unless the child may share roms with it.
+        """
+        if self.parent:
+            return self.child.datfile.merge_transform(parent_index(self.parent.file, self.parent.rom_shas),
+                                                      merged_roms)
+        return self.child.datfile.dedupe_transform(merged_roms)
 
     def dedupe(self) -> int:
         """Dedupe the dat files."""
-        if self.parent:
-            self.child.datfile.merge_with(self.parent.datfile)
-        else:
-            self.child.datfile.dedupe()
+        self.child.datfile.transform(self.transform())
         logging.info('Deduped %i roms', len(self.child.datfile.merged_roms))
         return len(self.child.datfile.merged_roms)
 
@@ -108,3 +149,4 @@ class Dedupe:
         if file and len(self.child.datfile.merged_roms) > 0:
             self.child.datfile.file = file
         self.child.datfile.save()
+        self.child.update_index()
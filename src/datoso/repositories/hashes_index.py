@@ -1,56 +1,199 @@
 """Hashes index module."""
+import sys
+from collections.abc import Iterable
+from contextlib import suppress
+from itertools import islice
+
+from datoso.repositories.records import RomRecord
+
+HASH_LENGTHS = {'sha256': 64, 'sha1': 40, 'md5': 32, 'crc': 8}
+BATCH_SIZE = 4096
+SIZE_BYTES = 8
+CRC_BITS = 32
+
+
+def normalize_hash(rom_hash: str, value: str | None) -> int | bytes | str | None:
+    """Normalize a hex hash into a compact key, crc as an uint32 and the others as raw bytes.
+
+    Case, whitespace, a '0x' prefix and the leading zeros of a crc don't change the key.
+    Values that are not valid hex are kept as a stripped lowercase string.
+    """
+    if not value:
+        return None
+    try:
+        if rom_hash == 'crc':
+            # int() already ignores case, surrounding whitespace, a '0x' prefix and leading zeros
+            crc = int(value, 16)
+            if crc >> CRC_BITS == 0:
+                return crc
+        else:
+            # fromhex() already ignores case and whitespace
+            return bytes.fromhex(value)
+    except ValueError:
+        value = value.strip().lower().removeprefix('0x')
+        if rom_hash != 'crc':
+            with suppress(ValueError):
+                return bytes.fromhex(value)
+    return value.strip().lower() or None
+
+
+def normalize_size(size: str | int | None) -> int | str | None:
+    """Normalize a rom size into an int, sizes that are not a decimal number are kept as they are."""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return (size.strip() or None) if isinstance(size, str) else size
+    return size if 0 <= size < 1 << (SIZE_BYTES * 8) else str(size)
+
+
+def rom_key(rom_hash: str, value: str | None, size: str | int | None) -> int | bytes | tuple | None:
+    """Get the composite (hash, size) key of a rom, None if the rom doesn't have that hash.
+
+    A crc key is the size shifted over the 32 bits of the crc, the other hashes are the size in
+    SIZE_BYTES big endian bytes followed by the raw hash. Anything that can't be packed is a tuple.
+    """
+    key = normalize_hash(rom_hash, value)
+    if key is None:
+        return None
+    size = normalize_size(size)
+    if isinstance(size, int):
+        if isinstance(key, int):
+            return size << CRC_BITS | key
+        if isinstance(key, bytes):
+            return size.to_bytes(SIZE_BYTES, 'big') + key
+    return (key, size)
+
+
+def unpack_hash(rom_hash: str, key: int | bytes | tuple) -> str:
+    """Get the hex hash of a composite key."""
+    if isinstance(key, tuple):
+        key = key[0]
+        if isinstance(key, str):
+            return key
+        if isinstance(key, bytes):
+            return key.hex()
+    if isinstance(key, int):
+        return f'{key & ((1 << CRC_BITS) - 1):0{HASH_LENGTHS[rom_hash]}x}'
+    return key[SIZE_BYTES:].hex()
 
 
 class HashesIndex:
-    """Index of hashes."""
+    """Index of hashes.
+
+    Every rom is stored once per hash as a composite key of its normalized hash and its size (see
+    `rom_key`), so a single set lookup tells if a rom with the same hash and size is in the index. A
+    batch of roms, like the roms of a game, is checked with a single set intersection per hash.
+    """
 
     valid_hashes: list
-    sha256: dict
-    sha1: dict
-    md5: dict
-    crc: dict
-    sizes: dict
+    sha256: set
+    sha1: set
+    md5: set
+    crc: set
 
     def __init__(self) -> None:
         """Initialize the index."""
-        self.sha256 = {}
-        self.sha1 = {}
-        self.md5 = {}
-        self.crc = {}
-        self.sizes = {}
+        self.sha256 = set()
+        self.sha1 = set()
+        self.md5 = set()
+        self.crc = set()
         self.valid_hashes = ['sha256', 'sha1', 'md5', 'crc']
 
-    def add_rom(self, rom: dict) -> None:
+    @staticmethod
+    def _records(roms: Iterable[RomRecord | dict]) -> list[RomRecord]:
+        """Get the records of a batch of roms."""
+        return [rom if isinstance(rom, RomRecord) else RomRecord.from_dict(rom, keep_source=False) for rom in roms]
+
+    def add_roms(self, roms: Iterable[RomRecord | dict]) -> None:
+        """Add a batch of roms to the index, any iterable is consumed in chunks of BATCH_SIZE roms."""
+        roms = iter(roms)
+        while chunk := self._records(islice(roms, BATCH_SIZE)):
+            for rom_hash in self.valid_hashes:
+                keys = (rom_key(rom_hash, getattr(rom, rom_hash), rom.size) for rom in chunk)
+                getattr(self, rom_hash).update(key for key in keys if key is not None)
+
+    def _lookup(self, roms: list[RomRecord], rom_hashes: list[str]) -> list[tuple[set, list, set]]:
+        """Look up a batch of roms with a single set intersection per hash.
+
+        Return for each hash its index, the keys of the roms and the keys already in the index.
+        """
+        lookups = []
+        for rom_hash in rom_hashes:
+            index = getattr(self, rom_hash, None)
+            if index is None:
+                continue
+            keys = [rom_key(rom_hash, getattr(rom, rom_hash), rom.size) for rom in roms]
+            lookups.append((index, keys, index.intersection(keys) if index else set()))
+        return lookups
+
+    def has_roms(self, roms: Iterable[RomRecord | dict], rom_hash: str | None = None) -> list[bool]:
+        """Check a batch of roms, return for each one if a rom with the same hash and size is in the index."""
+        roms = self._records(roms)
+        rom_hashes = [valid_hash for valid_hash in ([rom_hash] if rom_hash else self.valid_hashes)
+                      if getattr(self, valid_hash, None)]
+        found = [False] * len(roms)
+        for _, keys, hits in self._lookup(roms, rom_hashes):
+            if hits:
+                found = [was_found or key in hits for was_found, key in zip(found, keys, strict=True)]
+        return found
+
+    def add_new_roms(self, roms: Iterable[RomRecord | dict]) -> list[bool]:
+        """Add the roms that are not in the index yet, in order, return for each one if it was already there.
+
+        A rom is also a duplicate of an earlier rom of the same batch.
+        """
+        roms = self._records(roms)
+        lookups = [(index, keys, hits, set()) for index, keys, hits in self._lookup(roms, self.valid_hashes)]
+        duplicates = []
+        for i in range(len(roms)):
+            keys = [(hits, added, keys[i]) for _, keys, hits, added in lookups if keys[i] is not None]
+            duplicate = any(key in hits or key in added for hits, added, key in keys)
+            if not duplicate:
+                for _, added, key in keys:
+                    added.add(key)
+            duplicates.append(duplicate)
+        for index, _, _, added in lookups:
+            index.update(added)
+        return duplicates
+
+    def add_rom(self, rom: RomRecord | dict) -> None:
         """Add a rom to the index."""
+        if not isinstance(rom, RomRecord):
+            rom = RomRecord.from_dict(rom, keep_source=False)
         for rom_hash in self.valid_hashes:
-            if rom_hash in rom:
-                if rom_hash not in self.__dict__:
-                    self.__dict__[rom_hash] = {}
-                self.__dict__[rom_hash][rom[rom_hash]] = rom
+            key = rom_key(rom_hash, getattr(rom, rom_hash), rom.size)
+            if key is not None:
+                getattr(self, rom_hash).add(key)
 
-    def has_rom(self, rom: dict, rom_hash: str | None=None) -> bool:
+    def has_rom(self, rom: RomRecord | dict, rom_hash: str | None=None) -> bool:
         """Check if a rom exists in the index."""
-        if rom_hash:
-            return rom_hash in rom and rom_hash in self.__dict__ \
-                and rom[rom_hash] in self.__dict__[rom_hash] \
-                and rom['size'] == self.__dict__[rom_hash][rom[rom_hash]]['size']
-        return any((rom_hash in rom and rom_hash in self.__dict__ \
-                    and rom[rom_hash] in self.__dict__[rom_hash] \
-                    and rom['size'] == self.__dict__[rom_hash][rom[rom_hash]]['size']) \
-                    for rom_hash in self.valid_hashes)
-
-    def get_sha256s(self) -> list:
+        if not isinstance(rom, RomRecord):
+            rom = RomRecord.from_dict(rom, keep_source=False)
+        for valid_hash in [rom_hash] if rom_hash else self.valid_hashes:
+            index = getattr(self, valid_hash, None)
+            if index and rom_key(valid_hash, getattr(rom, valid_hash, None), rom.size) in index:
+                return True
+        return False
+
+    def memory_size(self) -> int:
+        """Get the approximate memory used by the index in bytes."""
+        return sum(
+            sys.getsizeof(index) + sum(sys.getsizeof(key) for key in index)
+            for index in (getattr(self, rom_hash) for rom_hash in self.valid_hashes)
+        )
+
+    def get_sha256s(self) -> set:
         """Get the sha256s."""
-        return self.sha256.keys()
+        return {unpack_hash('sha256', key) for key in self.sha256}
 
-    def get_sha1s(self) -> list:
+    def get_sha1s(self) -> set:
         """Get the sha1s."""
-        return self.sha1.keys()
+        return {unpack_hash('sha1', key) for key in self.sha1}
 
-    def get_md5s(self) -> list:
+    def get_md5s(self) -> set:
         """Get the md5s."""
-        return self.md5.keys()
+        return {unpack_hash('md5', key) for key in self.md5}
 
-    def get_crcs(self) -> list:
+    def get_crcs(self) -> set:
         """Get the crcs."""
-        return self.crc.keys()
+        return {unpack_hash('crc', key) for key in self.crc}
@@ -0,0 +1,96 @@
+"""In-memory cache of the hashes indexes of parent dats, shared by every dedupe of a run."""
+import logging
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from threading import Lock
+
+from datoso.configuration import config
+from datoso.helpers.file_utils import file_fingerprint
+from datoso.repositories.hashes_index import HashesIndex
+
+logger = logging.getLogger(__name__)
+
+
+class IndexCache:
+    """LRU cache of the hashes indexes of parent dats, so a parent shared by many children is read once.
+
+    An index is keyed by its parent (`seed:name`, or the path of the file) and the fingerprint of the
+    parent file, a parent that changed (e.g. automerged) is read again. The least recently used indexes
+    are evicted when their size grows over CACHE.ParentIndexMaxSize. Cached indexes are shared, they must
+    not be modified.
+    """
+
+    def __init__(self, max_size: int | None = None) -> None:
+        """Initialize the cache, max_size in bytes."""
+        self._max_size = max_size
+        self._indexes = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    @property
+    def max_size(self) -> int:
+        """Maximum size of the cached indexes in bytes."""
+        if self._max_size is not None:
+            return self._max_size
+        return int(config.get('CACHE', 'ParentIndexMaxSize', fallback=512)) * 1024 * 1024
+
+    @staticmethod
+    def key(file: str | Path, seed: str | None = None, name: str | None = None) -> str:
+        """Get the key of a parent, its `seed:name` if it is in the database or the path of its file."""
+        return f'{seed}:{name}' if seed and name else str(Path(file).resolve())
+
+    def get(self, key: str, file: str | Path | None, build: Callable[[], HashesIndex]) -> HashesIndex:
+        """Get the index of a parent, building it with build if it is not cached or its file changed."""
+        try:
+            fingerprint = file_fingerprint(file) if file else None
+        except OSError:
+            fingerprint = None
+        if fingerprint is None:
+            return build()
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached and cached[0] == fingerprint:
+                self._indexes.move_to_end(key)
+                return cached[1]
+        shas = build()
+        self.put(key, fingerprint, shas)
+        return shas
+
+    def put(self, key: str, fingerprint: tuple, shas: HashesIndex) -> None:
+        """Store the index of a parent, evicting the least recently used ones if needed."""
+        size = shas.memory_size()
+        max_size = self.max_size
+        with self._lock:
+            self._discard(key)
+            if size > max_size:
+                logger.debug('Index of %s is too big to be cached (%i bytes)', key, size)
+                return
+            self._indexes[key] = (fingerprint, shas, size)
+            self._size += size
+            while self._size > max_size:
+                self._discard(next(iter(self._indexes)))
+
+    def _discard(self, key: str) -> None:
+        """Remove an index."""
+        cached = self._indexes.pop(key, None)
+        if cached:
+            self._size -= cached[2]
+
+    def __len__(self) -> int:
+        """Get the number of cached indexes."""
+        return len(self._indexes)
+
+    @property
+    def size(self) -> int:
+        """Get the size of the cached indexes in bytes."""
+        return self._size
+
+    def clear(self) -> None:
+        """Remove every cached index."""
+        with self._lock:
+            self._indexes.clear()
+            self._size = 0
+
+
+index_cache = IndexCache()
@@ -0,0 +1,103 @@
+"""Compact records for the roms and games of a parsed dat."""
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class AttributesView(Mapping):
+    """Read-only view of a parsed element with the '@' prefix of its attributes removed.
+
+    Keys are resolved on access against the original dict, nothing is copied.
+    """
+
+    __slots__ = ('_source',)
+
+    def __init__(self, source: dict | None) -> None:
+        """Initialize the view."""
+        self._source = source or {}
+
+    def __getitem__(self, key: str) -> Any:  # noqa: ANN401
+        """Get an attribute, or a child element if there is no attribute with that name."""
+        if f'@{key}' in self._source:
+            return self._source[f'@{key}']
+        return self._source[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys without prefix."""
+        return (key.removeprefix('@') for key in self._source)
+
+    def __len__(self) -> int:
+        """Return the number of keys."""
+        return len(self._source)
+
+
+@dataclass(slots=True)
+class RomRecord:
+    """A rom, only its name, size and hashes are stored.
+
+    `source` is the parsed dict the record was built from (if kept), see `attributes`.
+    """
+
+    name: str | None = None
+    size: str | None = None
+    crc: str | None = None
+    md5: str | None = None
+    sha1: str | None = None
+    sha256: str | None = None
+    source: dict | None = field(default=None, repr=False, compare=False)
+
+    hash_fields = ('sha256', 'sha1', 'md5', 'crc')
+
+    @classmethod
+    def from_dict(cls, rom: dict, *, keep_source: bool = True) -> 'RomRecord':
+        """Create a record from a parsed rom, with or without the '@' prefix on its keys."""
+        if isinstance(rom, RomRecord):
+            return rom
+        def get(key: str) -> str | None:
+            value = rom.get(f'@{key}', rom.get(key))
+            return value or None
+        return cls(get('name'), get('size'), get('crc'), get('md5'), get('sha1'), get('sha256'),
+                   rom if keep_source else None)
+
+    @property
+    def attributes(self) -> AttributesView:
+        """All the original attributes of the rom."""
+        return AttributesView(self.source)
+
+    def __getitem__(self, key: str) -> Any:  # noqa: ANN401
+        """Get a field, or an original attribute, by name."""
+        if key in self.__slots__ and key != 'source':
+            return getattr(self, key)
+        return self.attributes[key]
+
+    def get(self, key: str, default: Any = None) -> Any:  # noqa: ANN401
+        """Get a field, or an original attribute, by name."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+@dataclass(slots=True)
+class GameRecord:
+    """A game and its rom records."""
+
+    name: str | None = None
+    roms: tuple[RomRecord, ...] = ()
+    source: dict | None = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, game: dict, *, keep_source: bool = True) -> 'GameRecord':
+        """Create a record from a parsed game."""
+        roms = game.get('rom') or []
+        roms = roms if isinstance(roms, list) else [roms]
+        return cls(
+            game.get('@name', game.get('name')),
+            tuple(RomRecord.from_dict(rom, keep_source=keep_source) for rom in roms if isinstance(rom, dict)),
+            game if keep_source else None,
+        )
+
+    @property
+    def attributes(self) -> AttributesView:
+        """All the original attributes of the game."""
+        return AttributesView(self.source)
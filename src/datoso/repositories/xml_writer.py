@@ -0,0 +1,115 @@
+"""Streaming writer for XML dats."""
+from typing import IO, Any
+from xml.sax.saxutils import XMLGenerator
+
+
+def to_string(value: Any) -> str:  # noqa: ANN401
+    """Convert a value to its text in the XML document."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, bytes | bytearray | memoryview):
+        return bytes(value).decode('utf-8', errors='replace')
+    return str(value)
+
+
+class XMLWriter:
+    """Write a dict tree (as built by xmltodict.parse) to a file, one element at a time.
+
+    The pretty output is the same as `xmltodict.unparse(data, pretty=True)`, and the compact
+    output is the same as `xmltodict.unparse(data)`, but the document is never held in memory,
+    the root is opened with `start`, its children are written with `write` and it is closed
+    with `end`.
+    """
+
+    attr_prefix = '@'
+    cdata_key = '#text'
+    comment_key = '#comment'
+
+    def __init__(self, output: IO[str], *, pretty: bool = True, newl: str = '\n', indent: str = '\t') -> None:
+        """Initialize the writer."""
+        self.output = output
+        self.pretty = pretty
+        self.newl = newl
+        self.indent = indent
+        self.generator = XMLGenerator(output, 'utf-8', short_empty_elements=False)
+        self.root = None
+        self.root_has_children = False
+
+    def start(self, key: str, attributes: dict | None = None) -> None:
+        """Start the document and open the root element."""
+        self.generator.startDocument()
+        self.root = key
+        self.generator.startElement(key, self._attributes(attributes or {}))
+
+    def write(self, key: str, value: Any) -> None:  # noqa: ANN401
+        """Write a child (or a list of children) of the root element."""
+        if self.pretty and not self.root_has_children:
+            self.generator.ignorableWhitespace(self.newl)
+        self.root_has_children = True
+        self._emit(key, value, depth=1)
+
+    def write_all(self, node: dict) -> None:
+        """Write all the children of a node to the root element."""
+        for key, value in node.items():
+            if not key.startswith(self.attr_prefix) and key != self.cdata_key:
+                self.write(key, value)
+
+    def end(self) -> None:
+        """Close the root element and end the document."""
+        self.generator.endElement(self.root)
+        self.generator.endDocument()
+
+    def _attributes(self, node: dict) -> dict:
+        """Get the attributes of a node, without prefix."""
+        return {
+            key[len(self.attr_prefix):]: '' if value is None else to_string(value)
+            for key, value in node.items()
+            if key.startswith(self.attr_prefix)
+        }
+
+    def _emit_comment(self, value: Any, depth: int) -> None:  # noqa: ANN401
+        """Write a comment."""
+        for comment in value if isinstance(value, list) else [value]:
+            text = to_string(comment) if comment is not None else ''
+            if not text:
+                continue
+            if self.pretty:
+                self.generator.ignorableWhitespace(depth * self.indent)
+            self.output.write(f'<!--{text}-->')
+            if self.pretty:
+                self.generator.ignorableWhitespace(self.newl)
+
+    def _emit(self, key: str, value: Any, depth: int) -> None:  # noqa: ANN401
+        """Write an element, recursively."""
+        if key == self.comment_key:
+            self._emit_comment(value, depth)
+            return
+        if not isinstance(value, list | tuple) and not hasattr(value, '__next__'):
+            value = [value]
+        generator = self.generator
+        for item in value:
+            node = {} if item is None else item
+            if not isinstance(node, dict):
+                node = {self.cdata_key: to_string(node)}
+            cdata = node.get(self.cdata_key)
+            children = [
+                (child_key, child_value) for child_key, child_value in node.items()
+                if child_key != self.cdata_key and not child_key.startswith(self.attr_prefix)
+                and not (isinstance(child_value, list) and not child_value)
+            ]
+            if self.pretty:
+                generator.ignorableWhitespace(depth * self.indent)
+            generator.startElement(key, self._attributes(node))
+            if self.pretty and children:
+                generator.ignorableWhitespace(self.newl)
+            for child_key, child_value in children:
+                self._emit(child_key, child_value, depth + 1)
+            if cdata is not None:
+                generator.characters(to_string(cdata))
+            if self.pretty and children:
+                generator.ignorableWhitespace(depth * self.indent)
+            generator.endElement(key)
+            if self.pretty:
+                generator.ignorableWhitespace(self.newl)
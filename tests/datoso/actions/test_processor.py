@@ -7,17 +7,25 @@ src_path = project_root_for_imports / "src"
 if str(src_path) not in sys.path:
     sys.path.insert(0, str(src_path))
 
+import tempfile
 import time
 import unittest
 from unittest import mock
 
 import datoso.actions.processor
-from datoso.actions.processor import Processor, Process, LoadDatFile, DeleteOld, Copy, SaveToDatabase, MarkMias, AutoMerge, Deduplicate
+from datoso.actions.context import DatContext
+from datoso.actions.processor import ActionRegistry, Processor, PipelinePlan, action_registry, Process, LoadDatFile, DeleteOld, Copy, SaveToDatabase, MarkMias, AutoMerge, Deduplicate, TransformPass
 from datoso.configuration import config as datoso_config
 from datoso.configuration import logger as datoso_logger
 from datoso.database.models.dat import Dat as DatModel # Actual Dat model for type hinting if needed
 from datoso.repositories.dat_file import DatFile as DatFileRepo # Actual DatFile for type hinting
 from datoso.repositories.dedupe import Dedupe as DedupeClass # Actual Dedupe class for mocking
+from datoso.repositories.dedupe import get_dat_file
+from datoso.repositories.dat_file import XMLDatFile
+
+import xmltodict
+
+from tests.datoso.repositories.test_dat_file import SHA_1, XML_DAT, XML_DB_EXPORT, TestDatFileBase
 
 # Mock classes for dependencies
 class MockDatFile(DatFileRepo): # Inherit to satisfy type checks if any, but override methods
@@ -147,22 +155,15 @@ class MockActionUpdateData(Process):
             self._database_dat.name = "updated_db.dat"
         return "MockActionUpdateData: Data Updated"
 
-# Using a dictionary for patching globals in Processor tests
-_mock_actions_for_globals_patch = {
-    'MockActionSuccess': MockActionSuccess,
-    'MockActionStop': MockActionStop,
-    'MockActionUpdateData': MockActionUpdateData,
-    'DatFile': MockDatFile, # For Process base class if it tries to instantiate
-    'Dat': MockDatDB        # For Process base class
-}
 
 
 class TestProcessorClass(unittest.TestCase):
     def setUp(self):
         self.default_seed = "proc_seed"
-        self.patcher = mock.patch.dict(datoso.actions.processor.__dict__,
-                                       _mock_actions_for_globals_patch,
-                                       clear=True)
+        # The mock actions are registered when they are defined, as every Process subclass
+        self.patcher = mock.patch.multiple(datoso.actions.processor,
+                                           DatFile=MockDatFile, # For Process base class if it tries to instantiate
+                                           Dat=MockDatDB)       # For Process base class
         self.mocked_globals = self.patcher.start()
 
     def tearDown(self):
@@ -437,6 +438,14 @@ class TestDeleteOldAction(unittest.TestCase):
         self.assertTrue(action.stop)
         mock_compare_dates.assert_called_once_with(self.db_dat.date, self.file_dat.date)
 
+    @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
+    def test_newer_in_database_prefers_normalized_dates(self, mock_compare_dates):
+        action = self._create_action()
+        database_data = {'date': '01-01-2023', 'sort_date': '2023-01-01 00:00:00'}
+        with mock.patch.object(MockDatDB, 'to_dict', return_value=database_data):
+            self.assertFalse(action.newer_in_database())
+        mock_compare_dates.assert_called_once_with('2023-01-01 00:00:00', self.file_dat.date)
+
     @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
     def test_process_no_new_file_in_db(self, mock_compare_dates):
         self.db_dat.new_file = None
@@ -458,9 +467,10 @@ class TestDeleteOldAction(unittest.TestCase):
         mock_getboolean.assert_called_once_with('PROCESS', 'Overwrite', fallback=False)
 
     @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
+    @mock.patch('datoso.actions.processor.unindex_dat')
     @mock.patch('datoso.actions.processor.remove_path') # Mock remove_path
     @mock.patch('pathlib.Path.mkdir') # Mock mkdir
-    def test_process_dat_disabled(self, mock_mkdir, mock_remove_path, mock_compare_dates):
+    def test_process_dat_disabled(self, mock_mkdir, mock_remove_path, mock_unindex_dat, mock_compare_dates):
         self.db_dat.enabled = False
         action = self._create_action()
         result = action.process()
@@ -468,6 +478,7 @@ class TestDeleteOldAction(unittest.TestCase):
         self.assertTrue(action.stop)
         self.assertIsNone(action._database_dat.new_file)
         mock_remove_path.assert_called_once_with(Path(self.db_dat_path_str), remove_empty_parent=True)
+        mock_unindex_dat.assert_called_once_with("del_seed", "file.dat")
         action._database_dat.save.assert_called_once()
         action._database_dat.flush.assert_called_once()
 
@@ -554,7 +565,8 @@ class TestCopyAction(unittest.TestCase):
         action.load_database_dat = mock.Mock(return_value=None)  # Simulate no database dat loaded
         result = action.process()
         self.assertEqual(result, "Copied")
-        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination)
+        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination,
+                                               mode=mock.ANY, skip_identical=mock.ANY)
 
     @mock.patch('datoso.actions.processor.copy_path')
     @mock.patch('pathlib.Path.mkdir')
@@ -600,7 +612,8 @@ class TestCopyAction(unittest.TestCase):
         action = self._create_action()
         result = action.process()
         self.assertEqual(result, "Created")
-        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination)
+        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination,
+                                               mode=mock.ANY, skip_identical=mock.ANY)
         self.assertEqual(str(action.database_dat.new_file), str(self.expected_destination))
 
     @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
@@ -611,7 +624,8 @@ class TestCopyAction(unittest.TestCase):
         action = self._create_action()
         result = action.process()
         self.assertEqual(result, "Updated")
-        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination)
+        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination,
+                                               mode=mock.ANY, skip_identical=mock.ANY)
         self.assertEqual(str(action.database_dat.new_file), str(self.expected_destination))
 
     @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
@@ -624,10 +638,24 @@ class TestCopyAction(unittest.TestCase):
         action = self._create_action()
         result = action.process()
         self.assertEqual(result, "Overwritten")
-        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination)
+        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination,
+                                               mode=mock.ANY, skip_identical=mock.ANY)
         self.assertEqual(str(action.database_dat.new_file), str(self.expected_destination))
         mock_getboolean.assert_any_call('PROCESS', 'Overwrite', fallback=False)
 
+    @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
+    @mock.patch('datoso.configuration.config.getboolean', return_value=False)
+    @mock.patch('pathlib.Path.exists', return_value=True)
+    @mock.patch('datoso.actions.processor.copy_path')
+    @mock.patch('pathlib.Path.mkdir')
+    def test_process_overwrite_forced_for_the_dat(self, mock_mkdir, mock_copy_path, mock_path_exists, mock_getboolean, mock_compare_dates):
+        self.db_dat.new_file = str(self.expected_destination)
+        action = self._create_action()
+        action.overwrite = True
+        self.assertEqual(action.process(), "Overwritten")
+        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination,
+                                               mode=mock.ANY, skip_identical=mock.ANY)
+
     @mock.patch('datoso.actions.processor.compare_dates', return_value=False)
     @mock.patch('pathlib.Path.exists', return_value=False)
     @mock.patch('datoso.actions.processor.copy_path')
@@ -637,7 +665,8 @@ class TestCopyAction(unittest.TestCase):
         action = self._create_action()
         result = action.process()
         self.assertEqual(result, "Updated")
-        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination)
+        mock_copy_path.assert_called_once_with(self.source_file_path, self.expected_destination,
+                                               mode=mock.ANY, skip_identical=mock.ANY)
         self.assertEqual(str(action.database_dat.new_file), str(self.expected_destination))
 
     def test_destination_logic(self):
@@ -645,6 +674,8 @@ class TestCopyAction(unittest.TestCase):
         self.assertEqual(action.destination(), self.expected_destination)
         action.file_dat.path = "/abs/path" # file_dat.path is string
         action.file_dat.file = Path(action.file_dat.path) / action.file_dat.name # Update file_dat.file to match
+        self.assertEqual(action.destination(), self.expected_destination) # Computed once per dat
+        action.context.invalidate() # Until the dat is changed explicitly
         self.assertEqual(action.destination(), Path("/abs/path"))
 
         action.file_dat.path = "system/game" # Reset
@@ -653,6 +684,7 @@ class TestCopyAction(unittest.TestCase):
         with mock.patch('datoso.helpers.file_utils.get_ext', return_value='.zip'):
             action.file_dat.file = Path("source/downloads/new_archive.zip")
             action.file_dat.name = "new_archive" # Name without extension
+            action.context.invalidate()
             self.assertEqual(action.destination(), Path(self.action_folder) / "system/game" / "new_archive")
 
 
@@ -694,6 +726,24 @@ class TestSaveToDatabaseAction(unittest.TestCase):
         expected_instance.flush.assert_called_once()
         self.assertIs(action._database_dat, expected_instance)
 
+    @mock.patch('datoso.actions.processor.index_dat')
+    @mock.patch('datoso.actions.processor.rom_index')
+    def test_indexed_dat_is_not_parsed_again(self, mock_rom_index, mock_index_dat):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            new_file = Path(temp_dir) / "current.dat"
+            new_file.write_text("dat")
+            instance = MockDatDB(name="db_dat_name", new_file=str(new_file), seed=self.default_seed)
+            action = SaveToDatabase(name="TestSave", seed=self.default_seed)
+            action._file_dat = mock.MagicMock()
+            mock_rom_index.is_indexed.return_value = True
+            action.update_rom_index(instance)
+            mock_rom_index.is_indexed.assert_called_once_with(self.default_seed, "db_dat_name", str(new_file))
+            action._file_dat.iter_game_records.assert_not_called()
+            mock_index_dat.assert_not_called()
+            mock_rom_index.is_indexed.return_value = False
+            action.update_rom_index(instance)
+            mock_index_dat.assert_called_once()
+
 
 class TestMarkMiasAction(unittest.TestCase):
     def setUp(self):
@@ -702,33 +752,45 @@ class TestMarkMiasAction(unittest.TestCase):
         self.db_dat_no_file = MockDatDB(new_file=None, name="DatNoFile", seed=self.default_seed)
 
     @mock.patch('datoso.configuration.config.getboolean', return_value=False)
-    @mock.patch('datoso.actions.processor.mark_mias') # Patch where mark_mias is looked up
-    def test_process_skipped_if_config_false(self, mock_mark_mias_func, mock_getboolean):
+    @mock.patch('datoso.actions.processor.get_dat_file')
+    def test_process_skipped_if_config_false(self, mock_get_dat_file, mock_getboolean):
         action = MarkMias(name="TestMIA", seed=self.default_seed)
         action._database_dat = self.db_dat_with_file
         result = action.process()
         self.assertEqual(result, "Skipped")
         mock_getboolean.assert_called_once_with('PROCESS', 'ProcessMissingInAction', fallback=False)
-        mock_mark_mias_func.assert_not_called()
+        mock_get_dat_file.assert_not_called()
 
     @mock.patch('datoso.configuration.config.getboolean', return_value=True)
-    @mock.patch('datoso.actions.processor.mark_mias') # Patch where mark_mias is looked up
-    def test_process_calls_mark_mias_if_config_true(self, mock_mark_mias_func, mock_getboolean):
+    @mock.patch('datoso.actions.processor.index_dat')
+    @mock.patch('datoso.actions.processor.get_mias', return_value={"mia": {}})
+    @mock.patch('datoso.actions.processor.get_dat_file')
+    def test_process_marks_saves_and_indexes_the_dat(self, mock_get_dat_file, mock_get_mias, mock_index_dat,
+                                                     mock_getboolean):
+        dat = mock_get_dat_file.return_value
         action = MarkMias(name="TestMIA", seed=self.default_seed)
         action._database_dat = self.db_dat_with_file
         result = action.process()
         self.assertEqual(result, "Marked")
         mock_getboolean.assert_called_once_with('PROCESS', 'ProcessMissingInAction', fallback=False)
-        mock_mark_mias_func.assert_called_once_with(dat_file=self.db_dat_with_file.new_file)
+        mock_get_dat_file.assert_called_once_with(self.db_dat_with_file.new_file)
+        dat.mark_mias.assert_called_once_with({"mia": {}})
+        dat.save.assert_called_once_with()
+        mock_index_dat.assert_called_once_with(self.default_seed, "DatWithFile", dat.file,
+                                               dat.iter_game_records.return_value)
+        dat.close.assert_called_once_with()
 
     @mock.patch('datoso.configuration.config.getboolean', return_value=True)
-    @mock.patch('datoso.actions.processor.mark_mias') # Patch where mark_mias is looked up
-    def test_process_handles_db_dat_new_file_none(self, mock_mark_mias_func, mock_getboolean):
+    @mock.patch('datoso.actions.processor.index_dat')
+    @mock.patch('datoso.actions.processor.get_mias', return_value={})
+    @mock.patch('datoso.actions.processor.get_dat_file')
+    def test_process_handles_db_dat_new_file_none(self, mock_get_dat_file, mock_get_mias, mock_index_dat,
+                                                  mock_getboolean):
         action = MarkMias(name="TestMIA", seed=self.default_seed)
         action._database_dat = self.db_dat_no_file
         result = action.process()
         self.assertEqual(result, "Marked")
-        mock_mark_mias_func.assert_called_once_with(dat_file=None)
+        mock_get_dat_file.assert_called_once_with(None)
 
 
 @mock.patch('datoso.actions.processor.Dedupe', spec=DedupeClass)
@@ -824,6 +886,149 @@ class TestDeduplicateAction(unittest.TestCase):
         mock_dedupe_instance.dedupe.assert_called_once()
         mock_dedupe_instance.save.assert_called_once()
 
+class TestTransformPass(TestDatFileBase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('datoso.actions.processor.index_dat')
+        self.mock_index_dat = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_consecutive_transforms_are_fused(self):
+        child = self.write_dat("child.xml", XML_DAT)
+        parent = self.write_dat("parent.xml", XML_DB_EXPORT)
+        database_dat = MockDatDB(name="Child", seed="fused_seed", new_file=child, automerge=True, parent=str(parent))
+        actions = [{"action": "MarkMias"}, {"action": "AutoMerge"}, {"action": "Deduplicate"}]
+        processor = Processor(actions=actions, file=child, seed="fused_seed", _database_dat=database_dat,
+                              _file_dat=MockDatFile(file=child))
+        self.assertEqual([len(step) for step in processor.steps()], [3])
+        with mock.patch('datoso.actions.processor.get_dat_file', side_effect=get_dat_file) as mock_get_dat_file, \
+                mock.patch.object(XMLDatFile, 'save', autospec=True, side_effect=XMLDatFile.save) as mock_save, \
+                mock.patch.object(MarkMias, 'enabled', return_value=False):
+            results = list(processor.process())
+        self.assertEqual(results, ["Skipped", "Automerged", "Deduped"])
+        mock_get_dat_file.assert_called_once_with(child)
+        mock_save.assert_called_once()
+        saved = xmltodict.parse(child.read_text(encoding="utf-8"))
+        self.assertNotIn("dir", saved["datafile"])
+        self.assertEqual(saved["datafile"]["game"]["@name"], "Beta (USA)")
+        self.assertEqual(saved["datafile"]["game"]["rom"]["@name"], "Beta (USA) (Extra).gb")
+        self.mock_index_dat.assert_called_once()
+
+    def test_unchanged_dat_is_not_saved(self):
+        child = self.write_dat("child.xml", XML_DAT)
+        content = child.read_text(encoding="utf-8")
+        parent = self.write_dat("parent.xml", XML_DB_EXPORT.replace(SHA_1, "f" * 40).replace("AAAA0001", "FFFF0001"))
+        database_dat = MockDatDB(name="Child", seed="fused_seed", new_file=child, automerge=False, parent=str(parent))
+        processes = [AutoMerge(_database_dat=database_dat), Deduplicate(_database_dat=database_dat)]
+        self.assertEqual(TransformPass(processes).process(), ["Skipped", "Skipped"])
+        self.assertEqual(child.read_text(encoding="utf-8"), content)
+        self.mock_index_dat.assert_not_called()
+
+    def test_error_is_reported_for_every_enabled_transform(self):
+        child = self.write_dat("child.xml", XML_DAT)
+        content = child.read_text(encoding="utf-8")
+        database_dat = MockDatDB(name="Child", seed="fused_seed", new_file=child, automerge=True, parent="missing.xml")
+        processes = [MarkMias(_database_dat=database_dat), AutoMerge(_database_dat=database_dat),
+                     Deduplicate(_database_dat=database_dat)]
+        with mock.patch.object(MarkMias, 'enabled', return_value=False), \
+                mock.patch.object(Deduplicate, 'transform', side_effect=ValueError("broken parent")), \
+                mock.patch.object(datoso_logger, 'exception'):
+            self.assertEqual(TransformPass(processes).process(), ["Skipped", "Error", "Error"])
+        self.assertEqual(child.read_text(encoding="utf-8"), content)
+        self.mock_index_dat.assert_not_called()
+
+    def test_mark_mias_alone_indexes_the_marked_dat(self):
+        child = self.write_dat("child.xml", XML_DAT)
+        database_dat = MockDatDB(name="Child", seed="mia_seed", new_file=child)
+        with mock.patch.object(MarkMias, 'enabled', return_value=True), \
+                mock.patch('datoso.actions.processor.get_mias', return_value={SHA_1: {}}):
+            self.assertEqual(MarkMias(_database_dat=database_dat).process(), "Marked")
+        self.assertIn('mia="yes"', child.read_text(encoding="utf-8"))
+        self.mock_index_dat.assert_called_once()
+        seed, name, file, records = self.mock_index_dat.call_args.args
+        self.assertEqual((seed, name, Path(file)), ("mia_seed", "Child", child))
+        self.assertTrue(list(records))
+
+    def test_single_transform_is_not_fused(self):
+        processor = Processor(actions=[{"action": "LoadDatFile"}, {"action": "AutoMerge"}, {"action": "Copy"}])
+        self.assertEqual([len(step) for step in processor.steps()], [1, 1, 1])
+
+
+class TestPipelinePlan(unittest.TestCase):
+    def test_actions_are_registered(self):
+        self.assertIs(action_registry.get("Copy"), Copy)
+        self.assertIs(action_registry.get("MockActionStop"), MockActionStop)
+        with self.assertRaises(LookupError):
+            action_registry.get("NoSuchAction")
+
+    def test_abstract_actions_are_not_registered(self):
+        self.assertNotIn("Transform", action_registry)
+        self.assertNotIn("Process", action_registry)
+
+    def test_actions_with_the_name_of_another_are_registered_by_full_name(self):
+        registry = ActionRegistry()
+        registry.register(Copy)
+        with mock.patch.object(datoso_logger, "warning") as mock_warning:
+            # registered in the registry of datoso too, where Copy is already the action of datoso
+            plugin_copy = type("Copy", (Copy,), {"__module__": "datoso_seed_fake.actions"})
+            registry.register(plugin_copy)
+        self.assertIs(registry.get("Copy"), Copy)
+        self.assertIs(registry.get("datoso.actions.processor.Copy"), Copy)
+        self.assertIs(registry.get("datoso_seed_fake.actions.Copy"), plugin_copy)
+        self.assertIs(action_registry.get("Copy"), Copy)
+        self.assertEqual(mock_warning.call_count, 2)
+
+    def test_plan_is_compiled_once_with_bound_parameters(self):
+        actions = [{"action": "MockActionSuccess", "name": "Bound"}, {"action": "AutoMerge"}, {"action": "Deduplicate"}]
+        plan = PipelinePlan.compile(actions)
+        self.assertEqual([len(step) for step in plan.steps], [1, 2])
+        actions[0]["name"] = "Changed"
+        process = Processor(file="a.dat", seed="plan_seed", plan=plan).create(plan.steps[0][0])
+        self.assertIsInstance(process, MockActionSuccess)
+        self.assertEqual((process.name, process.file, process.seed), ("Bound", "a.dat", "plan_seed"))
+        for file in ("a.dat", "b.dat"):
+            processor = Processor(file=file, seed="plan_seed", plan=plan)
+            self.assertIs(processor.plan, plan)
+
+
+class TestDatContext(unittest.TestCase):
+    def test_file_data_is_computed_once_and_shared(self):
+        file_dat = MockDatFile(file="ctx/file.dat", seed="ctx_seed")
+        context = DatContext(file_dat=file_dat)
+        first = Copy(context=context, folder="out")
+        second = DeleteOld(context=context, folder="out")
+        with mock.patch.object(file_dat, 'dict', wraps=file_dat.dict) as spy_dict:
+            self.assertEqual(first.file_data, second.file_data)
+            first.destination()
+            second.destination()
+        spy_dict.assert_called_once()
+
+    def test_replacing_or_invalidating_recomputes(self):
+        file_dat = MockDatFile(file="ctx/file.dat", seed="ctx_seed")
+        action = Copy(_file_dat=file_dat, folder="out")
+        self.assertEqual(action.file_data["date"], "2023-01-15")
+        file_dat.date = "2024-01-01"
+        self.assertEqual(action.file_data["date"], "2023-01-15")
+        action.context.invalidate()
+        self.assertEqual(action.file_data["date"], "2024-01-01")
+        action._file_dat = MockDatFile(file="ctx/other.dat", seed="ctx_seed", date="2025-01-01")
+        self.assertEqual(action.file_data["date"], "2025-01-01")
+
+    def test_processor_actions_share_the_context(self):
+        processor = Processor(actions=[{"action": "MockActionSuccess"}, {"action": "MockActionUpdateData"}],
+                              file="ctx.dat", seed="ctx_seed")
+        processes = []
+        create = processor.create
+        def spy_create(action):
+            processes.append(create(action))
+            return processes[-1]
+        with mock.patch.object(processor, 'create', side_effect=spy_create):
+            list(processor.process())
+        self.assertEqual(len(processes), 2)
+        self.assertTrue(all(process.context is processor.context for process in processes))
+        self.assertEqual(processor._file_dat.name, "updated_file.dat")
+
+
 # The duplicate classes were here. Removing them by ending the file contents above.
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,7 @@ import argparse # For creating mock args
 import sys
 from pathlib import Path
 import logging
+import tempfile
 
 from datoso.helpers import Bcolors # For logger levels
 
@@ -31,8 +32,11 @@ from datoso.commands.commands import (
     command_config,
     command_list, # Seems duplicative of command_seed_installed
     command_doctor,
-    command_log
+    command_log,
+    command_cache,
+    command_database,
 )
+from datoso.database import UnitOfWork
 # Import classes/objects that are dependencies and will need mocking
 # from datoso.configuration import config as datoso_config # Already mocked in TestCommandsBase
 # from datoso.configuration import logger as datoso_logger # Already mocked in TestCommandsBase
@@ -140,6 +144,16 @@ class TestCommandDeduper(TestCommandsBase):
 
 class TestCommandImport(TestCommandsBase):
 
+    def setUp(self):
+        super().setUp()
+        # the batched writes of the import are journaled, keep the journal off the user config
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        uow_patcher = mock.patch('datoso.database.models.dat.unit_of_work',
+                                 UnitOfWork(str(Path(tmp_dir.name) / 'datoso.json')))
+        uow_patcher.start()
+        self.addCleanup(uow_patcher.stop)
+
     @mock.patch('datoso.commands.commands.Path')
     @mock.patch('datoso.commands.commands.Rules')
     @mock.patch('datoso.commands.commands.detect_seed')
@@ -279,6 +293,45 @@ class TestCommandImport(TestCommandsBase):
         # Verify that Dat model was saved for file1
         mock_DatModel_constructor.assert_called_once_with(name="file1", seed="seed1", new_file=str(mock_file1))
 
+class TestCommandCache(TestCommandsBase):
+    @mock.patch('builtins.print')
+    @mock.patch('datoso.commands.commands.dat_cache')
+    def test_cache_clear(self, mock_dat_cache, mock_print):
+        self.mock_args.clear = True
+        mock_dat_cache.clear.return_value = 3
+        command_cache(self.mock_args)
+        mock_dat_cache.clear.assert_called_once_with()
+        self.assertIn('3', mock_print.call_args[0][0])
+
+    @mock.patch('builtins.print')
+    @mock.patch('datoso.commands.commands.dat_cache')
+    def test_cache_list(self, mock_dat_cache, mock_print):
+        self.mock_args.clear = False
+        self.mock_args.list = True
+        stat = mock.Mock(st_size=1024 * 1024)
+        mock_dat_cache.entries.return_value = [
+            (Path('a.pickle'), stat, {'dat_class': 'XMLDatFile', 'source': '/dats/a.dat'}),
+        ]
+        mock_dat_cache.files.return_value = [(Path('a.pickle'), stat)]
+        mock_dat_cache.is_fresh.return_value = True
+        mock_dat_cache.max_size = 256 * 1024 * 1024
+        command_cache(self.mock_args)
+        output = '\n'.join(call[0][0] for call in mock_print.call_args_list)
+        self.assertIn('/dats/a.dat', output)
+        self.assertIn('fresh', output)
+        self.assertIn('Cached dats: 1', output)
+
+class TestCommandDatabase(TestCommandsBase):
+    @mock.patch('builtins.print')
+    @mock.patch('datoso.commands.commands.migrate_to_sqlite', return_value={'dats': 2, 'systems': 1})
+    def test_database_migrate(self, mock_migrate, mock_print):
+        self.mock_args.migrate = True
+        command_database(self.mock_args)
+        mock_migrate.assert_called_once_with()
+        output = '\n'.join(call[0][0] for call in mock_print.call_args_list)
+        self.assertIn('3', output)
+        self.assertIn('dats: 2', output)
+
 class TestCommandDat(TestCommandsBase):
     @mock.patch('datoso.commands.commands.helper_command_dat')
     def test_command_dat_calls_helper(self, mock_helper_command_dat):
@@ -514,6 +567,7 @@ class TestCommandSeed(TestCommandsBase):
         self.mock_args.process = True
         self.mock_args.filter = "somefilter"
         self.mock_args.actions = ["action1", "action2"]
+        self.mock_args.jobs = 4
 
         mock_seed_instance = mock_Seed_class.return_value
         mock_seed_instance.process_dats.return_value = None # Successful process returns None or 0
@@ -523,7 +577,8 @@ class TestCommandSeed(TestCommandsBase):
 
         mock_command_seed_parse_actions.assert_called_once_with(self.mock_args)
         mock_Seed_class.assert_called_once_with(name="myseed")
-        mock_seed_instance.process_dats.assert_called_once_with(fltr="somefilter", actions_to_execute=["action1", "action2"])
+        mock_seed_instance.process_dats.assert_called_once_with(fltr="somefilter", actions_to_execute=["action1", "action2"],
+                                                            jobs=4)
         mock_command_doctor.assert_not_called()
         mock_sys_exit.assert_not_called()
         self.assertTrue(any("Finished processing" in args[0] and "myseed" in args[0] for args, _ in mock_print.call_args_list))
@@ -539,6 +594,8 @@ class TestCommandSeed(TestCommandsBase):
         self.mock_args.process = True
         self.mock_args.filter = None
         self.mock_args.actions = None # No specific actions
+        self.mock_args.jobs = None # Taken from config
+        self.mock_config.getint.return_value = 1
 
         mock_seed_instance = mock_Seed_class.return_value
         mock_seed_instance.process_dats.return_value = 1 # Error process returns non-zero
@@ -548,7 +605,7 @@ class TestCommandSeed(TestCommandsBase):
 
         mock_command_seed_parse_actions.assert_called_once_with(self.mock_args)
         mock_Seed_class.assert_called_once_with(name="myseed")
-        mock_seed_instance.process_dats.assert_called_once_with(fltr=None, actions_to_execute=None)
+        mock_seed_instance.process_dats.assert_called_once_with(fltr=None, actions_to_execute=None, jobs=1)
         self.assertTrue(any("Errors processing" in args[0] and "myseed" in args[0] for args, _ in mock_print.call_args_list))
         mock_command_doctor.assert_called_once_with(self.mock_args)
         mock_sys_exit.assert_called_once_with(1)
@@ -0,0 +1,445 @@
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from tinydb import Query, TinyDB
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import MemoryStorage
+
+from datoso.actions.processor import PipelinePlan
+from datoso.commands.helpers import seed as seed_helpers
+from datoso.commands.seed import Seed
+from datoso.configuration import config
+from datoso.database import DatabaseSingleton, Journal, UnitOfWork, journal
+from datoso.database.rom_index import rom_index
+from datoso.helpers.file_utils import content_hash
+from datoso.repositories.dat_file import XMLDatFile
+
+
+class FakeProcessor:
+    """ Saves a record and returns a status per file, the status of 'broken' files is an error. """
+    def __init__(self, seed, file, plan, overwrite=False):
+        self.seed = seed
+        self.file = file
+        self.overwrite = overwrite
+
+    def process(self):
+        if 'broken' in self.file.name:
+            return ['Error']
+        journal.record('Dat', {'name': self.file.stem, 'seed': self.seed})
+        return ['Updated']
+
+
+class TestJournal(unittest.TestCase):
+    def test_records_only_while_active(self):
+        log = Journal()
+        log.record('Dat', {'name': 'a'})
+        self.assertEqual(log.drain(), [])
+        log.active = True
+        log.record('Dat', {'name': 'a'})
+        self.assertEqual(log.drain(), [('Dat', {'name': 'a'})])
+        self.assertEqual(log.drain(), [])
+
+
+class TestProcessDats(unittest.TestCase):
+    def setUp(self):
+        self.seed = Seed(name='fakeseed')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name)
+        dat_plans = [(self.path, PipelinePlan.compile([{'action': 'LoadDatFile'}]))]
+        patcher = mock.patch.object(Seed, 'dat_plans', return_value=dat_plans)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(Seed, 'source_records', return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('datoso.commands.seed.Processor', FakeProcessor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('datoso.database.models.dat.unit_of_work', UnitOfWork(str(self.path / 'datoso.json')))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_dats(self, *names):
+        for name in names:
+            (self.path / f'{name}.dat').write_text(name)
+
+    def listed_names(self):
+        """ The names of the dats in the order they are processed. """
+        return [file.stem for file, _ in self.seed.dat_tasks(self.seed.dat_plans())]
+
+    def outputs(self, mock_print):
+        return [args[0] for args, _ in mock_print.call_args_list if args and isinstance(args[0], list)]
+
+    @mock.patch('datoso.commands.seed.replay')
+    def test_sequential(self, mock_replay):
+        self.write_dats('first', 'broken', 'third', 'fourth')
+        with mock.patch('builtins.print') as mock_print:
+            self.seed.process_dats(jobs=1)
+        self.assertEqual(self.outputs(mock_print),
+                         [['Error'] if name == 'broken' else ['Updated'] for name in self.listed_names()])
+        mock_replay.assert_not_called()
+
+    @mock.patch('datoso.commands.seed.replay')
+    def test_parallel_keeps_order_and_replays_writes(self, mock_replay):
+        self.write_dats('first', 'broken', 'third', 'fourth')
+        with mock.patch('builtins.print') as mock_print:
+            self.seed.process_dats(jobs=3)
+        names = self.listed_names()
+        self.assertEqual(self.outputs(mock_print), [['Error'] if name == 'broken' else ['Updated'] for name in names])
+        replayed = [call.args[0] for call in mock_replay.call_args_list]
+        self.assertEqual(replayed, [[] if name == 'broken' else [('Dat', {'name': name, 'seed': 'fakeseed'})]
+                                    for name in names])
+        self.assertFalse(journal.active)
+
+    def test_fetch_and_process_dats_as_they_land(self):
+        processed = []
+        landed = threading.Event()
+        def fetch():
+            self.write_dats('first')
+            # the second dat is written once the first one was processed
+            self.assertTrue(landed.wait(5))
+            self.write_dats('second')
+        def process_action(procesor):
+            processed.append(procesor.file.name)
+            landed.set()
+            return ['Updated']
+        # an old dat, that is not processed until the fetch ends
+        self.write_dats('old')
+        os.utime(self.path / 'old.dat', ns=(0, 0))
+        with mock.patch.object(self.seed, 'fetch', side_effect=fetch), \
+                mock.patch.object(self.seed, 'process_action', side_effect=process_action), \
+                mock.patch('datoso.commands.seed.LANDED_INTERVAL', 0.01), \
+                mock.patch('builtins.print'):
+            self.seed.fetch_and_process_dats()
+        self.assertEqual(processed[0], 'first.dat')
+        self.assertEqual(sorted(processed[1:]), ['old.dat', 'second.dat'])
+
+    def test_dat_changed_after_it_was_processed_is_overwritten(self):
+        processed = []
+        landed = threading.Event()
+        def fetch():
+            self.write_dats('first')
+            self.assertTrue(landed.wait(5))
+            # the download of the dat had stalled, it was processed truncated
+            (self.path / 'first.dat').write_text('first, whole')
+        def process_action(procesor):
+            processed.append((procesor.file.name, procesor.overwrite))
+            landed.set()
+            return ['Updated']
+        with mock.patch.object(self.seed, 'fetch', side_effect=fetch), \
+                mock.patch.object(self.seed, 'process_action', side_effect=process_action), \
+                mock.patch.object(self.seed, 'is_unchanged', side_effect=lambda file: bool(processed)), \
+                mock.patch('datoso.commands.seed.LANDED_INTERVAL', 0.01), \
+                mock.patch('builtins.print'):
+            self.seed.fetch_and_process_dats()
+        self.assertEqual(processed, [('first.dat', False), ('first.dat', True)])
+
+    def test_dats_land_when_the_fetch_calls_back(self):
+        processed = []
+        landed = threading.Event()
+        def fetch(callback):
+            # written whole, but only the second dat is signalled
+            self.write_dats('first', 'second')
+            callback(self.path / 'second.dat')
+            self.assertTrue(landed.wait(5))
+        def process_action(procesor):
+            processed.append(procesor.file.name)
+            landed.set()
+            return ['Updated']
+        with mock.patch.object(self.seed, 'signals_landed', return_value=True), \
+                mock.patch.object(self.seed, 'fetch', side_effect=fetch), \
+                mock.patch.object(self.seed, 'process_action', side_effect=process_action), \
+                mock.patch('datoso.commands.seed.LANDED_INTERVAL', 0.01), \
+                mock.patch('builtins.print'):
+            self.seed.fetch_and_process_dats()
+        self.assertEqual(processed, ['second.dat', 'first.dat'])
+
+    @mock.patch('datoso.commands.seed.replay')
+    def test_pool_is_not_forked_while_fetching(self, mock_replay):
+        fetch_threads = []
+        def pool(*args, **kwargs):
+            fetch_threads.extend(thread.name for thread in threading.enumerate()
+                                 if thread.name.startswith('ThreadPoolExecutor'))
+            return ProcessPoolExecutor(*args, **kwargs)
+        with mock.patch.object(self.seed, 'fetch', side_effect=lambda: self.write_dats('first', 'second', 'third')), \
+                mock.patch('datoso.commands.seed.ProcessPoolExecutor', side_effect=pool) as mock_pool, \
+                mock.patch('builtins.print') as mock_print:
+            self.seed.fetch_and_process_dats(jobs=2)
+        mock_pool.assert_called_once()
+        self.assertEqual(fetch_threads, [])
+        self.assertEqual(self.outputs(mock_print), [['Updated']] * 3)
+
+
+def dat(name, date):
+    return f"""<?xml version="1.0"?>
+<datafile>
+	<header>
+		<name>{name}</name>
+		<date>{date}</date>
+	</header>
+	<game name="{name} {date}">
+		<rom name="{name}.bin" size="1" crc="0000000{len(date) % 10}"/>
+	</game>
+</datafile>
+"""
+
+
+class FakeSeedDatFile(XMLDatFile):
+    prefix = 'Fake'
+
+
+class TestParallelMatchesSequential(unittest.TestCase):
+    """ Two sources of the same dat, and a dat processed after its parent, give the same database with any jobs. """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name)
+        self.dats = self.path / 'dats'
+        self.dats.mkdir()
+        (self.dats / 'a_old.dat').write_text(dat('Same', '2023-01-01'))
+        (self.dats / 'b_new.dat').write_text(dat('Same', '2024-01-01'))
+        for name in ('c', 'd', 'e'):
+            (self.dats / f'{name}.dat').write_text(dat(name.upper(), '2024-01-01'))
+        for target, value in (('unit_of_work', UnitOfWork(str(self.path / 'datoso.json'))),
+                              ('config.getboolean', mock.Mock(return_value=False))):
+            patcher = mock.patch(f'datoso.database.models.dat.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(rom_index, 'path', self.path / 'roms.db')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(rom_index.close)
+        self.database = DatabaseSingleton()
+        patcher = mock.patch.object(self.database, 'DB', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def process(self, actions, jobs, records=(), default_actions=False):
+        """ Process the dats in a database with records and an empty dat root, return the saved records. """
+        self.database.DB = TinyDB(storage=CachingMiddleware(MemoryStorage))
+        for record in records:
+            self.database.DB.table('dats').insert(record)
+        dat_root = self.path / f'DatRoot{jobs}'
+        actions = [{'action': 'LoadDatFile', '_class': FakeSeedDatFile}, *actions,
+                   {'action': 'Copy', 'folder': str(dat_root)}, {'action': 'SaveToDatabase'}]
+        seed = Seed(name='fakeseed')
+        if default_actions:
+            seed.actions = {str(self.dats): actions}
+            # the merge actions of the shipped ini, the other options stay off
+            with mock.patch.object(config, 'getboolean', partial(ConfigParser.getboolean, config)):
+                seed.add_default_actions()
+        dat_plans = [(self.dats, PipelinePlan.compile(actions))]
+        with mock.patch.object(Seed, 'dat_plans', return_value=dat_plans), mock.patch('builtins.print'):
+            seed.process_dats(jobs=jobs)
+        records = sorted(self.database.DB.table('dats').all(), key=lambda record: record['file'])
+        for record in records:
+            record['new_file'] = str(Path(record['new_file']).relative_to(dat_root))
+        return records
+
+    def test_serial_actions_give_the_same_database(self):
+        actions = [{'action': 'DeleteOld', 'folder': str(self.path / 'DatRoot')}]
+        sequential = self.process(actions, jobs=1)
+        self.assertEqual([(record['name'], record['date']) for record in sequential],
+                         [('Same', '2024-01-01'), ('C', '2024-01-01'), ('D', '2024-01-01'), ('E', '2024-01-01')])
+        with mock.patch('datoso.commands.seed.ProcessPoolExecutor', side_effect=ProcessPoolExecutor) as mock_pool, \
+                mock.patch.object(Seed, 'process_sequential', autospec=True,
+                                  side_effect=Seed.process_sequential) as mock_sequential:
+            self.assertEqual(self.process(actions, jobs=2), sequential)
+        mock_pool.assert_called_once()
+        # only the second source of the same dat waits for the pool
+        dependent = mock_sequential.call_args.args[1]
+        self.assertEqual(len(dependent), 1)
+        self.assertIn(dependent[0][0].name, ('a_old.dat', 'b_new.dat'))
+
+    def test_default_pipeline_uses_a_pool(self):
+        actions = [{'action': 'DeleteOld', 'folder': str(self.path / 'DatRoot')}]
+        with mock.patch('datoso.commands.seed.ProcessPoolExecutor', side_effect=ProcessPoolExecutor) as mock_pool:
+            parallel = self.process(actions, jobs=2, default_actions=True)
+        mock_pool.assert_called_once()
+        plan = mock_pool.call_args.kwargs['initargs'][1][0][1]
+        self.assertEqual([action.func.__name__ for step in plan.steps for action in step][-2:],
+                         ['AutoMerge', 'Deduplicate'])
+        self.assertEqual(parallel, self.process(actions, jobs=1, default_actions=True))
+
+    def test_dat_is_processed_after_its_parent(self):
+        records = [{'name': 'C', 'seed': 'fakeseed', 'parent': 'fakeseed:D'}]
+        (self.dats / 'c.dat').write_text(dat('C', '2024-01-01').replace('C.bin', 'D.bin'))
+        with mock.patch('datoso.commands.seed.ProcessPoolExecutor', side_effect=ProcessPoolExecutor) as mock_pool, \
+                mock.patch.object(Seed, 'process_sequential', autospec=True,
+                                  side_effect=Seed.process_sequential) as mock_sequential:
+            self.process([], jobs=2, records=records, default_actions=True)
+        mock_pool.assert_called_once()
+        dependent = sorted(file.name for file, _ in mock_sequential.call_args.args[1])
+        self.assertIn(dependent, (['a_old.dat', 'c.dat'], ['b_new.dat', 'c.dat']))
+        # the roms of the child were removed against the parent saved by the pool
+        self.assertNotIn('<rom', (self.path / 'DatRoot2' / 'Fake' / 'c.dat').read_text())
+
+    def test_per_dat_actions_give_the_same_database(self):
+        (self.dats / 'b_new.dat').unlink()
+        sequential = self.process([], jobs=1)
+        with mock.patch('datoso.commands.seed.ProcessPoolExecutor', side_effect=ProcessPoolExecutor) as mock_pool:
+            self.assertEqual(self.process([], jobs=2), sequential)
+        mock_pool.assert_called_once()
+
+
+class TestUnchangedSources(unittest.TestCase):
+    def setUp(self):
+        self.seed = Seed(name='fakeseed')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = Path(self.tmp.name) / 'source.dat'
+        self.source.write_text('<datafile/>')
+        destination = Path(self.tmp.name) / 'copied.dat'
+        destination.write_text('<datafile/>')
+        stat = self.source.stat()
+        self.record = {'name': 'source', 'seed': 'fakeseed', 'file': str(self.source), 'new_file': str(destination),
+                       'source_size': stat.st_size, 'source_mtime': stat.st_mtime_ns,
+                       'source_hash': content_hash(self.source)}
+        self.seed._sources = {str(self.source): self.record}
+
+    def test_same_stat_is_unchanged(self):
+        with mock.patch('datoso.commands.seed.content_hash') as mock_hash:
+            self.assertTrue(self.seed.is_unchanged(self.source))
+        mock_hash.assert_not_called()
+
+    @mock.patch('datoso.commands.seed.Dat')
+    def test_same_content_is_unchanged_and_stores_the_new_mtime(self, mock_dat):
+        os.utime(self.source, ns=(0, 0))
+        self.assertTrue(self.seed.is_unchanged(self.source))
+        mock_dat.assert_called_once_with(name='source', seed='fakeseed')
+        self.assertEqual(mock_dat.return_value.source_mtime, 0)
+        mock_dat.return_value.save.assert_called_once()
+
+    def test_changed_sources_are_processed(self):
+        self.source.write_text('<datafile></datafile>')
+        self.assertFalse(self.seed.is_unchanged(self.source))
+        self.record['source_size'] = self.source.stat().st_size
+        os.utime(self.source, ns=(0, 0))
+        self.assertFalse(self.seed.is_unchanged(self.source))
+
+    def test_missing_destination_or_disabled_is_processed(self):
+        self.record['status'] = 'disabled'
+        self.assertFalse(self.seed.is_unchanged(self.source))
+        del self.record['status']
+        Path(self.record['new_file']).unlink()
+        self.assertFalse(self.seed.is_unchanged(self.source))
+
+    @mock.patch('datoso.commands.seed.Processor')
+    def test_unchanged_dats_skip_the_actions(self, mock_processor):
+        with mock.patch('datoso.commands.seed.config.getboolean', return_value=False):
+            self.assertEqual(self.seed.process_file(self.source, None), [])
+        mock_processor.assert_not_called()
+
+
+logger = logging.getLogger('datoso_seed_fake')
+
+
+def fake_command_seed(args):
+    """ Prints, logs and saves a record, the seed named 'broken' fails and the seed named 'crash' raises. """
+    print(f'start {args.seed}')
+    logger.warning('log %s', args.seed)
+    if args.seed == 'broken':
+        sys.exit(1)
+    if args.seed == 'crash':
+        raise RuntimeError(args.seed)
+    journal.record('Seed', {'name': args.seed})
+    print(f'end {args.seed}')
+
+
+def parent_seed_command_seed(args):
+    """ The seed named 'third' updates the parent dat, the other seeds save its date in the child dat. """
+    if args.seed == 'third':
+        journal.record('Dat', {'name': 'Parent', 'seed': 'third', 'date': '2024-01-01'})
+        return
+    parent = DatabaseSingleton().DB.table('dats').get(Query().name == 'Parent')
+    journal.record('Dat', {'name': 'Child', 'seed': args.seed, 'parent': 'third:Parent', 'date': parent['date']})
+
+
+class TestCommandSeedAll(unittest.TestCase):
+    def setUp(self):
+        self.args = Namespace(seed='all', exclude=['excluded'], only=None, parallel=2)
+        seeds = {f'datoso_seed_{name}': None for name in ('first', 'broken', 'excluded', 'third')}
+        patcher = mock.patch('datoso.commands.helpers.seed.installed_seeds', return_value=seeds)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.database = DatabaseSingleton()
+        patcher = mock.patch.object(self.database, 'DB', TinyDB(storage=CachingMiddleware(MemoryStorage)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_selected_seeds(self):
+        self.assertEqual(seed_helpers.selected_seeds(self.args), ['first', 'broken', 'third'])
+
+    @mock.patch('datoso.commands.helpers.seed.replay')
+    def test_parallel_replays_writes_and_counts_failures(self, mock_replay):
+        failed = seed_helpers.command_seed_parallel(self.args, fake_command_seed, ['first', 'broken', 'third'], 2)
+        self.assertEqual(failed, 1)
+        replayed = sorted((entry for call in mock_replay.call_args_list for entry in call.args[0]),
+                          key=lambda entry: entry[1]['name'])
+        self.assertEqual(replayed, [('Seed', {'name': 'first'}), ('Seed', {'name': 'third'})])
+
+    def test_seeds_run_after_the_seeds_of_their_parents(self):
+        dats = self.database.DB.table('dats')
+        dats.insert({'name': 'Child', 'seed': 'first', 'parent': 'third:Parent'})
+        dats.insert({'name': 'Parent', 'seed': 'third', 'parent': 'third:Other'})
+        self.assertEqual(seed_helpers.seed_dependencies(['first', 'third']), {'first': {'third'}, 'third': set()})
+        self.assertEqual(seed_helpers.seed_waves(['first', 'third'], {'first': {'third'}, 'third': set()}),
+                         [['third'], ['first']])
+        failed = seed_helpers.command_seed_parallel(self.args, parent_seed_command_seed, ['first', 'third'], 2)
+        self.assertEqual(failed, 0)
+        # the child seed was forked once the records of the parent seed were replayed
+        self.assertEqual(self.database.DB.table('dats').get(Query().name == 'Child')['date'], '2024-01-01')
+
+    def test_seeds_of_a_parent_cycle_run_one_at_a_time(self):
+        self.assertEqual(seed_helpers.seed_waves(['first', 'third', 'broken'],
+                                                 {'first': {'third'}, 'third': {'first'}, 'broken': set()}),
+                         [['broken'], ['first'], ['third']])
+
+    @mock.patch('datoso.commands.helpers.seed.command_seed_parallel', return_value=1)
+    def test_all_exits_if_a_seed_failed(self, mock_parallel):
+        with self.assertRaises(SystemExit):
+            seed_helpers.command_seed_all(self.args, fake_command_seed)
+        mock_parallel.assert_called_once_with(self.args, fake_command_seed, ['first', 'broken', 'third'], 2)
+
+    def test_run_seed_buffers_output(self):
+        seed_helpers._seed_worker = (self.args, fake_command_seed, threading.Lock())
+        self.addCleanup(setattr, seed_helpers, '_seed_worker', None)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                self.assertLogs(level='WARNING') as logs:
+            code, _ = seed_helpers._run_seed('broken')
+        self.assertEqual(code, 1)
+        self.assertEqual(stdout.getvalue(), 'start broken\n')
+        self.assertEqual(logs.output, ['WARNING:datoso_seed_fake:log broken'])
+        self.assertEqual(self.args.seed, 'all')
+
+    def test_run_seed_buffers_errors(self):
+        seed_helpers._seed_worker = (self.args, fake_command_seed, threading.Lock())
+        self.addCleanup(setattr, seed_helpers, '_seed_worker', None)
+        with mock.patch('sys.stdout', new_callable=io.StringIO), self.assertLogs(level='WARNING') as logs:
+            code, _ = seed_helpers._run_seed('crash')
+        self.assertEqual(code, 1)
+        self.assertEqual([record.getMessage() for record in logs.records], ['log crash', 'Error running seed crash'])
+        self.assertEqual(logs.records[-1].name, 'datoso.commands.helpers.seed')
+
+
+if __name__ == '__main__':
+    unittest.main()
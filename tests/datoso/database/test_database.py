@@ -0,0 +1,178 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.database import (
+    DATABASE_URL,
+    SQLITE_DATABASE_URL,
+    JSONStorageWithBackup,
+    UnitOfWork,
+)
+from datoso.database.models.dat import batched_writes
+
+
+class TestUnitOfWork(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.database = str(Path(self.tmp.name) / "datoso.json")
+        self.work = UnitOfWork(self.database)
+        self.storage = mock.Mock()
+
+    def test_inactive_flushes_every_time(self):
+        self.work.record('Dat', {'name': 'a'})
+        self.work.flush(self.storage)
+        self.assertEqual(self.storage.flush.call_count, 1)
+        self.assertFalse(self.work.path.exists())
+
+    def test_flushes_every_batch_and_at_the_end(self):
+        self.work.begin(batch_size=2)
+        for name in ('a', 'b', 'c'):
+            self.work.record('Dat', {'name': name, 'path': Path('x')})
+            self.work.flush(self.storage)
+        self.assertEqual(self.storage.flush.call_count, 1)
+        self.assertEqual(self.work.entries(), [('Dat', {'name': 'c', 'path': 'x'})])
+        self.work.end(self.storage)
+        self.assertEqual(self.storage.flush.call_count, 2)
+        self.assertFalse(self.work.active)
+        self.assertFalse(self.work.path.exists())
+
+    def test_nested_units_are_part_of_the_outer_one(self):
+        self.work.begin()
+        self.work.begin()
+        self.work.flush(self.storage)
+        self.work.end(self.storage)
+        self.storage.flush.assert_not_called()
+        self.work.end(self.storage)
+        self.storage.flush.assert_called_once()
+
+    def test_interrupted_run_keeps_its_entries(self):
+        self.work.begin()
+        self.work.record('Dat', {'name': 'a'})
+        self.work.record('System', {'company': 'b'})
+        with open(self.work.path, 'a', encoding='utf-8') as file:
+            file.write('["Dat", {"na')
+        self.assertEqual(UnitOfWork(self.database).entries(), [('Dat', {'name': 'a'}), ('System', {'company': 'b'})])
+        self.work.end(self.storage)
+
+    def test_unfinished_journal_is_recovered_before_it_is_emptied(self):
+        self.work.path.write_text(json.dumps(['Dat', {'name': 'a'}]) + '\n')
+        with self.assertRaises(RuntimeError):
+            self.work.begin()
+        self.assertFalse(self.work.active)
+        recover = mock.Mock(side_effect=lambda entries: self.assertTrue(self.work.path.read_text()))
+        self.work.begin(recover=recover)
+        recover.assert_called_once_with([('Dat', {'name': 'a'})])
+        self.assertEqual(self.work.entries(), [])
+        self.work.end(self.storage)
+
+    @mock.patch('datoso.database.os.fsync')
+    def test_entries_are_synced(self, mock_fsync):
+        self.work.begin()
+        self.work.record('Dat', {'name': 'a'})
+        mock_fsync.assert_called_once()
+        self.work.end(self.storage)
+
+    def test_journal_is_locked_until_the_unit_ends(self):
+        self.work.begin()
+        self.work.record('Dat', {'name': 'a'})
+        other = UnitOfWork(self.database)
+        thread = threading.Thread(target=other.begin, kwargs={'recover': mock.Mock()})
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(self.work.entries(), [('Dat', {'name': 'a'})])
+        self.work.end(self.storage)
+        thread.join()
+        self.assertTrue(other.active)
+        other.end(self.storage)
+
+    def test_journal_is_next_to_the_database_of_the_backend(self):
+        work = UnitOfWork()
+        for backend, url in (('json', DATABASE_URL), ('sqlite', SQLITE_DATABASE_URL), (None, DATABASE_URL)):
+            with mock.patch('datoso.database.config.get', return_value=backend):
+                self.assertEqual(work.path, Path(f'{url}.journal'))
+
+
+class TestBatchedWrites(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.work = UnitOfWork(str(Path(self.tmp.name) / "datoso.json"))
+        for target, value in (('unit_of_work', self.work), ('DatabaseSingleton', mock.Mock())):
+            patcher = mock.patch(f'datoso.database.models.dat.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch('datoso.database.models.dat.replay')
+    def test_replays_the_interrupted_run_first(self, mock_replay):
+        self.work.path.write_text(json.dumps(['Dat', {'name': 'a', 'seed': 'b'}]) + '\n')
+        with batched_writes(batch_size=10):
+            self.assertTrue(self.work.active)
+        mock_replay.assert_called_once_with([('Dat', {'name': 'a', 'seed': 'b'})])
+        self.assertFalse(self.work.active)
+        self.assertFalse(self.work.path.exists())
+
+    @mock.patch('datoso.database.models.dat.journal')
+    def test_memory_database_is_not_batched(self, mock_journal):
+        mock_journal.active = True
+        with batched_writes():
+            self.assertFalse(self.work.active)
+
+
+class TestJSONStorageWithBackup(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "datoso.json"
+        self.path.write_text(json.dumps({"dats": {"1": {"name": "a"}}}))
+        for patcher in (mock.patch.object(JSONStorageWithBackup, 'backed_up', set()),
+                        mock.patch.dict(os.environ, {'DATABASE.BACKUPS': '2'})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, data):
+        storage = JSONStorageWithBackup(str(self.path))
+        try:
+            storage.write(data)
+        finally:
+            storage.close()
+        return storage
+
+    def test_backs_up_once_per_run(self):
+        storage = self.write({"dats": {"1": {"name": "b"}}})
+        self.write({"dats": {"1": {"name": "c"}}})
+        backups = storage.backups()
+        self.assertEqual(len(backups), 1)
+        self.assertEqual(json.loads(backups[0].read_text()), {"dats": {"1": {"name": "a"}}})
+        self.assertEqual(json.loads(self.path.read_text()), {"dats": {"1": {"name": "c"}}})
+
+    def test_keeps_the_last_backups(self):
+        for day in ("20240101", "20240102", "20240103"):
+            (Path(self.tmp.name) / f"datoso.json.{day}000000000000.bak").write_text("{}")
+        storage = self.write({"dats": {}})
+        backups = storage.backups()
+        self.assertEqual(len(backups), 2)
+        self.assertEqual(backups[0].name, "datoso.json.20240103000000000000.bak")
+        self.assertEqual(json.loads(backups[1].read_text()), {"dats": {"1": {"name": "a"}}})
+
+    def test_no_backups(self):
+        with mock.patch.dict(os.environ, {'DATABASE.BACKUPS': '0'}):
+            storage = self.write({"dats": {}})
+        self.assertEqual(storage.backups(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
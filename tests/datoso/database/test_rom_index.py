@@ -0,0 +1,87 @@
+import sys
+import unittest
+from pathlib import Path
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.database.rom_index import RomIndex, canonical_hash, detect_hash
+from datoso.repositories.dat_file import XMLDatFile
+from datoso.repositories.records import RomRecord
+from tests.datoso.repositories.test_dat_file import (
+    SHA_1,
+    SHA_2,
+    XML_DAT,
+    TestDatFileBase,
+)
+
+
+class TestRomIndex(TestDatFileBase):
+    def setUp(self):
+        super().setUp()
+        self.index = RomIndex(self.temp_dir / "roms.db")
+        self.addCleanup(self.index.close)
+
+    def index_dat(self, name="Game Boy", content=XML_DAT):
+        path = self.write_dat(f"{name}.xml", content)
+        games = XMLDatFile(file=path).iter_game_records(keep_source=False)
+        return path, self.index.update_dat("seed", name, path, games)
+
+    def test_detect_hash(self):
+        self.assertEqual(detect_hash("AAAA0001"), "crc")
+        self.assertEqual(detect_hash(SHA_1), "sha1")
+        self.assertIsNone(detect_hash("abc"))
+
+    def test_canonical_hash(self):
+        self.assertEqual(canonical_hash("crc", "0xAB"), "000000ab")
+        self.assertEqual(canonical_hash("sha1", SHA_1.upper()), SHA_1.lower())
+
+    def test_find(self):
+        self.index_dat()
+        found = self.index.find(SHA_2.upper())
+        self.assertEqual([rom["game"] for rom in found], ["Beta (USA)", "Gamma"])
+        self.assertEqual(found[0]["dat"], "Game Boy")
+        self.assertEqual(found[0]["size"], "2048")
+        self.assertEqual(len(self.index.find("aaaa0001", "crc")), 2)
+        self.assertEqual(self.index.stats(), (1, 4))
+
+    def test_unknown_hash_type(self):
+        with self.assertRaises(ValueError):
+            self.index.find("abc")
+
+    def test_unchanged_dat_is_not_indexed_again(self):
+        path, indexed = self.index_dat()
+        self.assertTrue(indexed)
+        self.assertTrue(self.index.is_indexed("seed", "Game Boy", path))
+        games = XMLDatFile(file=path).iter_game_records(keep_source=False)
+        self.assertFalse(self.index.update_dat("seed", "Game Boy", path, games))
+        self.assertEqual(self.index.stats(), (1, 4))
+
+    def test_changed_dat_is_replaced(self):
+        self.index_dat()
+        self.index_dat(content=XML_DAT.replace('crc="AAAA0002"', 'crc="BBBB0002"'))
+        self.assertEqual(self.index.find("aaaa0002"), [])
+        self.assertEqual(len(self.index.find("bbbb0002")), 2)
+        self.assertEqual(self.index.stats(), (1, 4))
+
+    def test_remove_dat(self):
+        self.index_dat()
+        self.index.remove_dat("seed", "Game Boy")
+        self.assertEqual(self.index.find(SHA_1), [])
+        self.assertEqual(self.index.stats(), (0, 0))
+
+    def test_hashes_index(self):
+        path, _ = self.index_dat()
+        shas = self.index.hashes_index("seed", "Game Boy", path)
+        self.assertTrue(shas.has_rom(RomRecord("x", "1024", sha1=SHA_1)))
+        self.assertFalse(shas.has_rom(RomRecord("x", "1024", sha1="0" * 40)))
+        path.write_text(XML_DAT.replace("Alpha (USA)", "Delta (USA)"), encoding="utf-8")
+        self.assertIsNone(self.index.hashes_index("seed", "Game Boy", path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from tinydb import Query, where
+
+from datoso.database import DatabaseSingleton, migrate_to_sqlite, open_database
+from datoso.database.models.dat import Dat, System
+from datoso.database.sqlite import SQLiteDatabase, equalities
+
+
+class TestSQLiteBase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "datoso.db"
+        self.database = SQLiteDatabase(self.path)
+        self.addCleanup(self.database.close)
+
+
+class TestSQLiteTable(TestSQLiteBase):
+    def setUp(self):
+        super().setUp()
+        self.table = self.database.table("dats")
+        self.table.insert({"name": "a", "seed": "s1", "version": 1})
+        self.table.insert({"name": "b", "seed": "s1"})
+        self.table.insert({"name": "a", "seed": "s2"})
+
+    def test_equalities(self):
+        query = Query()
+        self.assertEqual(equalities(((query.name == "a") & (query.seed == "s"))._hash), {"name": "a", "seed": "s"})
+        self.assertIsNone(equalities(((query.name == "a") | (query.seed == "s"))._hash))
+        self.assertIsNone(equalities(query.name.matches("a")._hash))
+        self.assertIsNone(equalities((query.enabled == True)._hash))
+
+    def test_search_and_get(self):
+        query = Query()
+        self.assertEqual(self.table.get((query.name == "a") & (query.seed == "s2")), {"name": "a", "seed": "s2"})
+        self.assertEqual(sorted(dat["name"] for dat in self.table.search(query.seed == "s1")), ["a", "b"])
+        self.assertEqual(len(self.table.search(query.name.matches("[ab]"))), 3)
+        self.assertEqual(self.table.search(query.version == "1"), [])
+        self.assertIsNone(self.table.get(query.name == "c"))
+        self.assertEqual(self.table.get(doc_id=2)["name"], "b")
+
+    def test_lookups_use_an_index(self):
+        query = Query()
+        self.table.search((query.seed == "s1") & (query.name == "a"))
+        plan = self.database.storage.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM dats WHERE "
+            "json_extract(document, '$.\"name\"') = 'a' AND json_extract(document, '$.\"seed\"') = 's1'").fetchall()
+        self.assertIn("dats_name_seed", str(plan))
+
+    def test_upsert_update_and_remove(self):
+        query = Query()
+        self.assertEqual(self.table.upsert({"name": "a", "seed": "s1", "date": "x"},
+                                           (query.name == "a") & (query.seed == "s1")), [1])
+        self.assertEqual(self.table.get(doc_id=1), {"name": "a", "seed": "s1", "version": 1, "date": "x"})
+        self.assertEqual(self.table.upsert({"name": "c", "seed": "s1"}, (query.name == "c") & (query.seed == "s1")),
+                         [4])
+        self.table.update({"status": "disabled"}, doc_ids=[2])
+        self.assertEqual(self.table.get(doc_id=2)["status"], "disabled")
+        self.assertEqual(self.table.remove(where("seed") == "s2"), [3])
+        self.assertEqual(len(self.table), 3)
+        self.table.truncate()
+        self.assertEqual(self.table.all(), [])
+
+    def test_writes_are_committed_on_flush(self):
+        other = SQLiteDatabase(self.path)
+        self.addCleanup(other.close)
+        self.assertEqual(len(other.table("dats")), 0)
+        self.database.storage.flush()
+        self.assertEqual(len(other.table("dats")), 3)
+
+    def test_memory_copy(self):
+        self.database.storage.flush()
+        memory = self.database.memory_copy()
+        memory.table("dats").insert({"name": "d", "seed": "s1"})
+        self.assertEqual(len(memory.table("dats")), 4)
+        self.assertEqual(len(self.database.table("dats")), 3)
+        self.assertIs(memory.memory_copy(), memory)
+
+
+class TestModelsOnSQLite(TestSQLiteBase):
+    def setUp(self):
+        super().setUp()
+        singleton = DatabaseSingleton()
+        self.addCleanup(setattr, singleton, "DB", singleton.DB)
+        singleton.DB = self.database
+
+    def test_save_load_and_search(self):
+        Dat(name="a", seed="s1", date="2023-01-01").save()
+        System(company="Nintendo", system="Game Boy", system_type="Handheld").save()
+        dat = Dat(name="a", seed="s1")
+        dat.load()
+        self.assertEqual(dat.date, "2023-01-01")
+        dat.date = "2024-01-01"
+        dat.save()
+        dat.flush()
+        self.assertEqual([dat["date"] for dat in Dat.search(Query().seed == "s1")], ["2024-01-01"])
+        self.assertEqual(System(company="Nintendo", system="Game Boy", system_type=None).get_one()["system_type"],
+                         "Handheld")
+
+
+class TestMigration(TestSQLiteBase):
+    def test_migrate_json_database(self):
+        source = Path(self.tmp.name) / "datoso.json"
+        source.write_text(json.dumps({"dats": {"1": {"name": "a", "seed": "s"}, "7": {"name": "b", "seed": "s"}},
+                                      "systems": {}}))
+        counts = migrate_to_sqlite(str(source), str(self.path))
+        self.assertEqual(counts, {"dats": 2, "systems": 0})
+        self.assertEqual(self.database.table("dats").get(doc_id=7), {"name": "b", "seed": "s"})
+        self.assertEqual(self.database.tables(), {"dats", "systems"})
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            open_database("postgres")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,12 +16,14 @@ if str(project_root_for_imports / "src") not in sys.path:
 # Import functions from file_utils.py
 from datoso.helpers.file_utils import (
     copy_path,
+    same_content,
     remove_folder,
     remove_path,
     remove_empty_folders,
     parse_path,
     move_path,
-    get_ext
+    get_ext,
+    atomic_write,
 )
 
 class TestFileUtilsBase(unittest.TestCase):
@@ -91,6 +93,59 @@ class TestCopyPath(TestFileUtilsBase):
             copy_path("non_existent_source.txt", str(self.temp_dir / "dest.txt"))
         self.assertIn("File non_existent_source.txt not found.", str(context.exception))
 
+    def test_skip_identical_file(self):
+        source_file = self.temp_dir / "identical.txt"
+        source_file.write_text("content")
+        dest_file = self.temp_dir / "identical_dest.txt"
+        dest_file.write_text("content")
+        os.utime(dest_file, ns=(0, 0))
+        copy_path(str(source_file), str(dest_file), skip_identical=True)
+        self.assertEqual(dest_file.stat().st_mtime_ns, 0)
+        source_file.write_text("changed")
+        copy_path(str(source_file), str(dest_file), skip_identical=True)
+        self.assertEqual(dest_file.read_text(), "changed")
+
+    def test_hardlink(self):
+        source_file = self.temp_dir / "linked.txt"
+        source_file.write_text("content")
+        dest_file = self.temp_dir / "linked_dest.txt"
+        dest_file.write_text("old")
+        copy_path(str(source_file), str(dest_file), mode='hardlink')
+        self.assertTrue(os.path.samefile(source_file, dest_file))
+        self.assertTrue(same_content(source_file, dest_file))
+
+    def test_unsupported_link_falls_back_to_copy(self):
+        source_file = self.temp_dir / "reflinked.txt"
+        source_file.write_text("content")
+        dest_file = self.temp_dir / "reflinked_dest.txt"
+        with mock.patch('datoso.helpers.file_utils.os.link', side_effect=OSError):
+            copy_path(str(source_file), str(dest_file), mode='hardlink')
+        copy_path(str(source_file), str(self.temp_dir / "reflinked_dest_2.txt"), mode='reflink')
+        self.assertEqual(dest_file.read_text(), "content")
+        self.assertEqual((self.temp_dir / "reflinked_dest_2.txt").read_text(), "content")
+        self.assertEqual(sorted(path.name for path in self.temp_dir.iterdir()),
+                         ["reflinked.txt", "reflinked_dest.txt", "reflinked_dest_2.txt"])
+
+    def test_sync_directory_copies_only_changed_files(self):
+        source_dir = self.temp_dir / "sync_source"
+        (source_dir / "subdir").mkdir(parents=True)
+        (source_dir / "same.txt").write_text("same")
+        (source_dir / "subdir" / "changed.txt").write_text("new")
+        dest_dir = self.temp_dir / "sync_dest"
+        (dest_dir / "removed_dir").mkdir(parents=True)
+        (dest_dir / "subdir").mkdir()
+        (dest_dir / "same.txt").write_text("same")
+        (dest_dir / "subdir" / "changed.txt").write_text("old")
+        (dest_dir / "removed.txt").write_text("removed")
+        os.utime(dest_dir / "same.txt", ns=(0, 0))
+
+        copy_path(str(source_dir), str(dest_dir), skip_identical=True)
+
+        self.assertEqual((dest_dir / "same.txt").stat().st_mtime_ns, 0)
+        self.assertEqual((dest_dir / "subdir" / "changed.txt").read_text(), "new")
+        self.assertEqual(sorted(str(path.relative_to(dest_dir)) for path in dest_dir.rglob("*")),
+                         ["same.txt", "subdir", "subdir/changed.txt"])
+
 
 class TestRemoveFolder(TestFileUtilsBase):
     @mock.patch('datoso.helpers.file_utils.shutil.rmtree')
@@ -280,6 +335,31 @@ class TestGetExt(unittest.TestCase): # Does not need TestFileUtilsBase
         self.assertEqual(get_ext("/path/to/.configfile"), "")
         self.assertEqual(get_ext(Path("some.folder/file.zip")), ".zip")
 
+class TestAtomicWrite(TestFileUtilsBase):
+    def test_atomic_write_replaces_file(self):
+        target = self.temp_dir / "file.txt"
+        target.write_text("old")
+        with atomic_write(target) as fild:
+            fild.write("new")
+            self.assertEqual(target.read_text(), "old")
+        self.assertEqual(target.read_text(), "new")
+        self.assertEqual(list(self.temp_dir.iterdir()), [target])
+
+    def test_atomic_write_keeps_file_on_error(self):
+        target = self.temp_dir / "file.txt"
+        target.write_text("old")
+        with self.assertRaises(ValueError), atomic_write(target) as fild:
+            fild.write("new")
+            raise ValueError
+        self.assertEqual(target.read_text(), "old")
+        self.assertEqual(list(self.temp_dir.iterdir()), [target])
+
+    def test_atomic_write_binary(self):
+        target = self.temp_dir / "file.bin"
+        with atomic_write(target, 'wb') as fild:
+            fild.write(b"data")
+        self.assertEqual(target.read_bytes(), b"data")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import sys
+import unittest
+from pathlib import Path
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.helpers import compare_dates, normalize_date, parse_date
+
+
+class TestDates(unittest.TestCase):
+    def test_normalize_date(self):
+        self.assertEqual(normalize_date("2023-01-15"), "2023-01-15 00:00:00")
+        self.assertEqual(normalize_date("2023-01-15T10:30:00+02:00"), "2023-01-15 08:30:00")
+        self.assertEqual(normalize_date("15-01-2023"), "2023-01-15 00:00:00")
+        self.assertEqual(normalize_date("2023/01/15"), "2023-01-15 00:00:00")
+        self.assertIsNone(normalize_date("not a date"))
+        self.assertIsNone(normalize_date(None))
+
+    def test_normalized_dates_sort_like_dates(self):
+        dates = ["2023-01-15 10:00", "05-03-2022", "2023-01-15T09:00:00-02:00"]
+        self.assertEqual(sorted(dates, key=normalize_date), ["05-03-2022", "2023-01-15 10:00", "2023-01-15T09:00:00-02:00"])
+
+    def test_compare_dates(self):
+        self.assertTrue(compare_dates("2023-01-15", "2023-01-01"))
+        self.assertFalse(compare_dates("2023-01-01", "2023-01-15"))
+        self.assertFalse(compare_dates("2023-01-15", "2023-01-15 00:00:00"))
+        # aware and naive dates are compared
+        self.assertTrue(compare_dates("2023-01-15T00:00:00-05:00", "2023-01-15"))
+        self.assertFalse(compare_dates("2023-01-15", None))
+        self.assertFalse(compare_dates("2023-01-15", "not a date"))
+
+    def test_parsed_dates_are_memoized(self):
+        parse_date.cache_clear()
+        compare_dates("2023-01-15", "2023-01-01")
+        compare_dates("2023-01-15", "2023-01-01")
+        self.assertEqual(parse_date.cache_info().hits, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1 @@
+"""Makes the tests/datoso/repositories directory a Python package."""
@@ -0,0 +1,111 @@
+import os
+import pickle
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.repositories.bloom_filter import BloomFilter, PrefilteredIndex
+from datoso.repositories.dat_file import XMLDatFile, parent_index
+from datoso.repositories.hashes_index import HashesIndex
+from datoso.repositories.records import RomRecord
+from tests.datoso.repositories.test_dat_file import (
+    SHA_1,
+    XML_DAT,
+    XML_DB_EXPORT,
+    TestDatFileBase,
+)
+
+
+def make_index(count):
+    shas = HashesIndex()
+    shas.add_roms(RomRecord(f"{i}.bin", str(i), crc=f"{i:08x}", sha1=f"{i:040x}") for i in range(count))
+    return shas
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter.from_index(make_index(1000))
+        self.assertEqual(bloom.count, 2000)
+        for i in range(1000):
+            self.assertTrue(bloom.may_have_rom(RomRecord("x", str(i), sha1=f"{i:040x}")))
+            self.assertTrue(bloom.may_have_rom(RomRecord("x", str(i), crc=f"{i:08X}")))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter.from_index(make_index(1000))
+        hits = sum(bloom.may_have_rom(RomRecord("x", "1", sha1=f"{i:040x}")) for i in range(10000, 20000))
+        self.assertLess(hits, 300)
+
+    def test_size_is_part_of_the_key(self):
+        bloom = BloomFilter.from_index(make_index(10))
+        self.assertFalse(bloom.may_have_rom(RomRecord("x", "999999", sha1=f"{1:040x}")))
+
+    def test_pickle(self):
+        bloom = BloomFilter.from_index(make_index(10))
+        restored = pickle.loads(pickle.dumps(bloom))
+        self.assertEqual((restored.size, restored.hashes, restored.bits), (bloom.size, bloom.hashes, bloom.bits))
+
+
+class TestPrefilteredIndex(unittest.TestCase):
+
+    def test_exact_index_is_built_on_first_candidate(self):
+        shas = make_index(100)
+        exact = mock.Mock(return_value=shas)
+        index = PrefilteredIndex(BloomFilter.from_index(shas), exact)
+        missing = [RomRecord("x", "5", sha1=f"{i:040x}") for i in range(1000, 1010)]
+        self.assertEqual(index.has_roms(missing), [False] * 10)
+        exact.assert_not_called()
+        found = index.has_roms([{"@name": "5.bin", "@size": "5", "@sha1": f"{5:040x}"}, *missing[:1]])
+        self.assertEqual(found, [True, False])
+        exact.assert_called_once()
+
+
+class TestParentIndex(TestDatFileBase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(os.environ, {"PROCESS.PARENTBLOOMFILTER": "true"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_filter_is_stored_until_parent_changes(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", XML_DAT))
+        self.assertIsInstance(parent.parent_index(), HashesIndex)
+        self.assertIsNotNone(self.cache.get_filter(parent.file))
+        index = parent.parent_index()
+        self.assertIsInstance(index, PrefilteredIndex)
+        self.assertTrue(index.has_rom(RomRecord("x", "1024", sha1=SHA_1)))
+        parent.file.write_text(XML_DAT.replace("Alpha", "Delta"), encoding="utf-8")
+        self.assertIsNone(self.cache.get_filter(parent.file))
+
+    def test_merge_with_parent_does_not_read_unrelated_parent(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", XML_DAT))
+        parent.parent_index()
+        child = XMLDatFile(file=self.write_dat("child.xml", XML_DB_EXPORT.replace(SHA_1, "f" * 40).replace("AAAA0001", "FFFF0001")))
+        with mock.patch.object(XMLDatFile, "get_rom_shas", side_effect=AssertionError("parent read")):
+            child.merge_with(parent)
+        self.assertEqual(child.merged_roms, [])
+
+    def test_disabled(self):
+        exact = mock.Mock(return_value=HashesIndex())
+        with mock.patch("datoso.repositories.dat_file.config.getboolean", return_value=False):
+            self.assertIs(parent_index(self.write_dat("parent.xml", XML_DAT), exact), exact.return_value)
+        self.assertEqual(self.cache.files(), [])
+
+    def test_off_by_default(self):
+        exact = mock.Mock(return_value=HashesIndex())
+        with mock.patch.dict(os.environ, {}, clear=False):
+            del os.environ["PROCESS.PARENTBLOOMFILTER"]
+            self.assertIs(parent_index(self.write_dat("parent.xml", XML_DAT), exact), exact.return_value)
+        self.assertEqual(self.cache.files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.repositories.dat_cache import DatCache
+from datoso.repositories.dat_file import ClrMameProDatFile, XMLDatFile
+from tests.datoso.repositories.test_dat_file import (
+    CLRMAMEPRO_DAT,
+    XML_DAT,
+    TestDatFileBase,
+)
+
+
+class TestDatCache(TestDatFileBase):
+
+    def test_full_pass_is_cached(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        games = list(XMLDatFile(file=path).iter_games())
+        self.assertIsNotNone(self.cache.get(path, XMLDatFile))
+        with mock.patch("datoso.repositories.dat_file.iterparse", side_effect=AssertionError("parsed again")):
+            dat = XMLDatFile(file=path)
+            self.assertEqual(dat.name, "Nintendo - Game Boy")
+            self.assertEqual(list(dat.iter_games()), games)
+            dat.load(load_games=True)
+        self.assertEqual(len(dat.data["datafile"]["game"]), 2)
+
+    def test_partial_pass_is_not_cached(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        games = XMLDatFile(file=path).iter_games()
+        next(games)
+        games.close()
+        self.assertIsNone(self.cache.get(path))
+        self.assertEqual(self.cache.files(), [])
+
+    def test_changed_file_is_parsed_again(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        list(XMLDatFile(file=path).iter_games())
+        path.write_text(XML_DAT.replace("Alpha (USA)", "Delta (USA)"), encoding="utf-8")
+        self.assertIsNone(self.cache.get(path))
+        names = [game["@name"] for game in XMLDatFile(file=path).iter_games()]
+        self.assertIn("Delta (USA)", names)
+
+    def test_other_class_is_not_served(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        list(XMLDatFile(file=path).iter_games())
+        self.assertIsNone(self.cache.get(path, ClrMameProDatFile))
+
+    def test_clrmamepro_is_cached(self):
+        path = self.write_dat("a.dat", CLRMAMEPRO_DAT)
+        dat = ClrMameProDatFile(file=path)
+        dat.load(load_games=True)
+        with mock.patch.object(ClrMameProDatFile, "read_block", side_effect=AssertionError("parsed again")):
+            cached = ClrMameProDatFile(file=path)
+            cached.load(load_games=True)
+        self.assertEqual(cached.header, dat.header)
+        self.assertEqual(cached.games, dat.games)
+
+    def test_disabled(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        with mock.patch.object(DatCache, "enabled", False):
+            list(XMLDatFile(file=path).iter_games())
+        self.assertEqual(self.cache.files(), [])
+
+    def test_evicts_least_recently_used(self):
+        paths = [self.write_dat(f"{name}.xml", XML_DAT) for name in "abc"]
+        for index, path in enumerate(paths):
+            list(XMLDatFile(file=path).iter_games())
+            os.utime(self.cache.entry_path(path), ns=(index, index))
+        self.cache.get(paths[0])
+        size = self.cache.entry_path(paths[0]).stat().st_size
+        self.assertEqual(self.cache.evict(size), 2)
+        self.assertEqual([path for path, _ in self.cache.files()], [self.cache.entry_path(paths[0])])
+        self.assertEqual(self.cache.clear(), 1)
+        self.assertEqual(self.cache.size(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
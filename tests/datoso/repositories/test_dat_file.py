@@ -0,0 +1,433 @@
+import shlex
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+import xmltodict
+
+import datoso.repositories.dat_file
+from datoso.helpers.file_utils import copy_file
+from datoso.repositories.dat_cache import DatCache
+from datoso.repositories.dat_file import (
+    ClrMameProDatFile,
+    DatFile,
+    DOSCenterDatFile,
+    FileSniff,
+    XMLDatFile,
+    XMLDBExportDatFile,
+    scan_blocks,
+    split_line,
+)
+from datoso.repositories.hashes_index import HashesIndex
+from datoso.repositories.index_cache import index_cache
+
+SHA_1 = "0000000000000000000000000000000000000001"
+SHA_2 = "0000000000000000000000000000000000000002"
+
+XML_DAT = f"""<?xml version="1.0"?>
+<!DOCTYPE datafile PUBLIC "-//Logiqx//DTD ROM Management Datafile//EN" "http://www.logiqx.com/Dats/datafile.dtd">
+<datafile>
+	<header>
+		<name>Nintendo - Game Boy</name>
+		<description>Nintendo - Game Boy (20240101)</description>
+		<date>2024-01-01</date>
+		<author>A &amp; B</author>
+		<clrmamepro forcenodump="required"/>
+	</header>
+	<game name="Alpha (USA)">
+		<description>Alpha (USA)</description>
+		<rom name="Alpha (USA).gb" size="1024" crc="AAAA0001" sha1="{SHA_1}"/>
+	</game>
+	<game name="Beta (USA)" cloneof="Alpha (USA)">
+		<description>Beta (USA)</description>
+		<rom name="Beta (USA).gb" size="1024" crc="AAAA0001" sha1="{SHA_1}"/>
+		<rom name="Beta (USA) (Extra).gb" size="2048" crc="AAAA0002" sha1="{SHA_2}"/>
+	</game>
+	<dir name="Sub">
+		<game name="Gamma">
+			<description>Gamma</description>
+			<rom name="Gamma.gb" size="2048" crc="AAAA0002" sha1="{SHA_2}"/>
+		</game>
+	</dir>
+</datafile>
+"""
+
+XML_DB_EXPORT = f"""<?xml version="1.0"?>
+<datafile name="Export">
+	<game name="Alpha (USA)">
+		<rom name="Alpha (USA).gb" size="1024" crc="AAAA0001" sha1="{SHA_1}"/>
+	</game>
+</datafile>
+"""
+
+CLRMAMEPRO_DAT = f"""clrmamepro (
+	name "Nintendo - Game Boy"
+	description "Nintendo - Game Boy (20240101)"
+	author "A (B)"
+)
+
+game (
+	name "Alpha (USA)"
+	description "Alpha (USA)"
+	rom ( name "Alpha (USA).gb" size 1024 crc AAAA0001 sha1 {SHA_1} )
+)
+
+game (
+	name "Beta (USA)"
+	description "Beta (USA)"
+	rom ( name "Beta (USA).gb" size 1024 crc AAAA0001 sha1 {SHA_1} )
+	rom ( name "Beta (USA) (Extra).gb" size 2048 crc AAAA0002 sha1 {SHA_2} )
+)
+"""
+
+
+def realistic_dat(name, games, offset=0):
+    """A dat of many small games, of 1 to 4 roms, every other game sharing a rom with the previous one."""
+    entries = []
+    for i in range(offset, offset + games):
+        roms = "".join(
+            f'<rom name="{i} ({j}).bin" size="{1024 + j}" crc="{(i - i % 2 + j):08X}" sha1="{(i - i % 2 + j):040x}"/>'
+            for j in range(1 + i % 4))
+        entries.append(f'<game name="{name} {i}"><description>{name} {i}</description>{roms}</game>')
+    return f'<?xml version="1.0"?><datafile><header><name>{name}</name></header>{"".join(entries)}</datafile>'
+
+
+class TestDatFileBase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir_obj = tempfile.TemporaryDirectory()
+        self.temp_dir = Path(self.temp_dir_obj.name)
+        self.cache_dir_obj = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir_obj.cleanup)
+        self.cache = DatCache(self.cache_dir_obj.name)
+        patcher = mock.patch("datoso.repositories.dat_file.dat_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(index_cache.clear)
+
+    def tearDown(self):
+        self.temp_dir_obj.cleanup()
+
+    def write_dat(self, name, content):
+        path = self.temp_dir / name
+        path.write_text(content, encoding="utf-8")
+        return path
+
+
+class TestXMLDatFileLoad(TestDatFileBase):
+    def test_class_from_file(self):
+        self.assertIs(DatFile.class_from_file(self.write_dat("a.xml", XML_DAT)), XMLDatFile)
+        self.assertIs(DatFile.class_from_file(self.write_dat("b.xml", XML_DB_EXPORT)), XMLDBExportDatFile)
+
+    def test_load_header_only(self):
+        dat = XMLDatFile(file=self.write_dat("a.xml", XML_DAT))
+        self.assertEqual(dat.name, "Nintendo - Game Boy")
+        self.assertEqual(dat.date, "2024-01-01")
+        self.assertEqual(dat.author, "A & B")
+        self.assertEqual(dat.header["clrmamepro"], {"@forcenodump": "required"})
+        self.assertNotIn("game", dat.data["datafile"])
+
+    def test_load_games_matches_xmltodict(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        dat = XMLDatFile(file=path)
+        dat.load(load_games=True)
+        self.assertEqual(dat.data, xmltodict.parse(XML_DAT))
+        self.assertEqual(dat.game_key, "game")
+
+    def test_streamed_games_match_loaded_games(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        streamed = XMLDatFile(file=path)
+        loaded = XMLDatFile(file=path)
+        loaded.load(load_games=True)
+        self.assertEqual(list(streamed.iter_games()), list(loaded.iter_games()))
+        self.assertEqual([game["@name"] for game in streamed.iter_games()], ["Alpha (USA)", "Beta (USA)", "Gamma"])
+
+    def test_db_export_load(self):
+        dat = XMLDBExportDatFile(file=self.write_dat("b.xml", XML_DB_EXPORT))
+        self.assertEqual(dat.name, "Export")
+        self.assertEqual(dat.header, {})
+        self.assertEqual(len(list(dat.iter_games())), 1)
+
+    def test_to_csv(self):
+        dat = XMLDatFile(file=self.write_dat("a.xml", XML_DAT))
+        rows = list(dat.to_csv())
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0], f'"Alpha (USA).gb"\t"{SHA_1}"\t""\t"AAAA0001"\n')
+
+
+class TestXMLDatFileDedupe(TestDatFileBase):
+    def test_streamed_dedupe_matches_loaded_dedupe(self):
+        loaded = XMLDatFile(file=self.write_dat("loaded.xml", XML_DAT))
+        loaded.load(load_games=True)
+        loaded.dedupe()
+        loaded.save()
+        streamed = XMLDatFile(file=self.write_dat("streamed.xml", XML_DAT))
+        streamed.dedupe()
+        streamed.save()
+        self.assertEqual(len(loaded.merged_roms), 2)
+        self.assertEqual(len(streamed.merged_roms), 2)
+        self.assertEqual((self.temp_dir / "loaded.xml").read_text(), (self.temp_dir / "streamed.xml").read_text())
+        saved = xmltodict.parse((self.temp_dir / "streamed.xml").read_text())
+        self.assertNotIn("dir", saved["datafile"])
+        self.assertEqual(len(saved["datafile"]["game"]), 2)
+
+    def test_merge_with_parent(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", XML_DAT))
+        child = XMLDatFile(file=self.write_dat("child.xml", XML_DB_EXPORT.replace("Export", "Child")))
+        child.merge_with(parent)
+        self.assertEqual(len(child.merged_roms), 1)
+        self.assertEqual(list(child.iter_games()), [])
+
+    def test_dedupe_checks_each_game_and_merge_each_chunk_as_a_batch(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", realistic_dat("Parent", 1000)))
+        child = XMLDatFile(file=self.write_dat("child.xml", realistic_dat("Child", 1000, offset=500)))
+        lookup = HashesIndex._lookup
+        with mock.patch.object(HashesIndex, "has_rom", side_effect=AssertionError("rom by rom check")), \
+                mock.patch.object(HashesIndex, "_lookup", autospec=True, side_effect=lookup) as batches:
+            child.dedupe()
+            # the roms of a game are only duplicates of the roms of the previous games
+            self.assertEqual(batches.call_count, 1000)
+            self.assertEqual(max(len(call.args[1]) for call in batches.call_args_list), 4)
+            games = list(child.iter_games())
+            roms = sum(len(game["rom"]) for game in games)
+            batches.reset_mock()
+            with mock.patch("datoso.repositories.dat_file.TRANSFORM_CHUNK_SIZE", 100):
+                child.merge_with(parent)
+            self.assertEqual(batches.call_count, -(-len(games) // 100))
+            self.assertEqual(sum(len(call.args[1]) for call in batches.call_args_list), roms)
+        self.assertEqual(len(list(child.iter_games())), 500)
+
+    def test_merge_of_loaded_dat_checks_every_game_at_once(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", realistic_dat("Parent", 1000)))
+        child = XMLDatFile(file=self.write_dat("child.xml", realistic_dat("Child", 1000, offset=500)))
+        child.load(load_games=True)
+        lookup = HashesIndex._lookup
+        with mock.patch.object(HashesIndex, "_lookup", autospec=True, side_effect=lookup) as batches:
+            child.merge_with(parent)
+        self.assertEqual(batches.call_count, 1)
+        self.assertEqual(len(list(child.iter_games())), 500)
+
+    def test_merge_matches_a_parent_rom_of_the_same_hash_and_size(self):
+        # the parent has two roms with the same sha1, the child rom has the size of the first one
+        parent = XMLDatFile(file=self.write_dat("parent.xml", """<?xml version="1.0"?><datafile>
+            <game name="P1"><rom name="a.bin" size="10" sha1="aa"/></game>
+            <game name="P2"><rom name="b.bin" size="20" sha1="aa"/></game></datafile>"""))
+        child = XMLDatFile(file=self.write_dat("child.xml", """<?xml version="1.0"?><datafile>
+            <game name="C1"><rom name="a.bin" size="10" sha1="AA"/></game>
+            <game name="C2"><rom name="c.bin" size="30" sha1="aa"/></game></datafile>"""))
+        child.merge_with(parent)
+        self.assertEqual([game["@name"] for game in child.iter_games()], ["C2"])
+        self.assertEqual([(rom.name, rom.size) for rom in child.merged_roms], [("a.bin", "10")])
+
+    def test_save_streamed_dat_to_other_file(self):
+        dat = XMLDatFile(file=self.write_dat("a.xml", XML_DAT))
+        dat.file = self.temp_dir / "copy.xml"
+        dat.save()
+        self.assertEqual(xmltodict.parse(dat.file.read_text()), xmltodict.parse(XML_DAT))
+
+    def test_save_matches_xmltodict_unparse(self):
+        for pretty in (True, False):
+            loaded = XMLDatFile(file=self.write_dat("loaded.xml", XML_DAT))
+            loaded.load(load_games=True)
+            loaded.save(pretty=pretty)
+            streamed = XMLDatFile(file=self.write_dat("streamed.xml", XML_DAT))
+            streamed.save(pretty=pretty)
+            expected = xmltodict.unparse(xmltodict.parse(XML_DAT), pretty=pretty)
+            self.assertEqual(loaded.file.read_text(), expected)
+            self.assertEqual(streamed.file.read_text(), expected)
+
+    def test_save_replaces_file_atomically(self):
+        dat = XMLDatFile(file=self.write_dat("a.xml", XML_DAT))
+        with mock.patch("datoso.repositories.dat_file.XMLWriter.end", side_effect=OSError("disk full")), \
+                self.assertRaises(OSError):
+            dat.save()
+        self.assertEqual(dat.file.read_text(), XML_DAT)
+        self.assertEqual([path.name for path in self.temp_dir.iterdir()], ["a.xml"])
+        dat.save()
+        self.assertEqual([path.name for path in self.temp_dir.iterdir()], ["a.xml"])
+
+    def test_mark_mias_streamed(self):
+        dat = XMLDatFile(file=self.write_dat("a.xml", XML_DAT))
+        dat.mark_mias({SHA_2: {}})
+        games = list(dat.iter_games())
+        self.assertNotIn("@mia", games[0]["rom"])
+        self.assertTrue(all(rom["@mia"] == "yes" for rom in games[1]["rom"]))
+        self.assertEqual(games[2]["rom"]["@mia"], "yes")
+
+
+class TestHardlinkedCopy(TestDatFileBase):
+    def test_saving_a_hardlinked_copy_leaves_the_download_untouched(self):
+        for dat_class, name, content in ((XMLDatFile, "download.xml", XML_DAT),
+                                         (ClrMameProDatFile, "download.dat", CLRMAMEPRO_DAT)):
+            with self.subTest(dat_class=dat_class.__name__):
+                download = self.write_dat(name, content)
+                copy = self.temp_dir / "DatRoot" / name
+                copy.parent.mkdir(exist_ok=True)
+                copy_file(download, copy, mode="hardlink")
+                self.assertTrue(download.samefile(copy))
+                dat = dat_class(file=copy)
+                dat.dedupe()
+                dat.save()
+                self.assertEqual(download.read_text(encoding="utf-8"), content)
+                self.assertNotEqual(copy.read_text(encoding="utf-8"), content)
+                self.assertFalse(download.samefile(copy))
+
+
+class TestClrMameProDatFile(TestDatFileBase):
+    def test_scan_blocks_ignores_quoted_parenthesis(self):
+        data = 'a ( b "(" ( c ) ) d ( e )'
+        self.assertEqual([data[start:end] for start, end in scan_blocks(data)], [' b "(" ( c ) ', ' e '])
+        self.assertEqual(list(scan_blocks(data.encode())), list(scan_blocks(data)))
+
+    def test_split_line_matches_shlex(self):
+        lines = [
+            'name "Alpha (USA).gb" size 1024 crc AAAA0001',
+            'name "Link\'s Awakening" serial \'DMG-ZLE\'',
+            'a"b c"d "" \'\'',
+            'name "Escaped \\" quote"',
+            'name C:\\roms\\a.gb',
+            '\tname  "tabbed"\r',
+        ]
+        for line in lines:
+            self.assertEqual(split_line(line), shlex.split(line))
+
+    def test_split_line_unclosed_quote_raises(self):
+        with self.assertRaises(ValueError):
+            split_line('name "Alpha (USA).gb size 1024')
+
+    def test_read_block_falls_back_to_space_split(self):
+        dat = ClrMameProDatFile(file=self.write_dat("a.dat", CLRMAMEPRO_DAT))
+        game = dat.read_block('name Alpha\nrom ( name "Alpha.gb size 1 )')
+        self.assertEqual(game['rom'][0]['@name'], '"Alpha.gb')
+        self.assertEqual(game['rom'][0]['@size'], '1')
+
+    def test_get_next_block(self):
+        dat = ClrMameProDatFile(file=self.write_dat("a.dat", CLRMAMEPRO_DAT))
+        block, rest = dat.get_next_block('a ( b ) c ( d )')
+        self.assertEqual(block, ' b ')
+        self.assertEqual(rest, ' c ( d )')
+        self.assertEqual(dat.get_next_block('\n'), ('', None))
+
+    def test_load_header_only(self):
+        dat = ClrMameProDatFile(file=self.write_dat("a.dat", CLRMAMEPRO_DAT))
+        self.assertEqual(dat.name, "Nintendo - Game Boy")
+        self.assertEqual(dat.header["author"], "A (B)")
+        self.assertEqual(dat.games, [])
+
+    def test_load_games(self):
+        dat = ClrMameProDatFile(file=self.write_dat("a.dat", CLRMAMEPRO_DAT))
+        dat.load(load_games=True)
+        self.assertEqual([game["name"] for game in dat.games], ["Alpha (USA)", "Beta (USA)"])
+        self.assertEqual(dat.games[1]["rom"][1]["@sha1"], SHA_2)
+
+    def test_streamed_games_match_loaded_games(self):
+        path = self.write_dat("a.dat", CLRMAMEPRO_DAT)
+        loaded = ClrMameProDatFile(file=path)
+        loaded.load(load_games=True)
+        self.assertEqual(list(ClrMameProDatFile(file=path).iter_games()), loaded.games)
+
+    def test_get_rom_shas_streams_games(self):
+        dat = ClrMameProDatFile(file=self.write_dat("a.dat", CLRMAMEPRO_DAT))
+        dat.get_rom_shas()
+        self.assertEqual(set(dat.shas.get_sha1s()), {SHA_1, SHA_2})
+
+    def test_save_round_trip(self):
+        for load_games in (False, True):
+            path = self.write_dat("a.dat", CLRMAMEPRO_DAT)
+            dat = ClrMameProDatFile(file=path)
+            if load_games:
+                dat.load(load_games=True)
+            dat.save()
+            self.assertEqual(path.read_text(encoding="utf-8"), CLRMAMEPRO_DAT)
+
+    def test_save_keeps_block_keywords(self):
+        content = CLRMAMEPRO_DAT + '\nresource (\n\tname "bios"\n\trom ( name "bios.bin" size 16 crc AAAA0003 )\n)\n'
+        path = self.write_dat("a.dat", content)
+        ClrMameProDatFile(file=path).save()
+        self.assertEqual(path.read_text(encoding="utf-8"), content)
+
+    def test_dedupe_streamed_and_loaded(self):
+        loaded = ClrMameProDatFile(file=self.write_dat("loaded.dat", CLRMAMEPRO_DAT))
+        loaded.load(load_games=True)
+        streamed = ClrMameProDatFile(file=self.write_dat("streamed.dat", CLRMAMEPRO_DAT))
+        for dat in (loaded, streamed):
+            dat.dedupe()
+            dat.save()
+            self.assertEqual(len(dat.merged_roms), 1)
+        self.assertEqual((self.temp_dir / "loaded.dat").read_text(), (self.temp_dir / "streamed.dat").read_text())
+        saved = ClrMameProDatFile(file=self.temp_dir / "streamed.dat")
+        self.assertEqual([len(game["rom"]) for game in saved.iter_games()], [1, 1])
+        self.assertEqual(list(saved.iter_games())[1]["rom"][0]["@sha1"], SHA_2)
+
+    def test_merge_with_parent(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", XML_DB_EXPORT))
+        child = ClrMameProDatFile(file=self.write_dat("child.dat", CLRMAMEPRO_DAT))
+        child.merge_with(parent)
+        self.assertEqual(len(child.merged_roms), 2)
+        self.assertEqual([game["name"] for game in child.iter_games()], ["Beta (USA)"])
+        child.save()
+        self.assertNotIn("Alpha", (self.temp_dir / "child.dat").read_text())
+
+    def test_doscenter_header(self):
+        path = self.write_dat("a.dat", 'DOSCenter (\n\tName: Games\n\tDescription: Games (2024)\n)\n\n'
+                              'game (\n\tname "Alpha.zip"\n)\n')
+        dat = DatFile.from_file(path)
+        self.assertIsInstance(dat, DOSCenterDatFile)
+        dat.save()
+        self.assertEqual(path.read_text(encoding="utf-8").splitlines()[:2], ["DOSCenter (", "\tName: Games"])
+        self.assertEqual(DatFile.from_file(path).header["name"].strip(), "Games")
+
+
+class TestFileSniff(TestDatFileBase):
+    def test_detects_type_and_encoding(self):
+        sniff = FileSniff(self.write_dat("a.xml", XML_DAT))
+        self.assertIs(sniff.dat_class, XMLDatFile)
+        self.assertEqual(sniff.encoding, "utf-8")
+        self.assertTrue(sniff.complete)
+        path = self.temp_dir / "bom.dat"
+        path.write_bytes(b"\xef\xbb\xbf" + CLRMAMEPRO_DAT.encode())
+        sniff = FileSniff(path)
+        self.assertIs(sniff.dat_class, ClrMameProDatFile)
+        self.assertEqual(sniff.encoding, "utf-8-sig")
+
+    def test_xml_declared_encoding(self):
+        path = self.temp_dir / "latin.xml"
+        path.write_bytes(XML_DAT.replace('<?xml version="1.0"?>', '<?xml version="1.0" encoding="ISO-8859-1"?>')
+                         .replace("A &amp; B", "Ã\xa9").encode("latin-1"))
+        dat = DatFile.from_file(path)
+        self.assertEqual(dat.encoding, "iso8859-1")
+        self.assertEqual(dat.author, "Ã\xa9")
+
+    def test_unknown_file(self):
+        self.assertIsNone(FileSniff(self.write_dat("a.txt", "hello")).dat_class)
+
+    def test_from_file_opens_file_once(self):
+        for name, content in (("a.xml", XML_DAT), ("b.xml", XML_DB_EXPORT), ("c.dat", CLRMAMEPRO_DAT)):
+            path = self.write_dat(name, content)
+            with mock.patch.object(datoso.repositories.dat_file, "open", wraps=open, create=True) as mock_open:
+                dat = DatFile.from_file(path)
+            self.assertEqual(mock_open.call_count, 1, name)
+            self.assertIsNone(dat.sniff)
+            self.assertTrue(dat.name)
+
+    def test_header_larger_than_prefix_reads_rest_of_file(self):
+        path = self.write_dat("a.xml", XML_DAT)
+        with mock.patch.object(FileSniff, "size", 64):
+            dat = DatFile.from_file(path)
+        self.assertEqual(dat.name, "Nintendo - Game Boy")
+        self.assertEqual(dat.header["clrmamepro"], {"@forcenodump": "required"})
+        with mock.patch.object(FileSniff, "size", 32):
+            dat = DatFile.from_file(self.write_dat("a.dat", CLRMAMEPRO_DAT))
+        self.assertEqual(dat.header["description"], "Nintendo - Game Boy (20240101)")
+
+
+if __name__ == '__main__':
+    unittest.main()
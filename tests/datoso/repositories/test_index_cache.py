@@ -0,0 +1,85 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.repositories.dat_file import XMLDatFile
+from datoso.repositories.hashes_index import HashesIndex
+from datoso.repositories.index_cache import IndexCache
+from datoso.repositories.records import RomRecord
+from tests.datoso.repositories.test_dat_file import (
+    XML_DAT,
+    XML_DB_EXPORT,
+    TestDatFileBase,
+)
+
+
+def make_index(count):
+    shas = HashesIndex()
+    shas.add_roms(RomRecord(f"{i}.bin", str(i), sha1=f"{i:040x}") for i in range(count))
+    return shas
+
+
+class TestIndexCache(TestDatFileBase):
+
+    def test_index_is_built_once(self):
+        cache = IndexCache()
+        path = self.write_dat("parent.xml", XML_DAT)
+        build = mock.Mock(return_value=make_index(10))
+        self.assertIs(cache.get("seed:parent", path, build), build.return_value)
+        self.assertIs(cache.get("seed:parent", path, build), build.return_value)
+        build.assert_called_once()
+        self.assertEqual(len(cache), 1)
+
+    def test_changed_file_is_built_again(self):
+        cache = IndexCache()
+        path = self.write_dat("parent.xml", XML_DAT)
+        build = mock.Mock(side_effect=lambda: make_index(10))
+        first = cache.get("seed:parent", path, build)
+        path.write_text(XML_DAT.replace("Alpha", "Delta"), encoding="utf-8")
+        self.assertIsNot(cache.get("seed:parent", path, build), first)
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_least_recently_used_is_evicted(self):
+        size = make_index(100).memory_size()
+        cache = IndexCache(max_size=size * 2)
+        paths = [self.write_dat(f"{i}.xml", XML_DAT) for i in range(3)]
+        cache.get("a", paths[0], lambda: make_index(100))
+        cache.get("b", paths[1], lambda: make_index(100))
+        cache.get("a", paths[0], mock.Mock(side_effect=AssertionError("built again")))
+        cache.get("c", paths[2], lambda: make_index(100))
+        self.assertEqual(list(cache._indexes), ["a", "c"])
+        self.assertLessEqual(cache.size, cache.max_size)
+
+    def test_too_big_is_not_cached(self):
+        cache = IndexCache(max_size=1)
+        cache.get("a", self.write_dat("a.xml", XML_DAT), lambda: make_index(10))
+        self.assertEqual(len(cache), 0)
+
+    def test_missing_file_is_not_cached(self):
+        cache = IndexCache()
+        cache.get("a", self.temp_dir / "missing.xml", HashesIndex)
+        self.assertEqual(len(cache), 0)
+
+    def test_parent_shared_by_children(self):
+        parent = XMLDatFile(file=self.write_dat("parent.xml", XML_DAT))
+        with mock.patch("datoso.repositories.dat_file.config.getboolean", return_value=False), \
+                mock.patch.object(XMLDatFile, "get_rom_shas", autospec=True,
+                                  side_effect=XMLDatFile.get_rom_shas) as get_rom_shas:
+            for i in range(3):
+                child = XMLDatFile(file=self.write_dat(f"child{i}.xml", XML_DB_EXPORT))
+                child.merge_with(parent)
+                self.assertEqual(len(child.merged_roms), 1)
+        get_rom_shas.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
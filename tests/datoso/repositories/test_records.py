@@ -0,0 +1,111 @@
+import sys
+import unittest
+from pathlib import Path
+
+# Ensure src is discoverable for imports
+project_root_for_imports = Path(__file__).parent.parent.parent.parent
+if str(project_root_for_imports) not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports))
+if str(project_root_for_imports / "src") not in sys.path:
+    sys.path.insert(0, str(project_root_for_imports / "src"))
+
+from datoso.repositories.hashes_index import HashesIndex, normalize_hash, rom_key
+from datoso.repositories.records import GameRecord, RomRecord
+
+SHA_1 = "0000000000000000000000000000000000000001"
+
+
+class TestRomRecord(unittest.TestCase):
+
+    def test_from_xml_dict(self):
+        rom = {'@name': 'Game.gb', '@size': '1024', '@crc': 'abcd1234', '@sha1': SHA_1, '@status': 'verified'}
+        record = RomRecord.from_dict(rom)
+        self.assertEqual(record.name, 'Game.gb')
+        self.assertEqual(record.size, '1024')
+        self.assertEqual(record.sha1, SHA_1)
+        self.assertIsNone(record.md5)
+        self.assertEqual(record['crc'], 'abcd1234')
+        self.assertEqual(record.get('status'), 'verified')
+        self.assertIsNone(record.get('serial'))
+        self.assertEqual(dict(record.attributes)['status'], 'verified')
+
+    def test_from_clrmamepro_dict(self):
+        rom = {'name': 'Game.gb', 'size': '1024', 'crc': '', 'md5': None, 'sha1': SHA_1}
+        record = RomRecord.from_dict(rom, keep_source=False)
+        self.assertIsNone(record.crc)
+        self.assertIsNone(record.md5)
+        self.assertIsNone(record.source)
+        self.assertEqual(record, RomRecord.from_dict(rom))
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(RomRecord(), '__dict__'))
+
+    def test_game_record(self):
+        game = {'@name': 'Game', 'rom': {'@name': 'Game.gb', '@size': '1', '@sha1': SHA_1}}
+        record = GameRecord.from_dict(game)
+        self.assertEqual(record.name, 'Game')
+        self.assertEqual(len(record.roms), 1)
+        self.assertEqual(record.roms[0].sha1, SHA_1)
+        self.assertEqual(record.attributes['name'], 'Game')
+
+
+class TestHashesIndex(unittest.TestCase):
+
+    def test_add_and_has_rom(self):
+        index = HashesIndex()
+        index.add_rom({'@name': 'Game.gb', '@size': '1', '@sha1': SHA_1})
+        self.assertIn(SHA_1, index.get_sha1s())
+        self.assertTrue(index.has_rom({'name': 'Other.gb', 'size': '1', 'sha1': SHA_1}))
+        self.assertFalse(index.has_rom({'name': 'Other.gb', 'size': '2', 'sha1': SHA_1}))
+        self.assertFalse(index.has_rom({'name': 'Game.gb', 'size': '1', 'sha1': SHA_1}, rom_hash='md5'))
+
+    def test_empty_hashes_are_not_indexed(self):
+        index = HashesIndex()
+        index.add_rom({'name': 'Game.gb', 'size': '1', 'crc': '', 'md5': None, 'sha1': SHA_1})
+        self.assertEqual(list(index.get_crcs()), [])
+        self.assertEqual(list(index.get_md5s()), [])
+        self.assertFalse(index.has_rom({'name': 'Other.gb', 'size': '1', 'crc': '', 'md5': None}))
+
+    def test_batch_matches_single(self):
+        index = HashesIndex()
+        index.add_roms({'name': f'{i}.gb', 'size': str(i), 'crc': f'{i:08X}', 'sha1': f'{i:040x}'} for i in range(0, 200, 2))
+        roms = [{'name': f'{i}.gb', 'size': str(i), 'crc': f'{i:08x}', 'sha1': ''} for i in range(200)]
+        roms.append({'name': 'bad.gb', 'size': '1', 'crc': 'not-hex'})
+        found = index.has_roms(roms)
+        self.assertEqual(found, [index.has_rom(rom) for rom in roms])
+        self.assertEqual(found[:4], [True, False, True, False])
+        self.assertEqual(sum(found), 100)
+        self.assertIn("00000002", index.get_crcs())
+
+    def test_same_hash_with_different_sizes(self):
+        index = HashesIndex()
+        index.add_rom({'name': 'a', 'size': '1', 'sha1': SHA_1})
+        index.add_rom({'name': 'b', 'size': '2', 'sha1': SHA_1})
+        self.assertTrue(index.has_rom({'size': '1', 'sha1': SHA_1}))
+        self.assertTrue(index.has_rom({'size': '2', 'sha1': SHA_1}))
+        self.assertFalse(index.has_rom({'size': '3', 'sha1': SHA_1}))
+        self.assertEqual(index.get_sha1s(), {SHA_1})
+
+    def test_add_new_roms(self):
+        index = HashesIndex()
+        roms = [{'size': '1', 'sha1': SHA_1}, {'size': '1', 'sha1': SHA_1.upper()}, {'size': '2', 'sha1': SHA_1}]
+        self.assertEqual(index.add_new_roms(roms), [False, True, False])
+
+    def test_hashes_are_normalized(self):
+        index = HashesIndex()
+        index.add_rom({'size': '1024', 'crc': '0000ABCD', 'md5': ' D41D8CD98F00B204E9800998ECF8427E ', 'sha1': ''})
+        self.assertTrue(index.has_rom({'size': '1024', 'crc': 'abcd'}))
+        self.assertTrue(index.has_rom({'size': ' 1024', 'crc': '0xabcd'}))
+        self.assertTrue(index.has_rom({'size': '1024', 'md5': 'd41d8cd98f00b204e9800998ecf8427e'}))
+        self.assertFalse(index.has_rom({'size': '1023', 'md5': 'd41d8cd98f00b204e9800998ecf8427e'}))
+        self.assertEqual(index.get_crcs(), {'0000abcd'})
+
+    def test_keys_are_compact(self):
+        self.assertEqual(normalize_hash('sha1', SHA_1.upper()), bytes(19) + b'\x01')
+        self.assertEqual(rom_key('crc', 'ffffffff', '1'), (1 << 32) | 0xFFFFFFFF)
+        self.assertEqual(len(rom_key('sha1', SHA_1, '1')), 28)
+        self.assertEqual(rom_key('crc', 'not-hex', None), ('not-hex', None))
+
+
+if __name__ == '__main__':
+    unittest.main()